@@ -1,3 +1,4 @@
+import os
 from typing import List
 
 from starlette.config import Config
@@ -13,6 +14,80 @@ ROUTE_PREFIX_V1 = "/v1"
 
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 ALGORITHM = "HS256"
+SECRET_KEY = config("SECRET_KEY", default=None)
+
+# Access tokens carry the user's principal and token version, so a request with
+# a token it has verified before needs neither the database nor the signature
+TOKEN_PRINCIPAL_CLAIMS: bool = config("TOKEN_PRINCIPAL_CLAIMS", cast=bool, default=True)
+TOKEN_CACHE_SIZE: int = config("TOKEN_CACHE_SIZE", cast=int, default=4096)
+
+# Run the unit expiry scheduler with the app, turned off for the test suite
+UNIT_EXPIRY_SCHEDULER: bool = config("UNIT_EXPIRY_SCHEDULER", cast=bool, default=True)
+
+# Run request queries on AsyncSession/aiosqlite instead of sync sessions in the
+# threadpool. Off by default: aiosqlite pays a thread hop per cursor call, which
+# costs more than it saves against a local SQLite file (benchmarks/bench_concurrency)
+ASYNC_DATABASE: bool = config("ASYNC_DATABASE", cast=bool, default=False)
+
+# Queue the write endpoints to a single thread that commits them in groups
+GROUP_COMMIT: bool = config("GROUP_COMMIT", cast=bool, default=True)
+
+# Authenticated users kept in memory so a request skips the user query,
+# dropped when the user is written and at the latest after the TTL (seconds)
+PRINCIPAL_CACHE_SIZE: int = config("PRINCIPAL_CACHE_SIZE", cast=int, default=1024)
+PRINCIPAL_CACHE_TTL: float = config("PRINCIPAL_CACHE_TTL", cast=float, default=60.0)
+
+# Vehicle and Store rows kept in memory in front of the repositories, per model
+# at most ENTITY_CACHE_SIZE rows for their TTL (seconds) unless written first
+ENTITY_CACHE_SIZE: int = config("ENTITY_CACHE_SIZE", cast=int, default=4096)
+ENTITY_CACHE_TTL = {
+    "vehicles": config("VEHICLE_CACHE_TTL", cast=float, default=300.0),
+    "stores": config("STORE_CACHE_TTL", cast=float, default=300.0),
+}
+
+# Total and facet counts of list queries kept in memory, valid until a table
+# they count changes and at the latest for COUNT_CACHE_TTL (seconds)
+COUNT_CACHE_SIZE: int = config("COUNT_CACHE_SIZE", cast=int, default=256)
+COUNT_CACHE_TTL: float = config("COUNT_CACHE_TTL", cast=float, default=300.0)
+
+# ETags follow the table versions of this process only, writes by another worker
+# or a script never bump them, so a tag is trusted for ETAG_TTL (seconds) at most
+ETAG_TTL: float = config("ETAG_TTL", cast=float, default=60.0)
+
+# Search ranks by BM25 the newest SEARCH_RANK_WINDOW units matching, scoring
+# every match of a word in a third of the inventory costs seconds
+SEARCH_RANK_WINDOW: int = config("SEARCH_RANK_WINDOW", cast=int, default=2000)
+
+# bcrypt cost of new hashes, a login with an older cost stores a new hash
+BCRYPT_ROUNDS: int = config("BCRYPT_ROUNDS", cast=int, default=12)
+# Workers hashing passwords for the routes, processes unless turned off, and how
+# many hashes may run or wait before a login gets a 503
+PASSWORD_HASH_PROCESSES: bool = config(
+    "PASSWORD_HASH_PROCESSES", cast=bool, default=True
+)
+PASSWORD_HASH_WORKERS: int = config(
+    "PASSWORD_HASH_WORKERS", cast=int, default=os.cpu_count() or 1
+)
+PASSWORD_HASH_QUEUE: int = config("PASSWORD_HASH_QUEUE", cast=int, default=64)
+# Bulk user imports hash on workers of their own, so logins never queue behind
+# them, and are refused past PASSWORD_HASH_BULK_QUEUE passwords running or waiting
+PASSWORD_HASH_BULK_WORKERS: int = config(
+    "PASSWORD_HASH_BULK_WORKERS", cast=int, default=max((os.cpu_count() or 1) // 2, 1)
+)
+PASSWORD_HASH_BULK_QUEUE: int = config(
+    "PASSWORD_HASH_BULK_QUEUE", cast=int, default=10000
+)
+
+# Applied to every SQLite connection, see app.database.create_engines
+SQLITE_PRAGMAS = {
+    "journal_mode": config("SQLITE_JOURNAL_MODE", default="WAL"),
+    "synchronous": config("SQLITE_SYNCHRONOUS", default="NORMAL"),
+    "busy_timeout": config("SQLITE_BUSY_TIMEOUT_MS", cast=int, default=5000),
+    # Negative sizes are KiB, 64 MiB of page cache per connection
+    "cache_size": config("SQLITE_CACHE_SIZE", cast=int, default=-64000),
+    "mmap_size": config("SQLITE_MMAP_SIZE", cast=int, default=256 * 1024 * 1024),
+    "temp_store": config("SQLITE_TEMP_STORE", default="MEMORY"),
+}
 
 ALLOWED_HOSTS: List[str] = config(
     "ALLOWED_HOSTS",
@@ -1,17 +1,178 @@
 import os
+from typing import Any, Tuple
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy import CompoundSelect, Select, create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, declarative_base, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from app.config import SQLITE_PRAGMAS
 
 # SQLALCHEMY_DATABASE_URL = "sqlite:///./app.db" #^ FOR PRODUCTION
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"  #! FOR TESTING ONLY
 
-engine = create_engine(
-    os.getenv("DB_URL", SQLALCHEMY_DATABASE_URL),
-    # echo=True,
-    connect_args={"check_same_thread": False},
-    pool_pre_ping=True,
+DATABASE_URL = os.getenv("DB_URL", SQLALCHEMY_DATABASE_URL)
+
+# Driver of the async engine per backend, sqlite:///x.db -> sqlite+aiosqlite:///x.db
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg"}
+
+
+def _async_url(database_url: str) -> str:
+    """The same database through its asyncio driver, ASYNC_DB_URL overrides it"""
+    url = make_url(database_url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        return database_url
+    return url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}").render_as_string(
+        hide_password=False
+    )
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DB_URL", _async_url(DATABASE_URL))
+
+
+def _sqlite_connect(readonly: bool):
+    def connect(dbapi_connection, connection_record):
+        # pysqlite issues its own BEGIN lazily and breaks SAVEPOINT, let SQLAlchemy
+        # own it. aiosqlite wraps the same sqlite3 module and needs the same treatment
+        # https://docs.sqlalchemy.org/en/20/dialects/sqlite.html#serializable-isolation-savepoints-transactional-ddl
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        for pragma, value in SQLITE_PRAGMAS.items():
+            # The journal mode is stored in the file, only a writer can change it
+            if not (readonly and pragma == "journal_mode"):
+                cursor.execute(f"PRAGMA {pragma} = {value}")
+        if readonly:
+            cursor.execute("PRAGMA query_only = 1")
+        cursor.close()
+
+    return connect
+
+
+def _sqlite_begin(statement: str):
+    def begin(conn):
+        conn.exec_driver_sql(statement)
+
+    return begin
+
+
+def _create_sqlite_engine(
+    database_url: str, readonly: bool, is_async: bool, **kwargs: Any
+) -> Any:
+    if is_async:
+        # aiosqlite defaults to NullPool for files, a connection and its thread
+        # per request
+        new_engine = create_async_engine(
+            database_url, poolclass=AsyncAdaptedQueuePool, **kwargs
+        )
+    else:
+        new_engine = create_engine(
+            database_url,
+            poolclass=QueuePool,
+            connect_args={"check_same_thread": False},
+            **kwargs,
+        )
+    sync_engine = new_engine.sync_engine if is_async else new_engine
+    event.listen(sync_engine, "connect", _sqlite_connect(readonly))
+    # The writer takes the write lock as it begins, so busy_timeout covers waiting
+    # for it; a deferred BEGIN upgraded by its first write fails straight away
+    event.listen(
+        sync_engine, "begin", _sqlite_begin("BEGIN" if readonly else "BEGIN IMMEDIATE")
+    )
+    return new_engine
+
+
+def create_engines(database_url: str, is_async: bool = False) -> Tuple[Any, Any]:
+    """
+    Build the (writer, reader) engines for a database
+
+    A SQLite file gets a writer with a single connection, so the app's writes
+    queue for it in the pool instead of failing with "database is locked", and a
+    pool of query_only readers that WAL lets run alongside it. Every connection
+    gets SQLITE_PRAGMAS. In-memory SQLite and other databases use one engine
+    for both.
+
+    Args:
+        database_url (str): The database URL
+        is_async (bool, optional): Build AsyncEngines. Defaults to False.
+    Returns:
+        Tuple[Any, Any]: The writer and reader engines, the same one when not split
+    """
+    url = make_url(database_url)
+    in_memory = url.database in (None, "", ":memory:")
+    if url.get_backend_name() == "sqlite" and not in_memory:
+        writer = _create_sqlite_engine(
+            database_url, readonly=False, is_async=is_async, pool_size=1, max_overflow=0
+        )
+        reader = _create_sqlite_engine(database_url, readonly=True, is_async=is_async)
+        return writer, reader
+    if is_async:
+        shared = create_async_engine(database_url, pool_pre_ping=True)
+    else:
+        shared = create_engine(database_url, pool_pre_ping=True)
+    if url.get_backend_name() == "sqlite":
+        sync_engine = shared.sync_engine if is_async else shared
+        event.listen(sync_engine, "connect", _sqlite_connect(readonly=False))
+        event.listen(sync_engine, "begin", _sqlite_begin("BEGIN"))
+    return shared, shared
+
+
+engine, read_engine = create_engines(DATABASE_URL)
+async_engine, async_read_engine = create_engines(ASYNC_DATABASE_URL, is_async=True)
+
+
+class RoutingSession(Session):
+    """
+    Session that sends plain SELECTs to the reader engine and everything else
+    (INSERT/UPDATE/DELETE, flushes, connection()) to the writer
+
+    Once a transaction has touched the writer its reads follow it there, so it
+    sees its own writes. GET requests therefore never wait for the writer, and
+    a UnitOfWork takes the writer when it starts writing.
+    """
+
+    def __init__(self, *args: Any, reader: Engine, writer: Engine, **kwargs: Any):
+        kwargs["bind"] = kwargs.get("bind") or writer
+        super().__init__(*args, **kwargs)
+        self.reader = reader
+        self.writer = writer
+
+    def get_bind(self, mapper=None, clause=None, **kwargs) -> Engine:
+        if (
+            self.reader is not self.writer
+            and isinstance(clause, (Select, CompoundSelect))
+            and not self._flushing
+            and not self.info.get("writer")
+        ):
+            return self.reader
+        self.info["writer"] = True
+        return self.writer
+
+
+@event.listens_for(RoutingSession, "after_transaction_end")
+def _release_writer(session: Session, transaction) -> None:
+    if transaction.parent is None:
+        session.info.pop("writer", None)
+
+
+# Repositories return rows loaded by INSERT/UPDATE ... RETURNING, keep them usable
+# after the commit instead of reloading every attribute
+SessionLocal = sessionmaker(
+    class_=RoutingSession,
+    reader=read_engine,
+    writer=engine,
+    autocommit=False,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
+AsyncSessionLocal = async_sessionmaker(
+    sync_session_class=RoutingSession,
+    reader=async_read_engine.sync_engine,
+    writer=async_engine.sync_engine,
+    autoflush=False,
+    expire_on_commit=False,
 )
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
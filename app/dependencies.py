@@ -1,17 +1,27 @@
+import asyncio
 import os
 import secrets
+from typing import AsyncIterator, Callable, Optional, TypeVar, Union
 
-from jose import jwt, JWTError
+import anyio
 from fastapi import Header, HTTPException
+from jose import jwt
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
-from app.database import SessionLocal
+from app import config
+from app.database import AsyncSessionLocal, SessionLocal
+from app.services.writer import group_commit_writer
+
+R = TypeVar("R")
 
 SECRET_KEY = os.environ.get("SECRET_KEY")
 ALGORITHM = "HS256"
 
 
 def decode(token):
-    striped_token = token.replace("Bearer ", "")
+    token.replace("Bearer ", "")
     return jwt.decode(token, "secret", algorithm="HS256")
 
 
@@ -19,13 +29,99 @@ def encode():
     return jwt.encode({"some": "payload"}, "secret", algorithm="HS256")
 
 
-def get_db():
-    """Method for configure database"""
-    db = SessionLocal()
+class RequestSession:
+    """
+    The database session of one request, opened the first time a call needs it
+
+    get_db provides one per request and FastAPI caches it, so get_current_user and
+    the route share it. Requests that never reach run_db, and writes queued to the
+    group commit writer, never open a session at all.
+    """
+
+    def __init__(self) -> None:
+        self._session: Optional[Union[AsyncSession, Session]] = None
+
+    @property
+    def opened(self) -> bool:
+        return self._session is not None
+
+    @property
+    def session(self) -> Union[AsyncSession, Session]:
+        """An AsyncSession unless ASYNC_DATABASE is off"""
+        if self._session is None:
+            if config.ASYNC_DATABASE:
+                self._session = AsyncSessionLocal()
+            else:
+                self._session = SessionLocal()
+        return self._session
+
+    async def close(self) -> None:
+        db, self._session = self._session, None
+        if db is None:
+            return
+        if isinstance(db, AsyncSession):
+            await db.close()
+        else:
+            # Not on the default threadpool, its threads may all be waiting for
+            # the pooled connection this close gives back (FastAPI does the same)
+            await anyio.to_thread.run_sync(db.close, limiter=anyio.CapacityLimiter(1))
+
+
+async def get_db() -> AsyncIterator[RequestSession]:
+    """
+    The request's RequestSession, closed once the response is sent
+
+    Routes hand it to run_db, which runs the synchronous services on it either way.
+    """
+    db = RequestSession()
     try:
         yield db
     finally:
-        db.close()
+        await db.close()
+
+
+async def run_db(
+    db: Union[RequestSession, AsyncSession, Session],
+    fn: Callable[..., R],
+    *args,
+    **kwargs,
+) -> R:
+    """
+    Await fn(session, *args, **kwargs), a service or repository call, on the
+    request's session
+
+    On an AsyncSession fn runs in a greenlet through AsyncSession.run_sync: every
+    query it sends is awaited on aiosqlite, so a request waiting on the database
+    only parks a coroutine and the event loop carries on with the others. fn must
+    not hold the loop with CPU bound work, and the rows it returns must already
+    be loaded (services return serialized dicts). A sync Session runs fn on the
+    threadpool, as the sync routes used to.
+    """
+    if isinstance(db, RequestSession):
+        db = db.session
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(fn, db, *args, **kwargs)
+
+
+async def write_db(
+    db: Union[RequestSession, AsyncSession, Session],
+    fn: Callable[..., R],
+    *args,
+    **kwargs,
+) -> R:
+    """
+    Await fn(session, *args, **kwargs), a service call that writes
+
+    With the group commit writer running (GROUP_COMMIT) it is queued there and
+    shares a COMMIT with the writes queued around it, on the writer's session.
+    Otherwise it runs on the request's session like run_db.
+    """
+    if group_commit_writer.running:
+        return await asyncio.wrap_future(
+            group_commit_writer.submit(fn, *args, **kwargs)
+        )
+    return await run_db(db, fn, *args, **kwargs)
 
 
 async def get_token_header(x_token: str = Header(...)):
@@ -59,3 +59,7 @@ class UpdateStoreException(CustomException):
 
 class GetStoreException(CustomException):
     pass
+
+
+class GetUnitException(CustomException):
+    pass
@@ -1,26 +1,58 @@
+from contextlib import asynccontextmanager
+
 from dotenv import load_dotenv
-from fastapi import Depends, FastAPI, Request, Response
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import RedirectResponse
 from starlette.exceptions import HTTPException
 
-from app.config import ALLOWED_HOSTS, API_PREFIX
-from app.database import Base, SessionLocal, engine
-from app.dependencies import get_query_token, get_token_header
+from app.config import (ALLOWED_HOSTS, API_PREFIX, GROUP_COMMIT, SECRET_KEY,
+                        UNIT_EXPIRY_SCHEDULER)
+from app.database import Base, async_engine, async_read_engine, engine
+from app.migrations import (create_missing_indexes, create_search_index,
+                            normalize_vins)
 from app.routers.api import router as router_api
 from app.routers.handlers.http_error import http_error_handler
+from app.services.expiry import expiry_scheduler
+from app.services.passwords import password_hasher
+from app.services.writer import group_commit_writer
+from app.utils.pagination import (FACETS_HEADER, NEXT_CURSOR_HEADER,
+                                  TOTAL_COUNT_HEADER)
+from app.utils.responses import ORJSONResponse
 
 load_dotenv()
 
 
+@asynccontextmanager
+async def lifespan(application: FastAPI):
+    if GROUP_COMMIT:
+        group_commit_writer.start()
+    if UNIT_EXPIRY_SCHEDULER:
+        expiry_scheduler.start()
+    yield
+    expiry_scheduler.stop()
+    group_commit_writer.stop()
+    password_hasher.shutdown()
+    # aiosqlite connections each hold a thread that outlives the loop otherwise
+    await async_engine.dispose()
+    await async_read_engine.dispose()
+
+
 def get_application() -> FastAPI:
     """Configure, start and return the application"""
 
+    ## Tokens are signed with SECRET_KEY, without it every login would fail
+    if not SECRET_KEY:
+        raise RuntimeError("SECRET_KEY is not set, add it to the environment or .env")
+
     ## Start FastApi App
-    application = FastAPI()
+    application = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
 
-    ## Generate database tables
+    ## Generate database tables, and indexes added since an existing one was made
     Base.metadata.create_all(bind=engine)
+    normalize_vins(engine)
+    create_missing_indexes(engine)
+    create_search_index(engine)
 
     ## Mapping api routes
     application.include_router(router_api, prefix=API_PREFIX)
@@ -35,6 +67,7 @@ def get_application() -> FastAPI:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=[NEXT_CURSOR_HEADER, TOTAL_COUNT_HEADER, FACETS_HEADER],
     )
 
     @application.get("/")
@@ -45,19 +78,3 @@ def get_application() -> FastAPI:
 
 
 app = get_application()
-
-
-@app.middleware("http")
-async def db_session_middleware(request: Request, call_next):
-    """
-    The middleware we'll add (just a function) will create
-    a new SQLAlchemy SessionLocal for each request, add it to
-    the request and then close it once the request is finished.
-    """
-    response = Response("Internal server error", status_code=500)
-    try:
-        request.state.db = SessionLocal()
-        response = await call_next(request)
-    finally:
-        request.state.db.close()
-    return response
@@ -0,0 +1,172 @@
+"""
+Bring an existing database up to the indexes declared on the models, the
+full-text search index of app.models.search and the upper case VINs
+
+create_all only creates missing tables, so a database made before an index was
+declared never gets it, nor an index declared unique since. Runs at startup, or
+by hand against DB_URL:
+
+    python -m app.migrations
+"""
+
+import logging
+from typing import Dict, List
+
+from sqlalchemy import Index, func, inspect, select, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+
+from app.database import Base, engine
+from app.models.search import (BACKFILL_SEARCH_TABLE, CREATE_SEARCH_TABLE,
+                               RANK_SEARCH_TABLE, SEARCH_TABLE,
+                               SEARCH_TRIGGERS)
+from app.models.vehicles import Vehicle
+
+logger = logging.getLogger(__name__)
+
+
+def _existing_indexes(bind: Engine, table: str) -> Dict[str, bool]:
+    """Names of a table's indexes and whether each is unique"""
+    if bind.dialect.name == "sqlite":
+        # The inspector skips expression indexes, the pragma lists every one
+        with bind.connect() as conn:
+            rows = conn.exec_driver_sql(f'PRAGMA index_list("{table}")')
+            return {row.name: bool(row.unique) for row in rows}
+    return {
+        index["name"]: bool(index["unique"])
+        for index in inspect(bind).get_indexes(table)
+    }
+
+
+class DuplicateValuesError(RuntimeError):
+    """A unique index cannot be built, the table holds duplicates to resolve first"""
+
+
+def _duplicates(bind: Engine, index: Index, limit: int = 10) -> List[tuple]:
+    columns = list(index.columns)
+    stmt = (
+        select(*columns, func.count())
+        .group_by(*columns)
+        .having(func.count() > 1)
+        .limit(limit)
+    )
+    with bind.connect() as conn:
+        return [tuple(row) for row in conn.execute(stmt)]
+
+
+def _create(bind: Engine, index: Index, rebuild: bool = False) -> None:
+    """
+    Create an index, dropping the existing one of that name first when
+    rebuilding, in one transaction
+
+    Raises:
+        DuplicateValuesError: For a unique index over duplicate values, naming
+            some of them. The existing index is left as it was.
+    """
+    try:
+        with bind.begin() as conn:
+            if rebuild:
+                index.drop(bind=conn)
+            index.create(bind=conn)
+    except IntegrityError:
+        raise DuplicateValuesError(
+            f"Cannot create unique index {index.name}, {index.table.name} has "
+            f"duplicates (values, rows): {_duplicates(bind, index)}"
+        )
+
+
+def normalize_vins(bind: Engine = engine) -> int:
+    """
+    Upper case the stored VINs, as the API has written them since VINs are
+    unique, so lookups find them and case variants count as duplicates. Blank
+    VINs become NULL, as the write schemas store them, rather than duplicates
+    of each other.
+
+    Returns:
+        int: The number of vehicles updated
+    Raises:
+        DuplicateValuesError: When the unique index is in place and a VIN
+            differs from another one only in case
+    """
+    normalized = func.nullif(func.upper(func.trim(Vehicle.vin)), "")
+    try:
+        with bind.begin() as conn:
+            result = conn.execute(
+                update(Vehicle)
+                .where(Vehicle.vin.is_distinct_from(normalized))
+                .values(vin=normalized)
+            )
+    except IntegrityError as e:
+        raise DuplicateValuesError(f"VINs differing only in case: {e.orig}")
+    if result.rowcount:
+        logger.info("Normalized %s VINs", result.rowcount)
+    return result.rowcount
+
+
+def create_missing_indexes(bind: Engine = engine) -> List[str]:
+    """
+    Create every index declared on the models that the database does not have
+    yet, and rebuild as unique the ones declared unique since
+
+    Args:
+        bind (Engine, optional): The database to migrate. Defaults to the app engine.
+    Returns:
+        List[str]: Names of the indexes created or rebuilt
+    Raises:
+        DuplicateValuesError: When a unique index cannot be built, the app
+            does not start until the duplicates are resolved
+    """
+    inspector = inspect(bind)
+    created = []
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = _existing_indexes(bind, table.name)
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            if index.name not in existing:
+                _create(bind, index)
+                logger.info("Created index %s", index.name)
+            elif index.unique and not existing[index.name]:
+                _create(bind, index, rebuild=True)
+                logger.info("Rebuilt index %s as unique", index.name)
+            else:
+                continue
+            created.append(index.name)
+    return created
+
+
+def create_search_index(bind: Engine = engine) -> bool:
+    """
+    Create the FTS5 search table and its triggers, filled from the existing
+    units and vehicles, unless the database has it. Nothing on other dialects.
+
+    Args:
+        bind (Engine, optional): The database to migrate. Defaults to the app engine.
+    Returns:
+        bool: Whether the table was created
+    """
+    if bind.dialect.name != "sqlite" or inspect(bind).has_table(SEARCH_TABLE):
+        return False
+    with bind.begin() as conn:
+        conn.exec_driver_sql(CREATE_SEARCH_TABLE)
+        conn.exec_driver_sql(RANK_SEARCH_TABLE)
+        for name, (when, body) in SEARCH_TRIGGERS.items():
+            conn.exec_driver_sql(
+                f"CREATE TRIGGER IF NOT EXISTS {name} {when} BEGIN {body} END"
+            )
+        conn.exec_driver_sql(BACKFILL_SEARCH_TABLE)
+    logger.info("Created search index %s", SEARCH_TABLE)
+    return True
+
+
+if __name__ == "__main__":
+    import app.models.stores  # noqa: F401 register every table
+    import app.models.units  # noqa: F401
+    import app.models.users  # noqa: F401
+    import app.models.vehicles  # noqa: F401
+
+    normalize_vins()
+    for name in create_missing_indexes():
+        print(name)
+    if create_search_index():
+        print(SEARCH_TABLE)
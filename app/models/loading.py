@@ -0,0 +1,74 @@
+from functools import lru_cache
+from typing import Any, List, Tuple
+
+from pydantic import BaseModel
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy.orm.interfaces import MANYTOONE
+
+# Relationships only serialized when the matching include_* flag is set
+GATED_RELATIONSHIPS = {
+    "vehicle": "include_vehicle",
+    "store": "include_store",
+    "unit_model": "include_unit_model",
+}
+
+
+@lru_cache(maxsize=None)
+def _plan(model: Any, schema: Any, flags: Tuple[str, ...]) -> Tuple[str, ...]:
+    fields = schema.model_fields if schema is not None else None
+    plan = []
+    for relationship in model.__mapper__.relationships:
+        flag = GATED_RELATIONSHIPS.get(relationship.key)
+        if flag is not None and flag not in flags:
+            continue
+        if fields is not None and relationship.key not in fields:
+            continue
+        plan.append(relationship.key)
+    return tuple(plan)
+
+
+def plan_relationships(
+    model: Any,
+    schema: type[BaseModel] | None = None,
+    include_vehicle: bool = False,
+    include_store: bool = False,
+    include_unit_model: bool = False,
+) -> Tuple[str, ...]:
+    """
+    Work out which relationships of a model a response actually renders
+
+    A relationship is planned when its include_* flag (if it has one) is set and
+    the response schema has a field for it. Plans are computed once per shape.
+
+    Args:
+        model (Any): The mapped model class being loaded
+        schema (type[BaseModel] | None, optional): The response schema, None renders every relationship. Defaults to None.
+        include_vehicle (bool, optional): Whether the vehicle relationship is requested. Defaults to False.
+        include_store (bool, optional): Whether the store relationship is requested. Defaults to False.
+        include_unit_model (bool, optional): Whether the unit_model relationship is requested. Defaults to False.
+    Returns:
+        Tuple[str, ...]: Relationship keys to load and serialize
+    """
+    flags = tuple(
+        flag
+        for flag, enabled in (
+            ("include_vehicle", include_vehicle),
+            ("include_store", include_store),
+            ("include_unit_model", include_unit_model),
+        )
+        if enabled
+    )
+    return _plan(model, schema, flags)
+
+
+def loader_options(model: Any, relationships: Tuple[str, ...]) -> List[Any]:
+    """joinedload for many-to-one relationships, selectinload for collections"""
+    options = []
+    for key in relationships:
+        relationship = model.__mapper__.relationships[key]
+        attr = getattr(model, key)
+        if relationship.direction is MANYTOONE:
+            options.append(joinedload(attr))
+        else:
+            options.append(selectinload(attr))
+    return options
@@ -1,4 +1,5 @@
-from sqlalchemy.orm import class_mapper
+from app.models.loading import plan_relationships
+from app.models.serializers import compile_serializer
 
 
 class SerializerMixin:
@@ -8,34 +9,13 @@ class SerializerMixin:
         include_vehicle=False,
         include_store=False,
         include_unit_model=False,
+        relationships=None,
     ):
-        serialized_data = {
-            c.name: getattr(self, c.name) for c in self.__table__.columns
-        }
-
-        if depth > 0:
-            for relationship in class_mapper(self.__class__).relationships:
-                # if ((relationship.key == 'vehicle' and not include_vehicle) or
-                #     (relationship.key == 'store' and not include_store)):
-                #     continue
-                if (
-                    (relationship.key == "vehicle" and not include_vehicle)
-                    or (relationship.key == "store" and not include_store)
-                    or (relationship.key == "unit_model" and not include_unit_model)
-                ):
-                    continue
-
-                related_obj = getattr(self, relationship.key)
-                if related_obj is not None:
-                    if isinstance(related_obj, list):
-                        serialized_data[relationship.key] = [
-                            item.serialize(depth - 1) for item in related_obj
-                        ]
-                    else:
-                        serialized_data[relationship.key] = related_obj.serialize(
-                            depth - 1
-                        )
-                else:
-                    serialized_data[relationship.key] = None
-
-        return serialized_data
+        if relationships is None:
+            relationships = plan_relationships(
+                self.__class__,
+                include_vehicle=include_vehicle,
+                include_store=include_store,
+                include_unit_model=include_unit_model,
+            )
+        return compile_serializer(self.__class__, tuple(relationships), depth)(self)
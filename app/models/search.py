@@ -0,0 +1,94 @@
+"""
+Full-text index of the inventory: one FTS5 row per unit, rowid = units.id,
+holding its stock number and the words of its vehicle
+
+SQLite only. Created and backfilled by app.migrations.create_search_index and
+kept in sync by triggers, so every write path - ORM flushes, the bulk inserts,
+raw UPDATEs - updates it in the writing transaction.
+"""
+
+from sqlalchemy import column, table
+
+SEARCH_TABLE = "unit_search"
+
+# Indexed columns and their BM25 weight, a stock number or VIN hit outranks a colour
+SEARCH_COLUMNS = {
+    "stock_number": 10.0,
+    "vin": 5.0,
+    "make": 2.0,
+    "model": 3.0,
+    "trim": 2.0,
+    "year": 1.0,
+    "color": 1.0,
+    "category": 1.0,
+}
+VEHICLE_COLUMNS = [name for name in SEARCH_COLUMNS if name != "stock_number"]
+
+unit_search = table(SEARCH_TABLE, column("rowid"), column("rank"), column(SEARCH_TABLE))
+
+_columns = ", ".join(SEARCH_COLUMNS)
+_vehicle = ", ".join(f"v.{name}" for name in VEHICLE_COLUMNS)
+_new_vehicle = ", ".join(f"new.{name}" for name in VEHICLE_COLUMNS)
+_no_vehicle = ", ".join("NULL" for _ in VEHICLE_COLUMNS)
+
+
+def _index_units(source: str, where: str) -> str:
+    # Values in SEARCH_COLUMNS order, stock_number then the vehicle's
+    return (
+        f"INSERT INTO {SEARCH_TABLE}(rowid, {_columns}) "
+        f"SELECT u.id, u.stock_number, {source} FROM units u {where};"
+    )
+
+
+def _drop_units(where: str) -> str:
+    return (
+        f"DELETE FROM {SEARCH_TABLE} WHERE rowid IN (SELECT id FROM units u {where});"
+    )
+
+
+# Prefix indexes of 2 to 6 characters answer `civ*` or `honda*` from one
+# doclist, a longer prefix merges the doclists of every term it starts
+CREATE_SEARCH_TABLE = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} "
+    f"USING fts5({_columns}, prefix='2 3 4 5 6')"
+)
+RANK_SEARCH_TABLE = (
+    f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rank) "
+    f"VALUES ('rank', 'bm25({', '.join(str(w) for w in SEARCH_COLUMNS.values())})')"
+)
+BACKFILL_SEARCH_TABLE = _index_units(
+    _vehicle, "LEFT JOIN vehicles v ON v.id = u.vehicle_id"
+).rstrip(";")
+
+SEARCH_TRIGGERS = {
+    "units_search_insert": (
+        "AFTER INSERT ON units",
+        _index_units(
+            _vehicle, "LEFT JOIN vehicles v ON v.id = u.vehicle_id WHERE u.id = new.id"
+        ),
+    ),
+    # Only the indexed columns, the expiry UPDATE of thousands of units leaves it alone
+    "units_search_update": (
+        "AFTER UPDATE OF stock_number, vehicle_id ON units",
+        f"DELETE FROM {SEARCH_TABLE} WHERE rowid = old.id; "
+        + _index_units(
+            _vehicle, "LEFT JOIN vehicles v ON v.id = u.vehicle_id WHERE u.id = new.id"
+        ),
+    ),
+    "units_search_delete": (
+        "AFTER DELETE ON units",
+        f"DELETE FROM {SEARCH_TABLE} WHERE rowid = old.id;",
+    ),
+    "vehicles_search_update": (
+        f"AFTER UPDATE OF {', '.join(VEHICLE_COLUMNS)} ON vehicles",
+        _drop_units("WHERE u.vehicle_id = new.id")
+        + " "
+        + _index_units(_new_vehicle, "WHERE u.vehicle_id = new.id"),
+    ),
+    "vehicles_search_delete": (
+        "AFTER DELETE ON vehicles",
+        _drop_units("WHERE u.vehicle_id = old.id")
+        + " "
+        + _index_units(_no_vehicle, "WHERE u.vehicle_id = old.id"),
+    ),
+}
@@ -0,0 +1,64 @@
+from functools import lru_cache
+from operator import attrgetter, itemgetter
+from typing import Any, Callable, Tuple
+
+from app.models.loading import plan_relationships
+
+
+@lru_cache(maxsize=None)
+def compile_serializer(
+    model: Any, relationships: Tuple[str, ...] = (), depth: int = 1
+) -> Callable[[Any], dict]:
+    """
+    Build a function that turns a row of model into a dict
+
+    The column names, attribute getters and nested serializers are resolved once
+    per (model, relationships, depth) instead of reflecting on every row.
+
+    Args:
+        model (Any): The mapped model class
+        relationships (Tuple[str, ...], optional): Relationships to include. Defaults to ().
+        depth (int, optional): How many levels of relationships to follow. Defaults to 1.
+    Returns:
+        Callable[[Any], dict]: The serializer
+    """
+    columns = tuple(c.name for c in model.__table__.columns)
+    get_loaded = itemgetter(*columns)
+    get_attributes = attrgetter(*columns)
+
+    def get_columns(row: Any) -> tuple:
+        # Loaded column values sit in the instance __dict__, read them without
+        # going through the instrumented descriptors; expired rows fall back to them
+        try:
+            values = get_loaded(row.__dict__)
+        except KeyError:
+            values = get_attributes(row)
+        return values if len(columns) > 1 else (values,)
+
+    nested = []
+    if depth > 0:
+        for key in relationships:
+            relationship = model.__mapper__.relationships[key]
+            target = relationship.mapper.class_
+            target_relationships = plan_relationships(target) if depth > 1 else ()
+            nested.append(
+                (
+                    key,
+                    relationship.uselist,
+                    compile_serializer(target, target_relationships, depth - 1),
+                )
+            )
+
+    def serialize(row: Any) -> dict:
+        data = dict(zip(columns, get_columns(row)))
+        for key, uselist, serialize_related in nested:
+            related = getattr(row, key)
+            if related is None:
+                data[key] = None
+            elif uselist:
+                data[key] = [serialize_related(item) for item in related]
+            else:
+                data[key] = serialize_related(related)
+        return data
+
+    return serialize
@@ -1,7 +1,7 @@
 from datetime import datetime, timedelta
 
-from sqlalchemy import (Boolean, Column, DateTime, Float, ForeignKey, Integer,
-                        String)
+from sqlalchemy import (Boolean, Column, DateTime, Float, ForeignKey, Index,
+                        Integer, String, false)
 from sqlalchemy.orm import relationship
 
 from app.database import Base
@@ -12,12 +12,15 @@ class Unit(SerializerMixin, Base):
     __tablename__ = "units"
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
-    stock_number = Column(String, nullable=True)
+    stock_number = Column(String, nullable=True, index=True)
     purchase_date = Column(DateTime, nullable=True)
-    list_date = Column(DateTime, nullable=True)
+    list_date = Column(DateTime, nullable=True, index=True)
     sold_date = Column(DateTime, nullable=True)
     expire_date = Column(
-        DateTime, nullable=True, default=datetime.utcnow() + timedelta(minutes=1)
+        DateTime,
+        nullable=True,
+        index=True,
+        default=datetime.utcnow() + timedelta(minutes=1),
     )
     purchase_price = Column(Integer, nullable=True, default=0)
     buy_now_price = Column(Integer, nullable=True, default=0)
@@ -28,7 +31,7 @@ class Unit(SerializerMixin, Base):
     vehicle_cost = Column(Integer, nullable=True, default=0)
     maxoffer_value = Column(Integer, nullable=True, default=0)
     maxoffer_clock = Column(Integer, nullable=True, default=0)
-    sold_status = Column(Boolean, nullable=True, default=False)
+    sold_status = Column(Boolean, nullable=True, default=False, index=True)
     purchased = Column(Boolean, nullable=True, default=False)
     is_expired = Column(Boolean, nullable=True, default=False)
     cdk_deal_number = Column(Integer, nullable=True, default=0)
@@ -42,10 +45,27 @@ class Unit(SerializerMixin, Base):
     buy_fee = Column(Integer, nullable=True, default=250)
 
     store = relationship("Store", back_populates="units", lazy="select")
-    store_id = Column(Integer, ForeignKey("stores.id"))
+    store_id = Column(Integer, ForeignKey("stores.id"), index=True)
 
     vehicle = relationship("Vehicle", back_populates="units", lazy="select")
-    vehicle_id = Column(Integer, ForeignKey("vehicles.id"))
+    vehicle_id = Column(Integer, ForeignKey("vehicles.id"), index=True)
 
-    purchased_by = Column(Integer, ForeignKey("users.id"))
+    purchased_by = Column(Integer, ForeignKey("users.id"), index=True)
     added_by = Column(Integer, ForeignKey("users.id"))
+
+
+# Serves the expiry UPDATE and the scheduler's scan of upcoming deadlines
+EXPIRY_INDEX = Index(
+    "ix_units_is_expired_expire_date", Unit.is_expired, Unit.expire_date
+)
+
+# Live inventory of a store: unsold, unexpired units, newest listings last.
+# Only matched when sold_status and is_expired are compared to literals, which
+# SqlRepository does for boolean filters
+Index(
+    "ix_units_live_store_list_date",
+    Unit.store_id,
+    Unit.list_date,
+    sqlite_where=(Unit.sold_status == false()) & (Unit.is_expired == false()),
+    postgresql_where=(Unit.sold_status == false()) & (Unit.is_expired == false()),
+)
@@ -24,5 +24,5 @@ class User(SerializerMixin, Base):
     is_admin = Column(Boolean, default=False)
     is_superuser = Column(Boolean, default=False)
 
-    store_id = Column(Integer, ForeignKey("stores.id"))
+    store_id = Column(Integer, ForeignKey("stores.id"), index=True)
     store = relationship("Store", back_populates="users")
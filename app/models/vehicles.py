@@ -1,5 +1,8 @@
-from sqlalchemy import (Boolean, Column, DateTime, Float, ForeignKey, Integer,
-                        String)
+import operator
+from functools import reduce
+
+from sqlalchemy import (Boolean, Column, DateTime, Float, ForeignKey, Index,
+                        Integer, String, func, literal_column)
 from sqlalchemy.orm import relationship
 
 from app.database import Base
@@ -10,11 +13,12 @@ class Vehicle(SerializerMixin, Base):
     __tablename__ = "vehicles"
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
-    year = Column(Integer, nullable=True)
+    year = Column(Integer, nullable=True, index=True)
     make = Column(String, nullable=True)
-    model = Column(String, nullable=True)
+    model = Column(String, nullable=True, index=True)
     trim = Column(String, nullable=True)
-    vin = Column(String, nullable=True)
+    # Unique, a VIN names one vehicle. NULLs are not compared
+    vin = Column(String, nullable=True, index=True, unique=True)
     mileage = Column(Integer, nullable=True)
     color = Column(String, nullable=True)
     drivetrain = Column(String, nullable=True)
@@ -29,3 +33,27 @@ class Vehicle(SerializerMixin, Base):
 
     # Relationships
     units = relationship("Unit", back_populates="vehicle", lazy="select")
+
+    # make, make + model and make + model + year lookups
+    __table_args__ = (Index("ix_vehicles_make_model_year", make, model, year),)
+
+
+# The longest VIN stored, the 17 characters of the 1981 standard. The vehicle
+# schemas refuse longer ones: VIN_REVERSED would drop their first characters
+VIN_LENGTH = 17
+
+# The VIN reversed, its last characters first, so the b-tree index on it finds
+# a VIN by its ending with a range scan. SQLite has no reverse(): the expression
+# takes VIN_LENGTH characters one by one, past the end of a shorter VIN substr
+# is ''. The positions are literals, the planner only matches an index
+# expression written the same way
+VIN_REVERSED = reduce(
+    operator.add,
+    (
+        func.substr(
+            Vehicle.vin, literal_column(str(i)), literal_column("1"), type_=String
+        )
+        for i in range(VIN_LENGTH, 0, -1)
+    ),
+)
+Index("ix_vehicles_vin_reversed", VIN_REVERSED)
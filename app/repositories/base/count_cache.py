@@ -0,0 +1,49 @@
+from typing import Hashable, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.config import COUNT_CACHE_SIZE, COUNT_CACHE_TTL
+from app.repositories.base.table_versions import (has_changes, table_versions,
+                                                  versions_read)
+from app.utils.cache import TTLCache
+
+
+class CountCache:
+    """
+    Counts of list queries, by query, for as long as the tables they were
+    counted from have not changed
+
+    Entries carry the table versions their transaction began with (see
+    versions_read) and a lookup only takes an entry whose versions are still
+    current, so a commit to any of the tables retires every count of it
+    without scanning the cache.
+    """
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self._cache = TTLCache(maxsize, ttl)
+
+    def get(
+        self, db: Session, key: Hashable, tables: Tuple[str, ...]
+    ) -> Optional[dict]:
+        # A session with uncommitted writes counts them, other sessions must not
+        if has_changes(db):
+            return None
+        entry = self._cache.get(key)
+        if entry is None or entry[0] != table_versions.get(tables):
+            return None
+        return entry[1]
+
+    def set(
+        self, db: Session, key: Hashable, tables: Tuple[str, ...], counts: dict
+    ) -> None:
+        if not has_changes(db):
+            self._cache.set(key, (versions_read(db, tables), counts))
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        return self._cache.stats()
+
+
+count_cache = CountCache(COUNT_CACHE_SIZE, COUNT_CACHE_TTL)
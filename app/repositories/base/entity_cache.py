@@ -0,0 +1,153 @@
+from typing import Any, Dict, Iterable
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session, object_session
+from sqlalchemy.orm.base import instance_state
+
+from app.config import ENTITY_CACHE_SIZE, ENTITY_CACHE_TTL
+from app.database import Base
+from app.repositories.base.table_versions import has_changes
+from app.utils.cache import TTLCache
+
+
+def _columns(entity: Any) -> dict:
+    mapper = inspect(entity).mapper
+    return {attr.key: getattr(entity, attr.key) for attr in mapper.column_attrs}
+
+
+def _instance(db: Session, mapper: Any, values: dict, attach: bool) -> Any:
+    """The session's instance of a cached row, else a new clean detached one"""
+    key = mapper.identity_key_from_primary_key((values["id"],))
+    entity = db.identity_map.get(key)
+    if entity is None:
+        # Built the way the ORM loads a row, without running __init__
+        entity = mapper.class_manager.new_instance()
+        entity.__dict__.update(values)
+        instance_state(entity).key = key
+        if attach:
+            db.add(entity)
+    return entity
+
+
+class EntityCache:
+    """
+    Second-level cache of rows by (model, primary key), read through by the
+    repositories and dropped once a write to the row commits
+
+    Each model gets its own LRU TTLCache of column values rather than ORM
+    objects: a hit builds a fresh instance for the asking session, so threads
+    never share one. A session with uncommitted writes reads the database, it
+    has to see its own changes and must not publish rows that may roll back.
+    """
+
+    def __init__(self, ttls: Dict[str, float], maxsize: int) -> None:
+        self._caches = {table: TTLCache(maxsize, ttl) for table, ttl in ttls.items()}
+
+    def caches(self, model: Any) -> bool:
+        return model.__table__.name in self._caches
+
+    def load(
+        self, db: Session, model: Any, ids: Iterable[int], attach: bool = False
+    ) -> Dict[int, Any]:
+        """
+        Rows of model by id, from the cache or else with one SELECT ... IN
+        that fills it. Ids without a row are left out.
+
+        Args:
+            db (Session): The session asking
+            model (Any): A cached model, see caches()
+            ids (Iterable[int]): Primary keys, None is skipped
+            attach (bool, optional): Add cached rows to the session so changes
+                to them are flushed. Otherwise they are detached snapshots to
+                render, about a tenth of the cost. Defaults to False.
+        Returns:
+            Dict[int, Any]: The rows by id
+        """
+        ids = {entity_id for entity_id in ids if entity_id is not None}
+        if has_changes(db):
+            return self._query(db, model, ids)
+        cache = self._caches[model.__table__.name]
+        mapper = inspect(model)
+        found = {
+            entity_id: _instance(db, mapper, values, attach)
+            for entity_id, values in cache.get_many(ids).items()
+        }
+        missing = [entity_id for entity_id in ids if entity_id not in found]
+        if missing:
+            # A transaction reads from the snapshot it began with, rows it loads
+            # are only as new as the cache was then
+            version = db.info.get("entity_cache_versions", {}).get(
+                model.__table__.name, cache.version
+            )
+            for entity_id, entity in self._query(db, model, missing).items():
+                cache.set(entity_id, _columns(entity), version)
+                found[entity_id] = entity
+        return found
+
+    def forget(self, db: Session, model: Any, entity_id: int) -> None:
+        """Drop a row written in the session's transaction once it commits"""
+        if self.caches(model):
+            rows = db.info.setdefault("forget_rows", set())
+            rows.add((model.__table__.name, entity_id))
+
+    def invalidate(self, table: str, entity_id: int) -> None:
+        self._caches[table].invalidate(entity_id)
+
+    def versions(self) -> Dict[str, int]:
+        return {table: cache.version for table, cache in self._caches.items()}
+
+    def clear(self) -> None:
+        for cache in self._caches.values():
+            cache.clear()
+
+    def stats(self) -> dict:
+        """Size, hits, misses and hit_ratio per table"""
+        stats = {}
+        for table, cache in self._caches.items():
+            stats[table] = cache.stats()
+            lookups = stats[table]["hits"] + stats[table]["misses"]
+            stats[table]["hit_ratio"] = (
+                stats[table]["hits"] / lookups if lookups else 0.0
+            )
+        return stats
+
+    @staticmethod
+    def _query(db: Session, model: Any, ids: Iterable[int]) -> Dict[int, Any]:
+        if not ids:
+            return {}
+        stmt = select(model).where(model.id.in_(ids))
+        return {entity.id: entity for entity in db.execute(stmt).scalars()}
+
+
+entity_cache = EntityCache(ENTITY_CACHE_TTL, ENTITY_CACHE_SIZE)
+
+
+@event.listens_for(Session, "after_begin")
+def _remember_versions(session: Session, transaction, connection) -> None:
+    session.info.setdefault("entity_cache_versions", entity_cache.versions())
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _forget_versions(session: Session, transaction) -> None:
+    if transaction.parent is None:
+        session.info.pop("entity_cache_versions", None)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_written(session: Session) -> None:
+    for table, entity_id in session.info.pop("forget_rows", ()):
+        entity_cache.invalidate(table, entity_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _keep_rolled_back(session: Session) -> None:
+    session.info.pop("forget_rows", None)
+
+
+# Rows changed through the ORM rather than a repository statement
+@event.listens_for(Base, "after_update", propagate=True)
+@event.listens_for(Base, "after_delete", propagate=True)
+def _forget_flushed(mapper, connection, target) -> None:
+    session = object_session(target)
+    if session is not None:
+        entity_cache.forget(session, mapper.class_, target.id)
@@ -1,48 +1,180 @@
-from abc import ABC, abstractmethod
-from typing import Generic, List, Optional, Type, TypeVar
+from abc import ABC
+from datetime import datetime
+from typing import Any, Iterator, List, Optional, Tuple, Type, TypeVar
 
-from sqlalchemy import and_, delete, exists, func, insert, select, update
-from sqlalchemy.orm import Session, joinedload, selectinload
+from pydantic import BaseModel
+from sqlalchemy import (and_, delete, false, func, insert, literal, null, or_,
+                        select, true, tuple_, union_all, update)
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.interfaces import MANYTOONE
 
+from app.models.loading import loader_options
+from app.repositories.base.count_cache import count_cache
+from app.repositories.base.entity_cache import entity_cache
 from app.repositories.base.sql_repository_base import SqlRepositoryBase
+from app.repositories.base.table_versions import mark_changed
+from app.utils.filters import (FILTERABLE_COLUMNS, Filter, related_models,
+                               semi_join)
+from app.utils.pagination import Cursor
 
 T = TypeVar("T")
 
 
+def _insert_values(entity: Any) -> dict:
+    if not isinstance(entity, BaseModel):
+        return dict(entity)
+    return {
+        key: value
+        for key, value in entity.model_dump().items()
+        if value is not None or key in entity.model_fields_set
+    }
+
+
+def _equals(model: Any, filter: dict) -> List[Any]:
+    # Booleans are compared to SQL literals rather than bound parameters, the
+    # planner can only match partial indexes (e.g. live units) against literals
+    return [
+        (
+            getattr(model, key) == (true() if value else false())
+            if isinstance(value, bool)
+            else getattr(model, key) == value
+        )
+        for key, value in filter.items()
+    ]
+
+
+def _relationship_to(model: Any, target: Any) -> str:
+    for relationship in model.__mapper__.relationships:
+        if relationship.mapper.class_ is target:
+            return relationship.key
+    raise ValueError(f"{model.__name__} has no relationship to {target.__name__}")
+
+
+def _from_cache(model: Any, key: str) -> bool:
+    relationship = model.__mapper__.relationships[key]
+    return relationship.direction is MANYTOONE and entity_cache.caches(
+        relationship.mapper.class_
+    )
+
+
+def _update_values(entity: Any) -> dict:
+    if not isinstance(entity, BaseModel):
+        return dict(entity)
+    return entity.model_dump(exclude_unset=True)
+
+
 class SqlRepository(SqlRepositoryBase[T], ABC):
     def __init__(self, db: Session, model: Type[T]):
         self.db = db
         self.model = model
 
-    def _add(self, entity: T) -> T:
-        try:
-            stmt = insert(self.model).values(**entity.__dict__)
-            result = self.db.execute(stmt)
-            self.db.commit()
-            inserted_id = result.inserted_primary_key[0]
-            return Session.get(self.db, self.model, inserted_id)
-        except Exception as e:
-            self.db.rollback()
-            raise e
+    def _changed(self, entity_id: Optional[int] = None) -> None:
+        """
+        Bump the table's change version, and drop the written row from the
+        entity cache, once the write commits
+        """
+        mark_changed(self.db, self.model.__table__.name)
+        if entity_id is not None:
+            entity_cache.forget(self.db, self.model, entity_id)
+
+    def _split_cached(
+        self, relationships: Tuple[str, ...]
+    ) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+        """The many-to-one relationships served by the entity cache, and the rest"""
+        cached = tuple(key for key in relationships if _from_cache(self.model, key))
+        return cached, tuple(key for key in relationships if key not in cached)
+
+    def _load_cached(self, entities: List[T], relationships: Tuple[str, ...]) -> None:
+        """Set many-to-one relationships from the entity cache, one lookup per model"""
+        for key in relationships:
+            relationship = self.model.__mapper__.relationships[key]
+            (column,) = relationship.local_columns
+            foreign_key = self.model.__mapper__.get_property_by_column(column).key
+            targets = entity_cache.load(
+                self.db,
+                relationship.mapper.class_,
+                [getattr(entity, foreign_key) for entity in entities],
+            )
+            for entity in entities:
+                target = targets.get(getattr(entity, foreign_key))
+                set_committed_value(entity, key, target)
+
+    def _add(self, entity: T, **values: Any) -> T:
+        """
+        INSERT an entity and return the written row from the same statement
+
+        Writes the fields set on the schema plus the ones it defaults to a value,
+        unset None fields are left to the column defaults. Nothing is committed,
+        the unit of work owns the transaction.
+
+        Args:
+            entity (T): The schema to insert
+            **values: Extra column values, e.g. a foreign key the schema lacks,
+                taking precedence over the schema's
+        Returns:
+            T: The inserted row, fully loaded
+        """
+        stmt = insert(self.model).values({**_insert_values(entity), **values})
+        self._changed()
+        if self.db.get_bind().dialect.insert_returning:
+            return self.db.scalars(stmt.returning(self.model)).one()
+        result = self.db.execute(stmt)
+        return self.db.get(self.model, result.inserted_primary_key[0])
+
+    def _add_many(self, rows: List[dict]) -> List[int]:
+        """INSERT rows with executemany and return their ids in the order given"""
+        # Core execution on the session's connection, the ORM bulk path adds
+        # nothing for plain dict rows and costs more than the INSERT itself
+        conn = self.db.connection()
+        table = self.model.__table__
+        if not rows:
+            return []
+        self._changed()
+        if conn.dialect.name == "sqlite":
+            # SQLite does not promise RETURNING order, so SQLAlchemy would send a
+            # statement per row. The first INSERT takes the write lock and gets
+            # max(id) + 1, nothing else can insert before we commit, so the rest
+            # are numbered after it and sent as one plain executemany
+            first = conn.execute(insert(table).values(**rows[0]))
+            first_id = first.inserted_primary_key[0]
+            ids = list(range(first_id, first_id + len(rows)))
+            if len(rows) > 1:
+                conn.execute(
+                    insert(table),
+                    [{**row, "id": row_id} for row, row_id in zip(rows[1:], ids[1:])],
+                )
+            return ids
+        if not conn.dialect.insert_executemany_returning_sort_by_parameter_order:
+            return [
+                conn.execute(insert(table).values(**row)).inserted_primary_key[0]
+                for row in rows
+            ]
+        stmt = insert(table).returning(table.c.id, sort_by_parameter_order=True)
+        return list(conn.execute(stmt, rows).scalars())
 
     def _delete(self, entity_id: int):
-        try:
-            stmt = delete(self.model).where(self.model.id == entity_id)
-            self.db.execute(stmt)
-            self.db.commit()
-        except Exception as e:
-            self.db.rollback()
-            raise e
+        stmt = delete(self.model).where(self.model.id == entity_id)
+        self._changed(entity_id)
+        self.db.execute(stmt)
 
     #
-    def _get(self, entity_id: int) -> Optional[T]:
-        try:
-            stmt = select(self.model).where(self.model.id == entity_id)
+    def _get(self, entity_id: int, relationships: Tuple[str, ...] = ()) -> Optional[T]:
+        cached, relationships = self._split_cached(relationships)
+        if not relationships and entity_cache.caches(self.model):
+            entity = entity_cache.load(
+                self.db, self.model, (entity_id,), attach=True
+            ).get(entity_id)
+        else:
+            stmt = (
+                select(self.model)
+                .where(self.model.id == entity_id)
+                .options(*loader_options(self.model, relationships))
+            )
             entity = self.db.execute(stmt).scalar()
-            return entity
-        except Exception as e:
-            self.db.rollback()
-            raise e
+        if entity is not None and cached:
+            self._load_cached([entity], cached)
+        return entity
 
     def _get_all(
         self,
@@ -52,42 +184,243 @@ class SqlRepository(SqlRepositoryBase[T], ABC):
         to_join: bool = False,
         models_to_join: Optional[List[T]] = None,  # List of model classes
         joined_model_filters: Optional[dict] = None,
+        cursor: Optional[Cursor] = None,
+        sort_key: str = "id",
+        relationships: Tuple[str, ...] = (),
+        filters: Optional[Filter] = None,
     ) -> List[T]:
-        try:
-            stmt = select(self.model).offset(skip).limit(limit)
-
-            # Apply filters if provided - filter only applies to the main model
-            if filter:
-                stmt = stmt.filter_by(**filter)
-
-            # Control the loading of related entities
-            if to_join and models_to_join:
-                for model in models_to_join:
-                    stmt = stmt.join(model)
-                    if joined_model_filters:
-                        stmt = stmt.filter_by(**joined_model_filters)
+        descending = sort_key.startswith("-")
+        sort_column = self.model.__table__.columns[sort_key.removeprefix("-")]
+        cached, relationships = self._split_cached(relationships)
+        order_by = (
+            (sort_column.desc(), self.model.id.desc())
+            if descending
+            else (sort_column, self.model.id)
+        )
+        stmt = (
+            self._select(
+                filter,
+                to_join,
+                models_to_join,
+                joined_model_filters,
+                relationships,
+                filters,
+            )
+            .order_by(*order_by)
+            .limit(limit)
+        )
+
+        # Seek past the last row of the previous page instead of scanning skipped rows
+        if cursor is not None:
+            stmt = stmt.where(self._seek(sort_column, cursor, descending))
+        elif skip:
+            stmt = stmt.offset(skip)
+
+        params = filters.params if filters is not None else {}
+        entities = self.db.execute(stmt, params).scalars().all()
+        if cached:
+            self._load_cached(entities, cached)
+        return entities
+
+    def _stream(
+        self,
+        filter: Optional[dict] = None,
+        to_join: bool = False,
+        models_to_join: Optional[List[T]] = None,
+        joined_model_filters: Optional[dict] = None,
+        relationships: Tuple[str, ...] = (),
+        batch_size: int = 1000,
+        filters: Optional[Filter] = None,
+    ) -> Iterator[T]:
+        """Yield every matching row, fetching batch_size rows at a time from the cursor"""
+        cached, relationships = self._split_cached(relationships)
+        stmt = (
+            self._select(
+                filter,
+                to_join,
+                models_to_join,
+                joined_model_filters,
+                relationships,
+                filters,
+            )
+            .order_by(self.model.id)
+            .execution_options(yield_per=batch_size)
+        )
+        params = filters.params if filters is not None else {}
+        for batch in self.db.execute(stmt, params).scalars().partitions():
+            if cached:
+                self._load_cached(batch, cached)
+            yield from batch
+
+    def _count(
+        self,
+        filter: Optional[dict] = None,
+        to_join: bool = False,
+        models_to_join: Optional[List[T]] = None,
+        joined_model_filters: Optional[dict] = None,
+        filters: Optional[Filter] = None,
+        facets: Tuple[Tuple[str, str], ...] = (),
+    ) -> dict:
+        """
+        Rows matching the filters in all, and per value of each facet
+
+        The matching ids are selected once into a CTE, which SQLite materializes
+        as it is read more than once, and the total and every facet are grouped
+        from it in one UNION ALL statement. Counts are kept in count_cache until
+        one of the tables they were read from changes.
+
+        Args:
+            facets (Tuple[Tuple[str, str], ...], optional): Facet names and the
+                column path they count, see app.utils.filters.parse_facets. Defaults to ().
+        Returns:
+            dict: {"total": int, "facets": {name: {value: int}}}
+        """
+        models = list(models_to_join or ()) if to_join else []
+        models += related_models(self.model, [path for _, path in facets])
+        if filters is not None:
+            models += filters.joined
+        tables = tuple(
+            sorted({self.model.__table__.name, *(m.__table__.name for m in models)})
+        )
+        key = (
+            self.model.__table__.name,
+            tuple(sorted(filter.items())) if filter else (),
+            tuple(m.__table__.name for m in models_to_join or ()) if to_join else (),
+            tuple(sorted(joined_model_filters.items())) if joined_model_filters else (),
+            filters.key if filters is not None else (),
+            facets,
+        )
+        counts = count_cache.get(self.db, key, tables)
+        if counts is not None:
+            return counts
+
+        relationships = self.model.__mapper__.relationships
+        columns = {"id": self.model.id}
+        for _, path in facets:
+            relationship, _, name = path.rpartition(".")
+            if relationship:
+                ((local, _),) = relationships[relationship].local_remote_pairs
+                columns[local.key] = local
             else:
-                for relationship in self.model.__mapper__.relationships:
-                    # use class-bound attribute instead of string or error occurs
-                    relationship_attr = getattr(self.model, relationship.key)
-                    stmt = stmt.options(selectinload(relationship_attr))
-
-            entities = self.db.execute(stmt).scalars().all()
-            return entities
-        except Exception as e:
-            self.db.rollback()
-            raise e
-
-    def _update(self, entity: T, entity_id: int) -> T:
-        try:
-            stmt = (
-                update(self.model)
-                .where(self.model.id == entity_id)
-                .values(**entity.__dict__)
+                columns[name] = self.model.__table__.columns[name]
+        matched = (
+            self._select(
+                filter, to_join, models_to_join, joined_model_filters, filters=filters
             )
-            self.db.execute(stmt)
-            self.db.commit()
-            return self.db.query(self.model).get(entity_id)
-        except Exception as e:
-            self.db.rollback()
-            raise e
+            .with_only_columns(*columns.values())
+            .cte("matched")
+        )
+        parts = [select(literal(""), null(), func.count()).select_from(matched)]
+        for facet, path in facets:
+            relationship, _, name = path.rpartition(".")
+            if relationship:
+                ((local, remote),) = relationships[relationship].local_remote_pairs
+                column = remote.table.columns[name]
+                source = matched.outerjoin(
+                    remote.table, remote == matched.columns[local.key]
+                )
+            else:
+                column, source = matched.columns[name], matched
+            parts.append(
+                select(literal(facet), column, func.count())
+                .select_from(source)
+                .group_by(column)
+            )
+
+        params = filters.params if filters is not None else {}
+        counts = {"total": 0, "facets": {facet: {} for facet, _ in facets}}
+        for facet, value, count in self.db.execute(union_all(*parts), params):
+            if facet:
+                counts["facets"][facet][value] = count
+            else:
+                counts["total"] = count
+        count_cache.set(self.db, key, tables, counts)
+        return counts
+
+    def _select(
+        self,
+        filter: Optional[dict] = None,
+        to_join: bool = False,
+        models_to_join: Optional[List[T]] = None,
+        joined_model_filters: Optional[dict] = None,
+        relationships: Tuple[str, ...] = (),
+        filters: Optional[Filter] = None,
+    ):
+        stmt = select(self.model).options(*loader_options(self.model, relationships))
+
+        # Apply filters if provided - filter only applies to the main model
+        if filter:
+            stmt = stmt.where(*_equals(self.model, filter))
+        # Values are bound when the statement runs, see app.utils.filters
+        if filters is not None:
+            stmt = stmt.where(filters.where)
+
+        # Rows with a related row of each joined model, as semi-joins so a
+        # collection never repeats a row. A joined filter applies to the
+        # models that have its columns, see app.utils.filters.check_joins
+        if to_join and models_to_join:
+            for model in models_to_join:
+                columns = FILTERABLE_COLUMNS.get(model, ())
+                criteria = _equals(
+                    model,
+                    {
+                        key: value
+                        for key, value in (joined_model_filters or {}).items()
+                        if key in columns
+                    },
+                )
+                stmt = stmt.where(
+                    semi_join(
+                        self.model, _relationship_to(self.model, model), *criteria
+                    )
+                )
+        return stmt
+
+    def _seek(self, sort_column, cursor: Cursor, descending: bool = False):
+        if sort_column.key == "id":
+            return (
+                self.model.id < cursor.id if descending else self.model.id > cursor.id
+            )
+        value = cursor.value
+        if value is not None and sort_column.type.python_type is datetime:
+            value = datetime.fromisoformat(value)
+        # SQLite sorts NULLs first, so a NULL cursor still has every non-NULL row
+        # ahead of it, and descending the NULLs come last after every other row
+        if descending:
+            if value is None:
+                return and_(sort_column.is_(None), self.model.id < cursor.id)
+            return or_(
+                tuple_(sort_column, self.model.id) < tuple_(value, cursor.id),
+                sort_column.is_(None),
+            )
+        if value is None:
+            return or_(
+                and_(sort_column.is_(None), self.model.id > cursor.id),
+                sort_column.is_not(None),
+            )
+        # A row value comparison seeks straight into an index on the sort column,
+        # the spelled out OR form makes SQLite walk the index from the start
+        return tuple_(sort_column, self.model.id) > tuple_(value, cursor.id)
+
+    def _update(self, entity: T, entity_id: int) -> Optional[T]:
+        """
+        UPDATE the fields set on entity and return the written row from the same
+        statement, None if there is no row with entity_id. Nothing is committed.
+        """
+        values = _update_values(entity)
+        if not values:
+            return self._get(entity_id)
+        stmt = (
+            update(self.model)
+            .where(self.model.id == entity_id)
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        self._changed(entity_id)
+        if self.db.get_bind().dialect.update_returning:
+            return self.db.scalars(
+                stmt.returning(self.model),
+                execution_options={"populate_existing": True},
+            ).one_or_none()
+        self.db.execute(stmt)
+        return self.db.get(self.model, entity_id, populate_existing=True)
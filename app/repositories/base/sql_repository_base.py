@@ -1,12 +1,19 @@
 from abc import ABC, abstractmethod
-from typing import Generic, List, Optional, TypeVar
+from typing import Any, Generic, List, Optional, Tuple, TypeVar
+
+from app.utils.filters import Filter
+from app.utils.pagination import Cursor
 
 T = TypeVar("T")
 
 
 class SqlRepositoryBase(Generic[T], ABC):
     @abstractmethod
-    def _add(self, entity: T) -> T:
+    def _add(self, entity: T, **values: Any) -> T:
+        raise NotImplementedError()
+
+    @abstractmethod
+    def _add_many(self, rows: List[dict]) -> List[int]:
         raise NotImplementedError()
 
     @abstractmethod
@@ -14,7 +21,7 @@ class SqlRepositoryBase(Generic[T], ABC):
         raise NotImplementedError()
 
     @abstractmethod
-    def _get(self, entity_id: int) -> Optional[T]:
+    def _get(self, entity_id: int, relationships: Tuple[str, ...] = ()) -> Optional[T]:
         raise NotImplementedError()
 
     @abstractmethod
@@ -26,6 +33,10 @@ class SqlRepositoryBase(Generic[T], ABC):
         to_join: bool = False,
         models_to_join: Optional[List[T]] = None,
         joined_model_filters: Optional[dict] = None,
+        cursor: Optional[Cursor] = None,
+        sort_key: str = "id",
+        relationships: Tuple[str, ...] = (),
+        filters: Optional[Filter] = None,
     ) -> List[T]:
         """
         This method is used to get all rows from a table in the database with the option to apply filters and joins
@@ -37,11 +48,27 @@ class SqlRepositoryBase(Generic[T], ABC):
             to_join (bool, optional): Whether to join another table. Defaults to False.
             models_to_join (Optional[List[T]], optional): The model to join. Defaults to None.
             joined_model_filters (Optional[dict], optional): Filters to apply to the joined table. Defaults to None.
+            cursor (Optional[Cursor], optional): Keyset position to continue after, takes precedence over skip. Defaults to None.
+            sort_key (str, optional): Column to order by, -name for descending, ties are broken by id. Defaults to "id".
+            relationships (Tuple[str, ...], optional): Relationships to eager load, see app.models.loading. Defaults to ().
+            filters (Optional[Filter], optional): Compiled filter terms, see app.utils.filters. Defaults to None.
         Returns:
             List[T]: A list of rows from the database
         """
         raise NotImplementedError()
 
     @abstractmethod
-    def _update(self, entity: T, entity_id: int) -> T:
+    def _count(
+        self,
+        filter: Optional[dict] = None,
+        to_join: bool = False,
+        models_to_join: Optional[List[T]] = None,
+        joined_model_filters: Optional[dict] = None,
+        filters: Optional[Filter] = None,
+        facets: Tuple[Tuple[str, str], ...] = (),
+    ) -> dict:
+        raise NotImplementedError()
+
+    @abstractmethod
+    def _update(self, entity: T, entity_id: int) -> Optional[T]:
         raise NotImplementedError()
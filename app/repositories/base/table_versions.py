@@ -0,0 +1,97 @@
+import os
+import threading
+from typing import Dict, Iterable, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from app.database import Base
+
+
+class TableVersions:
+    """
+    A change counter per table, bumped once a transaction writing to it commits
+
+    Readers take the versions before they query: a write that commits in
+    between bumps them afterwards, so a response built from the old rows never
+    carries the new versions. Counters live in this process and start again
+    with it, `epoch` tells one run's versions from another's.
+
+    Attributes:
+        epoch (str): Random per process
+    """
+
+    def __init__(self) -> None:
+        self.epoch = os.urandom(4).hex()
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, tables: Iterable[str]) -> Tuple[int, ...]:
+        return tuple(self._versions.get(table, 0) for table in tables)
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._versions)
+
+    def bump(self, tables: Iterable[str]) -> None:
+        with self._lock:
+            for table in tables:
+                self._versions[table] = self._versions.get(table, 0) + 1
+
+
+table_versions = TableVersions()
+
+
+def mark_changed(db: Session, *tables: str) -> None:
+    """Record tables written in the session's transaction, bumped when it commits"""
+    db.info.setdefault("changed_tables", set()).update(tables)
+
+
+def has_changes(db: Session) -> bool:
+    """Whether the session's transaction has written anything yet"""
+    return bool(db.info.get("changed_tables"))
+
+
+def versions_read(db: Session, tables: Iterable[str]) -> Tuple[int, ...]:
+    """
+    The versions of tables when the session's transaction began, no newer than
+    the rows it reads. Current versions outside a transaction.
+    """
+    versions = db.info.get("table_versions")
+    if versions is None:
+        return table_versions.get(tables)
+    return tuple(versions.get(table, 0) for table in tables)
+
+
+@event.listens_for(Session, "after_begin")
+def _remember_versions(session: Session, transaction, connection) -> None:
+    session.info.setdefault("table_versions", table_versions.snapshot())
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _forget_versions(session: Session, transaction) -> None:
+    if transaction.parent is None:
+        session.info.pop("table_versions", None)
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_changed(session: Session) -> None:
+    tables = session.info.pop("changed_tables", None)
+    if tables:
+        table_versions.bump(tables)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_changed(session: Session) -> None:
+    session.info.pop("changed_tables", None)
+
+
+# Objects changed through the ORM rather than a repository statement, e.g. an
+# attribute set on a loaded user, or the units a deleted vehicle lets go of
+@event.listens_for(Base, "after_insert", propagate=True)
+@event.listens_for(Base, "after_update", propagate=True)
+@event.listens_for(Base, "after_delete", propagate=True)
+def _mark_flushed(mapper, connection, target) -> None:
+    session = object_session(target)
+    if session is not None:
+        mark_changed(session, mapper.local_table.name)
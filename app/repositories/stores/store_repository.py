@@ -1,4 +1,4 @@
-from typing import Any, List, Optional
+from typing import Any, List, Optional, Tuple
 
 from sqlalchemy.orm import Session
 
@@ -12,6 +12,8 @@ from app.models.users import User
 from app.models.vehicles import Vehicle
 from app.repositories.base.sql_repository import SqlRepository
 from app.repositories.stores.store_repository_base import StoreRepositoryBase
+from app.utils.filters import Filter
+from app.utils.pagination import Cursor
 
 
 class StoreRepository(StoreRepositoryBase, SqlRepository[Store]):
@@ -24,8 +26,10 @@ class StoreRepository(StoreRepositoryBase, SqlRepository[Store]):
     def delete_store(self, store_id: int) -> Optional[Store]:
         return super()._delete(store_id)
 
-    def get_store(self, store_id: int) -> Optional[Store]:
-        return super()._get(store_id)
+    def get_store(
+        self, store_id: int, relationships: Tuple[str, ...] = ()
+    ) -> Optional[Store]:
+        return super()._get(store_id, relationships)
 
     def get_all_stores(
         self,
@@ -35,9 +39,22 @@ class StoreRepository(StoreRepositoryBase, SqlRepository[Store]):
         to_join: bool = False,
         models_to_join: Optional[List[str]] = None,
         joined_model_filters: Optional[dict] = None,
+        cursor: Optional[Cursor] = None,
+        sort_key: str = "id",
+        relationships: Tuple[str, ...] = (),
+        filters: Optional[Filter] = None,
     ) -> List[Store]:
         return super()._get_all(
-            skip, limit, filter, to_join, models_to_join, joined_model_filters
+            skip,
+            limit,
+            filter,
+            to_join,
+            models_to_join,
+            joined_model_filters,
+            cursor,
+            sort_key,
+            relationships,
+            filters,
         )
 
     def update_store(self, store: Store, store_id: int) -> Store:
@@ -1,8 +1,10 @@
 from abc import ABC, abstractmethod
-from typing import Any, List, Optional
+from typing import Any, List, Optional, Tuple
 
 from app.models.stores import Store
 from app.repositories.base.sql_repository import SqlRepository
+from app.utils.filters import Filter
+from app.utils.pagination import Cursor
 
 
 class StoreRepositoryBase(SqlRepository[Store], ABC):
@@ -15,7 +17,9 @@ class StoreRepositoryBase(SqlRepository[Store], ABC):
         raise NotImplementedError()
 
     @abstractmethod
-    def get_store(self, entity_id: int) -> Optional[Store]:
+    def get_store(
+        self, entity_id: int, relationships: Tuple[str, ...] = ()
+    ) -> Optional[Store]:
         raise NotImplementedError()
 
     @abstractmethod
@@ -27,6 +31,10 @@ class StoreRepositoryBase(SqlRepository[Store], ABC):
         to_join: bool = False,
         models_to_join: Optional[List[str]] = None,
         joined_model_filters: Optional[dict] = None,
+        cursor: Optional[Cursor] = None,
+        sort_key: str = "id",
+        relationships: Tuple[str, ...] = (),
+        filters: Optional[Filter] = None,
     ) -> List[Store]:
         raise NotImplementedError()
 
@@ -1,32 +1,46 @@
-from typing import List, Optional
+from typing import Any, Iterator, List, Optional, Tuple
 
+from sqlalchemy import func, null, select, tuple_
 from sqlalchemy.orm import Session
 
+from app.config import SEARCH_RANK_WINDOW
 from app.exceptions.custom_exceptions import (
     AddUnitException,
     DeleteUnitException,
     UpdateUnitException,
     GetUnitException
 )
+from app.models.loading import loader_options
+from app.models.search import SEARCH_TABLE, unit_search
 from app.models.units import Unit
 
 from app.repositories.base.sql_repository import SqlRepository
 
 from app.repositories.units.unit_repository_base import UnitRepositoryBase
+from app.utils.filters import Filter
+from app.utils.pagination import Cursor
 
 
 class UnitRepository(UnitRepositoryBase, SqlRepository[Unit]):
     def __init__(self, db: Session) -> None:
         super().__init__(db, Unit)
 
-    def add_unit(self, unit: Unit) -> Unit:
+    def add_unit(self, unit: Unit, **values) -> Unit:
         try:
-            return super()._add(unit)
+            return super()._add(unit, **values)
         except Exception as e:
             message = f"Error adding unit with id {unit.id}"
             error_code = "unit_add_error"
             raise AddUnitException(message, error_code)
 
+    def add_units(self, units: List[dict]) -> List[int]:
+        try:
+            return super()._add_many(units)
+        except Exception as e:
+            message = f"Error adding {len(units)} units ::: {e}"
+            error_code = "units_add_many_error"
+            raise AddUnitException(message, error_code)
+
     def delete_unit(self, unit_id: int) -> Unit:
         try:
             return super()._delete(unit_id)
@@ -35,14 +49,38 @@ class UnitRepository(UnitRepositoryBase, SqlRepository[Unit]):
             error_code = "unit_delete_error"
             raise DeleteUnitException(message, error_code)
 
-    def get_unit(self, unit_id: int) -> Optional[Unit]:
+    def get_unit(
+        self, unit_id: int, relationships: Tuple[str, ...] = ()
+    ) -> Optional[Unit]:
         try:
-            return super()._get(unit_id)
+            return super()._get(unit_id, relationships)
         except Exception as e:
             message = f"Error getting unit with id {unit_id}"
             error_code = "unit_get_error"
             raise DeleteUnitException(message, error_code)
 
+    def get_units_by_stock_number(
+        self, stock_number: str, limit: int, relationships: Tuple[str, ...] = ()
+    ) -> List[Unit]:
+        """Units with this stock number, by id, found through ix_units_stock_number"""
+        try:
+            cached, relationships = self._split_cached(relationships)
+            stmt = (
+                select(Unit)
+                .where(Unit.stock_number == stock_number)
+                .options(*loader_options(Unit, relationships))
+                .order_by(Unit.id)
+                .limit(limit)
+            )
+            units = list(self.db.execute(stmt).scalars())
+            if cached:
+                self._load_cached(units, cached)
+            return units
+        except Exception as e:
+            message = f"Error looking up units with stock number {stock_number} ::: {e}"
+            error_code = "units_lookup_error"
+            raise GetUnitException(message, error_code)
+
     def get_all_units(
         self,
         skip: int,
@@ -51,16 +89,156 @@ class UnitRepository(UnitRepositoryBase, SqlRepository[Unit]):
         to_join: bool = False,
         models_to_join: Optional[List[str]] = None,
         joined_model_filters: Optional[dict] = None,
+        cursor: Optional[Cursor] = None,
+        sort_key: str = "id",
+        relationships: Tuple[str, ...] = (),
+        filters: Optional[Filter] = None,
     ) -> List[Unit]:
         try:
             return super()._get_all(
-            skip, limit, filter, to_join, models_to_join, joined_model_filters
-        )
+                skip,
+                limit,
+                filter,
+                to_join,
+                models_to_join,
+                joined_model_filters,
+                cursor,
+                sort_key,
+                relationships,
+                filters,
+            )
         except Exception as e:
             message = f"Error getting all units"
             error_code = "units_get_all_error"
             raise GetUnitException(message, error_code)
 
+    def stream_units(
+        self,
+        filter: Optional[dict] = None,
+        to_join: bool = False,
+        models_to_join: Optional[List[str]] = None,
+        joined_model_filters: Optional[dict] = None,
+        relationships: Tuple[str, ...] = (),
+        batch_size: int = 1000,
+        filters: Optional[Filter] = None,
+    ) -> Iterator[Unit]:
+        return super()._stream(
+            filter,
+            to_join,
+            models_to_join,
+            joined_model_filters,
+            relationships,
+            batch_size,
+            filters,
+        )
+
+    def count_units(
+        self,
+        filter: Optional[dict] = None,
+        to_join: bool = False,
+        models_to_join: Optional[List[str]] = None,
+        joined_model_filters: Optional[dict] = None,
+        filters: Optional[Filter] = None,
+        facets: Tuple[Tuple[str, str], ...] = (),
+    ) -> dict:
+        try:
+            return super()._count(
+                filter, to_join, models_to_join, joined_model_filters, filters, facets
+            )
+        except Exception as e:
+            message = f"Error counting units"
+            error_code = "units_count_error"
+            raise GetUnitException(message, error_code)
+
+    def search_units(
+        self,
+        match: str,
+        limit: int,
+        cursor: Optional[Cursor] = None,
+        relationships: Tuple[str, ...] = (),
+    ) -> List[Tuple[Unit, Optional[float]]]:
+        """
+        Units matching an FTS5 expression, best BM25 rank first, with their rank
+
+        Only the newest SEARCH_RANK_WINDOW matches are ranked: FTS5 hands them
+        over in rowid order, so the window is read in one pass and a word
+        matching hundreds of thousands of units costs as much as a rare one.
+        Narrower searches are ranked in full. Older matches follow the ranked
+        ones newest first, with no rank, so paging reaches every match.
+
+        Args:
+            match (str): The MATCH expression, see app.utils.search.match_query
+            limit (int): Maximum number of rows to return
+            cursor (Optional[Cursor], optional): The (rank, id) to continue after,
+                a None rank continues the unranked matches. Defaults to None.
+            relationships (Tuple[str, ...], optional): Relationships to load. Defaults to ().
+        Returns:
+            List[Tuple[Unit, Optional[float]]]: The units and their rank, lower
+                is better, None past the ranked window
+        """
+        try:
+            cached, relationships = self._split_cached(relationships)
+            matches = unit_search.c[SEARCH_TABLE].match(match)
+            window = (
+                select(unit_search.c.rowid, unit_search.c.rank)
+                .where(matches)
+                .order_by(unit_search.c.rowid.desc())
+                .limit(SEARCH_RANK_WINDOW)
+                .subquery()
+            )
+            rows = []
+            if cursor is None or cursor.value is not None:
+                # Rank on the index alone and join only the page: joined before
+                # the LIMIT, every matching unit row would be read to be sorted
+                ranked = (
+                    select(window.c.rowid, window.c.rank)
+                    .order_by(window.c.rank, window.c.rowid)
+                    .limit(limit)
+                )
+                if cursor is not None:
+                    ranked = ranked.where(
+                        tuple_(window.c.rank, window.c.rowid)
+                        > tuple_(cursor.value, cursor.id)
+                    )
+                ranked = ranked.subquery()
+                rows = self._search_page(ranked, relationships, ranked.c.rank, Unit.id)
+                older = (
+                    unit_search.c.rowid
+                    < select(func.min(window.c.rowid)).scalar_subquery()
+                )
+            else:
+                older = unit_search.c.rowid < cursor.id
+            if len(rows) < limit:
+                # The window ran out, the older matches follow by rowid, which
+                # FTS5 reads backwards from where the window stopped
+                unranked = (
+                    select(unit_search.c.rowid, null().label("rank"))
+                    .where(matches, older)
+                    .order_by(unit_search.c.rowid.desc())
+                    .limit(limit - len(rows))
+                )
+                rows += self._search_page(
+                    unranked.subquery(), relationships, Unit.id.desc()
+                )
+            if cached:
+                self._load_cached([unit for unit, _ in rows], cached)
+            return rows
+        except Exception as e:
+            message = f"Error searching units ::: {e}"
+            error_code = "units_search_error"
+            raise GetUnitException(message, error_code)
+
+    def _search_page(
+        self, page: Any, relationships: Tuple[str, ...], *order_by: Any
+    ) -> List[Tuple[Unit, Optional[float]]]:
+        stmt = (
+            select(Unit, page.c.rank)
+            .join(page, page.c.rowid == Unit.id)
+            .options(*loader_options(Unit, relationships))
+            .order_by(*order_by)
+        )
+        return self.db.execute(stmt).all()
+
     def update_unit(self, unit: Unit, unit_id: int) -> Unit:
         try:
             return super()._update(unit, unit_id)
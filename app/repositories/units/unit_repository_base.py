@@ -1,13 +1,19 @@
 from abc import ABC, abstractmethod
-from typing import Any, List, Optional
+from typing import Any, Iterator, List, Optional, Tuple
 
 from app.models.units import Unit
 from app.repositories.base.sql_repository import SqlRepository
+from app.utils.filters import Filter
+from app.utils.pagination import Cursor
 
 
 class UnitRepositoryBase(SqlRepository[Unit], ABC):
     @abstractmethod
-    def add_unit(self, entity: Unit) -> Unit:
+    def add_unit(self, entity: Unit, **values: Any) -> Unit:
+        raise NotImplementedError()
+
+    @abstractmethod
+    def add_units(self, entities: List[dict]) -> List[int]:
         raise NotImplementedError()
 
     @abstractmethod
@@ -15,7 +21,15 @@ class UnitRepositoryBase(SqlRepository[Unit], ABC):
         raise NotImplementedError()
 
     @abstractmethod
-    def get_unit(self, entity_id: int) -> Optional[Unit]:
+    def get_unit(
+        self, entity_id: int, relationships: Tuple[str, ...] = ()
+    ) -> Optional[Unit]:
+        raise NotImplementedError()
+
+    @abstractmethod
+    def get_units_by_stock_number(
+        self, stock_number: str, limit: int, relationships: Tuple[str, ...] = ()
+    ) -> List[Unit]:
         raise NotImplementedError()
 
     @abstractmethod
@@ -27,9 +41,48 @@ class UnitRepositoryBase(SqlRepository[Unit], ABC):
         to_join: bool = False,
         models_to_join: Optional[List[str]] = None,
         joined_model_filters: Optional[dict] = None,
+        cursor: Optional[Cursor] = None,
+        sort_key: str = "id",
+        relationships: Tuple[str, ...] = (),
+        filters: Optional[Filter] = None,
     ) -> List[Unit]:
         raise NotImplementedError()
 
+    @abstractmethod
+    def stream_units(
+        self,
+        filter: Optional[dict] = None,
+        to_join: bool = False,
+        models_to_join: Optional[List[str]] = None,
+        joined_model_filters: Optional[dict] = None,
+        relationships: Tuple[str, ...] = (),
+        batch_size: int = 1000,
+        filters: Optional[Filter] = None,
+    ) -> Iterator[Unit]:
+        raise NotImplementedError()
+
+    @abstractmethod
+    def count_units(
+        self,
+        filter: Optional[dict] = None,
+        to_join: bool = False,
+        models_to_join: Optional[List[str]] = None,
+        joined_model_filters: Optional[dict] = None,
+        filters: Optional[Filter] = None,
+        facets: Tuple[Tuple[str, str], ...] = (),
+    ) -> dict:
+        raise NotImplementedError()
+
+    @abstractmethod
+    def search_units(
+        self,
+        match: str,
+        limit: int,
+        cursor: Optional[Cursor] = None,
+        relationships: Tuple[str, ...] = (),
+    ) -> List[Tuple[Unit, Optional[float]]]:
+        raise NotImplementedError()
+
     @abstractmethod
     def update_unit(self, entity: Unit, entity_id: int) -> Unit:
         raise NotImplementedError()
@@ -1,4 +1,4 @@
-from typing import List, Optional
+from typing import Any, List, Optional, Tuple
 
 from sqlalchemy.orm import Session
 
@@ -9,6 +9,7 @@ from app.exceptions.custom_exceptions import (AddUserException,
 from app.models.users import User
 from app.repositories.base.sql_repository import SqlRepository
 from app.repositories.users.user_repository_base import UserRepositoryBase
+from app.utils.pagination import Cursor
 
 
 class UserRepository(UserRepositoryBase, SqlRepository[User]):
@@ -16,15 +17,24 @@ class UserRepository(UserRepositoryBase, SqlRepository[User]):
         super().__init__(db, User)
 
 
-    def add_user(self, user: User) -> User:
+    def add_user(self, user: User, **values: Any) -> User:
         try:
-            return super()._add(user)
+            return super()._add(user, **values)
         except Exception as e:
             message = f"Error adding {user}"
             error_code = "user_add_error"
             raise AddUserException(message, error_code)
 
 
+    def add_users(self, users: List[dict]) -> List[int]:
+        try:
+            return super()._add_many(users)
+        except Exception as e:
+            message = f"Error adding {len(users)} users ::: {e}"
+            error_code = "users_add_many_error"
+            raise AddUserException(message, error_code)
+
+
     def delete_user(self, user_id: int) -> User:
         try:
             return super()._delete(user_id)
@@ -34,9 +44,11 @@ class UserRepository(UserRepositoryBase, SqlRepository[User]):
             raise DeleteUserException(message, error_code)
 
 
-    def get_user(self, user_id: int) -> Optional[User]:
+    def get_user(
+        self, user_id: int, relationships: Tuple[str, ...] = ()
+    ) -> Optional[User]:
         try:
-            return super()._get(user_id)
+            return super()._get(user_id, relationships)
         except Exception as e:
             message = f"Error getting user with id {user_id}"
             error_code = "user_get_error"
@@ -51,9 +63,20 @@ class UserRepository(UserRepositoryBase, SqlRepository[User]):
         to_join: bool = False,
         models_to_join: Optional[List[str]] = None,
         joined_model_filters: Optional[dict] = None,
+        cursor: Optional[Cursor] = None,
+        sort_key: str = "id",
+        relationships: Tuple[str, ...] = (),
     ) -> List[User]:
         return super()._get_all(
-            skip, limit, filter, to_join, models_to_join, joined_model_filters
+            skip,
+            limit,
+            filter,
+            to_join,
+            models_to_join,
+            joined_model_filters,
+            cursor,
+            sort_key,
+            relationships,
         )
 
 
@@ -1,13 +1,18 @@
 from abc import ABC, abstractmethod
-from typing import Any, List, Optional
+from typing import Any, List, Optional, Tuple
 
 from app.models.users import User
 from app.repositories.base.sql_repository import SqlRepository
+from app.utils.pagination import Cursor
 
 
 class UserRepositoryBase(SqlRepository[User], ABC):
     @abstractmethod
-    def add_user(self, user: User) -> User:
+    def add_user(self, user: User, **values: Any) -> User:
+        raise NotImplementedError()
+
+    @abstractmethod
+    def add_users(self, users: List[dict]) -> List[int]:
         raise NotImplementedError()
 
     @abstractmethod
@@ -15,7 +20,9 @@ class UserRepositoryBase(SqlRepository[User], ABC):
         raise NotImplementedError()
 
     @abstractmethod
-    def get_user(self, user_id: int) -> Optional[User]:
+    def get_user(
+        self, user_id: int, relationships: Tuple[str, ...] = ()
+    ) -> Optional[User]:
         raise NotImplementedError()
 
     @abstractmethod
@@ -27,6 +34,9 @@ class UserRepositoryBase(SqlRepository[User], ABC):
         to_join: bool = False,
         models_to_join: Optional[List[str]] = None,
         joined_model_filters: Optional[dict] = None,
+        cursor: Optional[Cursor] = None,
+        sort_key: str = "id",
+        relationships: Tuple[str, ...] = (),
     ) -> List[User]:
         raise NotImplementedError()
 
@@ -1,11 +1,15 @@
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 
-from app.models.vehicles import Vehicle
+from app.models.loading import loader_options
+from app.models.vehicles import VIN_REVERSED, Vehicle
 from app.repositories.base.sql_repository import SqlRepository
 from app.repositories.vehicles.vehicle_repository_base import \
     VehicleRepositoryBase
+from app.utils.filters import Filter
+from app.utils.pagination import Cursor
 
 
 class VehicleRepository(VehicleRepositoryBase, SqlRepository[Vehicle]):
@@ -15,11 +19,36 @@ class VehicleRepository(VehicleRepositoryBase, SqlRepository[Vehicle]):
     def add_vehicle(self, entity: Vehicle) -> Vehicle:
         return super()._add(entity)
 
+    def add_vehicles(self, entities: List[dict]) -> List[int]:
+        return super()._add_many(entities)
+
     def delete_vehicle(self, vehicle_id: int) -> Vehicle:
         return super()._delete(vehicle_id)
 
-    def get_vehicle(self, vehicle_id: int) -> Optional[Vehicle]:
-        return super()._get(vehicle_id)
+    def get_vehicle(
+        self, vehicle_id: int, relationships: Tuple[str, ...] = ()
+    ) -> Optional[Vehicle]:
+        return super()._get(vehicle_id, relationships)
+
+    def get_vehicles_by_vin_suffix(
+        self, vin_suffix: str, limit: int, relationships: Tuple[str, ...] = ()
+    ) -> List[Vehicle]:
+        """
+        Vehicles whose VIN ends with vin_suffix, by id
+
+        The suffix reversed is a prefix of VIN_REVERSED: a range scan of
+        ix_vehicles_vin_reversed from it to the first string not starting with it.
+        """
+        start = vin_suffix[::-1]
+        end = start[:-1] + chr(ord(start[-1]) + 1)
+        stmt = (
+            select(Vehicle)
+            .where(VIN_REVERSED >= start, VIN_REVERSED < end)
+            .options(*loader_options(Vehicle, relationships))
+            .order_by(Vehicle.id)
+            .limit(limit)
+        )
+        return list(self.db.execute(stmt).scalars())
 
     def get_all_vehicles(
         self,
@@ -29,7 +58,33 @@ class VehicleRepository(VehicleRepositoryBase, SqlRepository[Vehicle]):
         to_join: bool = False,
         models_to_join: Optional[List[str]] = None,
         joined_model_filters: Optional[dict] = None,
+        cursor: Optional[Cursor] = None,
+        sort_key: str = "id",
+        relationships: Tuple[str, ...] = (),
+        filters: Optional[Filter] = None,
     ) -> List[Vehicle]:
         return super()._get_all(
-            skip, limit, filter, to_join, models_to_join, joined_model_filters
+            skip,
+            limit,
+            filter,
+            to_join,
+            models_to_join,
+            joined_model_filters,
+            cursor,
+            sort_key,
+            relationships,
+            filters,
+        )
+
+    def count_vehicles(
+        self,
+        filter: Optional[dict] = None,
+        to_join: bool = False,
+        models_to_join: Optional[List[str]] = None,
+        joined_model_filters: Optional[dict] = None,
+        filters: Optional[Filter] = None,
+        facets: Tuple[Tuple[str, str], ...] = (),
+    ) -> dict:
+        return super()._count(
+            filter, to_join, models_to_join, joined_model_filters, filters, facets
         )
@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
 from app.models.vehicles import Vehicle
 from app.repositories.base.sql_repository import SqlRepository
@@ -10,10 +10,22 @@ class VehicleRepositoryBase(SqlRepository[Vehicle], ABC):
     def add_vehicle(self, entity: Vehicle) -> Vehicle:
         raise NotImplementedError()
 
+    @abstractmethod
+    def add_vehicles(self, entities: List[dict]) -> List[int]:
+        raise NotImplementedError()
+
     @abstractmethod
     def delete_vehicle(self, vehicle_id: int) -> Vehicle:
         raise NotImplementedError()
 
     @abstractmethod
-    def get_vehicle(self, vehicle_id: int) -> Optional[Vehicle]:
+    def get_vehicle(
+        self, vehicle_id: int, relationships: Tuple[str, ...] = ()
+    ) -> Optional[Vehicle]:
+        raise NotImplementedError()
+
+    @abstractmethod
+    def get_vehicles_by_vin_suffix(
+        self, vin_suffix: str, limit: int, relationships: Tuple[str, ...] = ()
+    ) -> List[Vehicle]:
         raise NotImplementedError()
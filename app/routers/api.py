@@ -3,7 +3,7 @@ from fastapi import APIRouter, Depends
 from app.config import ROUTE_PREFIX_V1
 from app.routers.security.dependencies import CURRENT_USER, SESSION
 
-from . import home, stores, units, users, vehicles
+from . import home, search, stores, units, users, vehicles
 
 router = APIRouter()
 
@@ -15,6 +15,7 @@ def include_api_routes():
     router.include_router(units.router, prefix=ROUTE_PREFIX_V1)
     router.include_router(stores.router, prefix=ROUTE_PREFIX_V1)
     router.include_router(vehicles.router, prefix=ROUTE_PREFIX_V1)
+    router.include_router(search.router, prefix=ROUTE_PREFIX_V1)
 
 
 include_api_routes()
@@ -1,6 +1,11 @@
-from fastapi import APIRouter
+from typing import Any
+
+from fastapi import APIRouter, HTTPException
 
 from app.config import ROUTE_PREFIX_V1
+from app.repositories.base.count_cache import count_cache
+from app.repositories.base.entity_cache import entity_cache
+from app.routers.security.dependencies import CURRENT_USER
 
 from . import home
 
@@ -10,3 +15,11 @@ router = APIRouter(tags=["Home"])
 @router.get("/home/")
 async def home():
     return {"message": "Hello World"}
+
+
+@router.get("/home/cache")
+async def get_cache_stats(current_user: CURRENT_USER) -> Any:
+    """Size, hits, misses and hit_ratio of the entity cache per table, and the count cache's"""
+    if not current_user.is_active:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    return {**entity_cache.stats(), "counts": count_cache.stats()}
@@ -0,0 +1,73 @@
+from typing import List, Optional
+
+from fastapi import APIRouter, HTTPException, Request, status
+
+from app.dependencies import run_db
+from app.models.units import Unit
+from app.models.vehicles import Vehicle
+from app.routers.security.dependencies import CURRENT_USER, SESSION
+from app.routers.units import UnitResponseModel
+from app.schemas import units as units_schema
+from app.services import units as unit_service
+from app.utils.etags import (etag_headers, make_etag, not_modified,
+                             response_tables)
+from app.utils.pagination import NEXT_CURSOR_HEADER, decode_cursor, paginate
+from app.utils.responses import schema_response
+from app.utils.search import match_query
+
+router = APIRouter(tags=["Search"])
+
+
+@router.get(
+    "/search", status_code=status.HTTP_200_OK, response_model=List[UnitResponseModel]
+)
+async def search_units(
+    request: Request,
+    current_user: CURRENT_USER,
+    db: SESSION,
+    q: str,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    include_vehicle: bool = True,
+    include_store: bool = False,
+) -> List[UnitResponseModel]:
+    """
+    Units whose stock number or vehicle (make, model, trim, year, color,
+    category, VIN) match every word of q, the last one as a prefix, paged like
+    the lists with the X-Next-Cursor header. The newest SEARCH_RANK_WINDOW
+    matches come first, best BM25 rank first, and the older ones after them,
+    newest first.
+    """
+    if not current_user.is_active:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    match = match_query(q)
+    page_cursor = decode_cursor(cursor) if cursor else None
+    if page_cursor is not None and page_cursor.sort_key != "rank":
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    tables = response_tables(
+        Unit,
+        units_schema.UnitOutput,
+        joined=[Vehicle],
+        include_vehicle=include_vehicle,
+        include_store=include_store,
+    )
+    etag = make_etag(request, tables, scope=current_user)
+    unchanged = not_modified(request, etag)
+    if unchanged is not None:
+        return unchanged
+
+    units = await run_db(
+        db,
+        unit_service.search_units,
+        match=match,
+        limit=limit + 1,
+        cursor=page_cursor,
+        include_vehicle=include_vehicle,
+        include_store=include_store,
+    )
+    units, next_cursor = paginate(units, limit, "rank")
+    headers = etag_headers(etag)
+    if next_cursor:
+        headers[NEXT_CURSOR_HEADER] = next_cursor
+    return schema_response(List[UnitResponseModel], units, headers=headers)
@@ -1,39 +1,97 @@
-import os
+import hashlib
+import time
 from datetime import datetime, timedelta
-from typing import Annotated, Any
+from typing import Annotated, Any, NamedTuple, Optional
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from sqlalchemy.orm import Session
 
-from app.config import ALGORITHM
-from app.dependencies import get_db
-from app.models.users import User
+from app.config import (ACCESS_TOKEN_EXPIRE_MINUTES, ALGORITHM, SECRET_KEY,
+                        TOKEN_CACHE_SIZE, TOKEN_PRINCIPAL_CLAIMS)
+from app.dependencies import RequestSession, get_db, run_db
 from app.schemas import users as user_schema
 from app.schemas.tokens import TokenData
-from app.services.users import get_user, is_active
+from app.services.users import (Principal, get_principal, is_active,
+                                principal_cache, token_version)
+from app.utils.cache import TTLCache
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/v1/token")
 
-SESSION = Annotated[Session, Depends(get_db)]
+# The request's lazily opened session, an AsyncSession or a Session when
+# ASYNC_DATABASE is off, used through run_db
+SESSION = Annotated[RequestSession, Depends(get_db)]
 
 
-def create_access_token(data: dict, expires_delta: timedelta | None = None):
+class VerifiedToken(NamedTuple):
+    username: str
+    # None for a token that only names its user, it is looked up per request
+    principal: Optional[Principal]
+    version: int
+    expires: float
+
+
+# Tokens whose signature has been checked, by digest, each kept until it expires
+token_cache: TTLCache[VerifiedToken] = TTLCache(
+    TOKEN_CACHE_SIZE, ACCESS_TOKEN_EXPIRE_MINUTES * 60
+)
+
+
+def create_access_token(
+    data: dict,
+    expires_delta: timedelta | None = None,
+    principal: Optional[Principal] = None,
+):
+    """
+    Sign a token for data["sub"]. Given the user's principal it is embedded along
+    with their current token version (TOKEN_PRINCIPAL_CLAIMS), see revoke_tokens.
+    """
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(
-        to_encode, os.environ.get("SECRET_KEY"), algorithm=ALGORITHM
-    )
+    if principal is not None and TOKEN_PRINCIPAL_CLAIMS:
+        to_encode.update(
+            {
+                "uid": principal.id,
+                "email": principal.email,
+                "active": principal.is_active,
+                "admin": principal.is_admin,
+                "store": principal.store_id,
+                "ver": token_version(principal.id),
+            }
+        )
+    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 
+def verify_token(token: str) -> Optional[VerifiedToken]:
+    """Check the token's signature and expiry, None when it is not valid"""
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    username = payload.get("sub")
+    if username is None:
+        return None
+    expires = payload.get("exp", 0)
+    if "ver" not in payload:
+        return VerifiedToken(TokenData(username=username).username, None, 0, expires)
+    principal = Principal(
+        payload["uid"],
+        username,
+        payload["email"],
+        payload["active"],
+        payload["admin"],
+        payload["store"],
+    )
+    return VerifiedToken(username, principal, payload["ver"], expires)
+
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
@@ -43,30 +101,37 @@ def get_password_hash(password: str) -> str:
 
 
 async def get_current_user(
-    token: Annotated[str, Depends(oauth2_scheme)], db: Session = Depends(get_db)
+    token: Annotated[str, Depends(oauth2_scheme)], db: SESSION
 ):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(
-            token, os.environ.get("SECRET_KEY"), algorithms=[ALGORITHM]
-        )
-        username: str = payload.get("sub")
-        if username is None:
+    key = hashlib.blake2b(token.encode("utf-8"), digest_size=16).digest()
+    verified = token_cache.get(key)
+    if verified is None:
+        verified = verify_token(token)
+        if verified is None:
             raise credentials_exception
-        token_data = TokenData(username=username)
-    except JWTError:
-        raise credentials_exception
-    user = get_user(db, username=token_data.username)
+        # jose has checked exp, the cached token must not outlive it either
+        token_cache.set(key, verified, ttl=verified.expires - time.time())
+    if verified.principal is not None:
+        # Its claims hold unless the user has been written or revoked since
+        if verified.version != token_version(verified.principal.id):
+            raise credentials_exception
+        return verified.principal
+    user = principal_cache.get(verified.username)
     if user is None:
-        raise credentials_exception
+        version = principal_cache.version
+        user = await run_db(db, get_principal, username=verified.username)
+        if user is None:
+            raise credentials_exception
+        principal_cache.set(verified.username, user, version)
     return user
 
 
-CURRENT_USER = Annotated[User, Depends(get_current_user)]
+CURRENT_USER = Annotated[Principal, Depends(get_current_user)]
 
 
 async def get_current_active_user(
@@ -1,16 +1,20 @@
 from typing import Annotated, Any, List, Literal, Optional, Union
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 
-from app.dependencies import get_db
+from app.dependencies import run_db, write_db
 from app.routers.security.dependencies import CURRENT_USER, SESSION
+from app.models.stores import Store
 from app.schemas import stores as stores_schema
 from app.schemas import units as units_schema
 from app.services import stores as store_service
 from app.services import units as unit_service
 from app.unit_of_work.unit_of_work import UnitOfWork
+from app.utils.etags import etag_headers, make_etag, not_modified, response_tables
+from app.utils.filters import check_joins, parse_filters, parse_order_by
 from app.utils.mapper import map_string_to_model
+from app.utils.pagination import NEXT_CURSOR_HEADER, paginate, resolve_page
+from app.utils.responses import schema_response
 
 router = APIRouter(prefix="/stores", tags=["Stores"])
 
@@ -20,29 +24,29 @@ StoreResponseModel = Annotated[
 
 # ✅
 @router.post("/", status_code=status.HTTP_201_CREATED, response_model=StoreResponseModel)
-def create_store(
+async def create_store(
     current_user: CURRENT_USER, store: stores_schema.StoreAdd, db: SESSION
 ) -> StoreResponseModel:
     if not current_user.is_admin:
         raise HTTPException(status_code=401, detail="Admin access required")
 
-    db_store = store_service.create_store(db, store=store)
+    db_store = await write_db(db, store_service.create_store, store=store)
     if db_store is None:
         raise HTTPException(status_code=404, detail="Store not found")
     return db_store
 
 
 @router.delete("/{store_id}", response_model=Optional[StoreResponseModel])
-def delete_store(
+async def delete_store(
     current_user: CURRENT_USER, store_id: int, db: SESSION
 ) -> Optional[StoreResponseModel]:
     if not current_user.is_admin:
         return HTTPException(status_code=401, detail="Admin access required")
 
-    db_store = store_service.get_store_by_id(db, store_id)
+    db_store = await run_db(db, store_service.get_store_by_id, store_id)
     if not db_store:
         return {"Status": "Failure", "Message": f"Store with {store_id} does not exist"}
-    store_service.delete_store(db, store_id)
+    await write_db(db, store_service.delete_store, store_id)
     return {
         "Status": "Success",
         "Message": f"Store with {store_id} has bee successfully deleted!",
@@ -52,28 +56,37 @@ def delete_store(
 @router.get(
     "/{store_id}", status_code=status.HTTP_200_OK, response_model=StoreResponseModel
 )
-def get_store(
-    current_user: CURRENT_USER, store_id: int, db: SESSION
+async def get_store(
+    request: Request, current_user: CURRENT_USER, store_id: int, db: SESSION
 ) -> StoreResponseModel:
     if current_user.is_active:
-        store = store_service.get_store_by_id(db, store_id=store_id)
+        tables = response_tables(Store, stores_schema.StoreOutput)
+        etag = make_etag(request, tables, scope=current_user)
+        unchanged = not_modified(request, etag)
+        if unchanged is not None:
+            return unchanged
+        store = await run_db(db, store_service.get_store_by_id, store_id=store_id)
         if not store:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Store with id {store_id} not found",
             )
-        return store
+        return schema_response(StoreResponseModel, store, headers=etag_headers(etag))
     return HTTPException(status_code=401, detail="Inactive user")
 
 
 @router.get(
     "/", status_code=status.HTTP_200_OK, response_model=List[StoreResponseModel]
 )
-def get_stores(
+async def get_stores(
+    request: Request,
     current_user: CURRENT_USER,
     db: SESSION,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
+    sort_key: str = "id",
+    order_by: Optional[str] = None,
     filter_key: Optional[str] = None,
     filter_value: Optional[str] = None,
     to_join: bool = False,
@@ -82,7 +95,12 @@ def get_stores(
     joined_model_filter_value: Optional[str] = None,
 ) -> List[StoreResponseModel]:
     if current_user.is_active:
+        if order_by:
+            sort_key = parse_order_by(Store, order_by)
+        page_cursor, sort_key = resolve_page(Store, cursor, sort_key)
         filter = {filter_key: filter_value} if filter_key and filter_value else None
+        # column__op=value terms, e.g. units.sold_status=false, see app.utils.filters
+        filters = parse_filters(Store, request.query_params.multi_items())
         joined_model_filters = (
             {joined_model_filter_key: joined_model_filter_value}
             if joined_model_filter_key and joined_model_filter_value
@@ -93,31 +111,51 @@ def get_stores(
             models_to_join_classes = [
                 map_string_to_model(model) for model in models_to_join.split(",")
             ]
-        stores = store_service.get_stores(
+        check_joins(Store, to_join, models_to_join_classes, joined_model_filters)
+        tables = response_tables(
+            Store,
+            stores_schema.StoreOutput,
+            joined=[*models_to_join_classes, *(filters.joined if filters else ())],
+        )
+        etag = make_etag(request, tables, scope=current_user)
+        unchanged = not_modified(request, etag)
+        if unchanged is not None:
+            return unchanged
+        stores = await run_db(
             db,
+            store_service.get_stores,
             skip=skip,
-            limit=limit,
+            limit=limit + 1,
             filter=filter,
             to_join=to_join,
             models_to_join=models_to_join_classes,
             joined_model_filters=joined_model_filters,
+            cursor=page_cursor,
+            sort_key=sort_key,
+            filters=filters,
         )
         if not stores:
             raise HTTPException(status_code=404, detail=f"Stores not found")
-        return stores
+        stores, next_cursor = paginate(stores, limit, sort_key)
+        headers = etag_headers(etag)
+        if next_cursor:
+            headers[NEXT_CURSOR_HEADER] = next_cursor
+        return schema_response(List[StoreResponseModel], stores, headers=headers)
     return HTTPException(status_code=401, detail="Inactive user")
 
 
 @router.put("/{store_id}", response_model=StoreResponseModel)
-def update_store(
+async def update_store(
     current_user: CURRENT_USER,
     store_id: int,
     store: stores_schema.StoreUpdate,
     db: SESSION,
 ) -> StoreResponseModel:
     if current_user.is_active:
-        db_store = store_service.update_store(db, store_id=store_id, store=store)
+        db_store = await write_db(
+            db, store_service.update_store, store_id=store_id, store=store
+        )
         if db_store is None:
             raise HTTPException(status_code=404, detail="Store not found")
-        return {"Status": "Success", "Store": db_store}
+        return db_store
     raise HTTPException(status_code=401, detail="Inactive user")
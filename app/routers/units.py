@@ -1,19 +1,28 @@
 from typing import Annotated, Any, List, Literal, Optional
 
-from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
 
-from app.dependencies import get_db
+from app.dependencies import run_db, write_db
 from app.models.stores import Store
 from app.models.units import Unit
 from app.models.vehicles import Vehicle
-from app.routers.security.dependencies import (CURRENT_USER,
+from app.routers.security.dependencies import (CURRENT_USER, SESSION,
                                                get_current_active_user)
 from app.schemas import units as units_schema
 from app.schemas import users as user_schema
 from app.schemas import vehicles as vehicles_schema
 from app.services import units as unit_service
+from app.services.expiry import expiry_scheduler
+from app.utils.bulk import read_rows
+from app.utils.etags import etag_headers, make_etag, not_modified, response_tables
+from app.utils.exports import EXPORT_MEDIA_TYPES
+from app.utils.filters import (check_joins, parse_facets, parse_filters,
+                               parse_order_by, related_models)
 from app.utils.mapper import map_string_to_model
+from app.utils.pagination import (NEXT_CURSOR_HEADER, count_headers, paginate,
+                                  resolve_page)
+from app.utils.responses import schema_response
 
 router = APIRouter(prefix="/units", tags=["Units"])
 
@@ -24,15 +33,17 @@ UnitResponseModel = Annotated[units_schema.UnitOutput, Literal["UnitResponse"]]
     status_code=status.HTTP_201_CREATED,
     response_model=units_schema.UnitCreateOutput,
 )
-def create_unit(
+async def create_unit(
     current_user: CURRENT_USER,
     unit: units_schema.UnitAdd,
     vehicle: vehicles_schema.VehicleAdd,
-    db: Session = Depends(get_db),
+    db: SESSION,
 ) -> units_schema.UnitCreateOutput:
 
     if current_user.is_admin:
-        db_unit = unit_service.create_unit(db, unit=unit, vehicle=vehicle)
+        db_unit = await write_db(
+            db, unit_service.create_unit, unit=unit, vehicle=vehicle
+        )
         if not db_unit:
             raise HTTPException(
                 status_code=400, detail=f"Unit with name {unit.name} already exists"
@@ -40,23 +51,170 @@ def create_unit(
     return db_unit
 
 
+@router.post(
+    "/bulk",
+    status_code=status.HTTP_200_OK,
+    response_model=units_schema.UnitBulkOutput,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {
+                    "schema": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "unit": {"$ref": "#/components/schemas/UnitAdd"},
+                                "vehicle": {"$ref": "#/components/schemas/VehicleAdd"},
+                            },
+                        },
+                    }
+                },
+                "application/x-ndjson": {"schema": {"type": "string"}},
+            },
+        }
+    },
+)
+async def create_units_bulk(
+    current_user: CURRENT_USER,
+    request: Request,
+    db: SESSION,
+) -> Any:
+    """Create many units, body is a JSON array or NDJSON of {unit, vehicle} objects"""
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=403, detail=f"User {current_user.email} is not an admin"
+        )
+    rows = await read_rows(request)
+    result = await write_db(db, unit_service.create_units_bulk, rows)
+    return schema_response(units_schema.UnitBulkOutput, result)
+
+
+@router.get("/export", status_code=status.HTTP_200_OK)
+async def export_units(
+    request: Request,
+    current_user: CURRENT_USER,
+    format: Literal["ndjson", "csv"] = "ndjson",
+    filter_key: Optional[str] = None,
+    filter_value: Optional[str] = None,
+    to_join: bool = False,
+    models_to_join: Optional[Any] = None,  # comma separated string of models to join
+    joined_model_filter_key: Optional[str] = None,
+    joined_model_filter_value: Optional[str] = None,
+    include_vehicle: bool = True,
+    include_store: bool = True,
+) -> StreamingResponse:
+
+    if not current_user.is_active:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    filter = {filter_key: filter_value} if filter_key and filter_value else None
+    filters = parse_filters(Unit, request.query_params.multi_items())
+    joined_model_filters = (
+        {joined_model_filter_key: joined_model_filter_value}
+        if joined_model_filter_key and joined_model_filter_value
+        else None
+    )
+
+    models_to_join_classes = []
+
+    if to_join and models_to_join:
+        models_to_join_classes = [
+            map_string_to_model(model) for model in models_to_join.split(",")
+        ]
+    check_joins(Unit, to_join, models_to_join_classes, joined_model_filters)
+
+    chunks = unit_service.export_units(
+        format=format,
+        filter=filter,
+        to_join=to_join,
+        models_to_join=models_to_join_classes,
+        joined_model_filters=joined_model_filters,
+        include_vehicle=include_vehicle,
+        include_store=include_store,
+        filters=filters,
+    )
+    return StreamingResponse(
+        chunks,
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f"attachment; filename=units.{format}"},
+    )
+
+
+@router.get("/expiry", status_code=status.HTTP_200_OK)
+async def get_expiry_metrics(current_user: CURRENT_USER) -> Any:
+    """State of the unit expiry scheduler, lag_seconds is how late it is running"""
+    if not current_user.is_active:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    return expiry_scheduler.metrics()
+
+
+@router.get(
+    "/lookup", status_code=status.HTTP_200_OK, response_model=List[UnitResponseModel]
+)
+async def lookup_units(
+    request: Request,
+    current_user: CURRENT_USER,
+    db: SESSION,
+    stock_number: Annotated[str, Query(min_length=1)],
+    limit: int = 100,
+    include_vehicle: bool = False,
+    include_store: bool = False,
+) -> List[UnitResponseModel]:
+    """Units by their exact stock number, an index lookup"""
+    if not current_user.is_active:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    tables = response_tables(
+        Unit,
+        units_schema.UnitOutput,
+        include_vehicle=include_vehicle,
+        include_store=include_store,
+    )
+    etag = make_etag(request, tables, scope=current_user)
+    unchanged = not_modified(request, etag)
+    if unchanged is not None:
+        return unchanged
+
+    units = await run_db(
+        db,
+        unit_service.lookup_units,
+        stock_number=stock_number,
+        limit=limit,
+        include_vehicle=include_vehicle,
+        include_store=include_store,
+    )
+    return schema_response(List[UnitResponseModel], units, headers=etag_headers(etag))
+
+
 # ✅
 @router.get(
     "/{unit_id}", status_code=status.HTTP_200_OK, response_model=Optional[UnitResponseModel]
 )
-def get_unit(
+async def get_unit(
+    request: Request,
     current_user: CURRENT_USER,
     unit_id: int,
-    db: Session = Depends(get_db),
+    db: SESSION,
     include_vehicle: bool = False,
     include_store: bool = False,
 ) -> Optional[UnitResponseModel]:
 
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
+    tables = response_tables(
+        Unit,
+        units_schema.UnitOutput,
+        include_vehicle=include_vehicle,
+        include_store=include_store,
+    )
+    etag = make_etag(request, tables, scope=current_user)
+    unchanged = not_modified(request, etag)
+    if unchanged is not None:
+        return unchanged
 
-    unit = unit_service.get_unit_by_id(
+    unit = await run_db(
         db,
+        unit_service.get_unit_by_id,
         unit_id=unit_id,
         include_vehicle=include_vehicle,
         include_store=include_store,
@@ -64,16 +222,22 @@ def get_unit(
 
     if not unit:
         raise HTTPException(status_code=404, detail=f"Unit with id {unit_id} not found")
-    return unit
+    return schema_response(
+        Optional[UnitResponseModel], unit, headers=etag_headers(etag)
+    )
 
 
 # ✅
 @router.get("/", status_code=status.HTTP_200_OK, response_model=List[UnitResponseModel])
-def get_units(
+async def get_units(
+    request: Request,
     current_user: CURRENT_USER,
-    db: Session = Depends(get_db),
+    db: SESSION,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
+    sort_key: str = "id",
+    order_by: Optional[str] = None,
     filter_key: Optional[str] = None,
     filter_value: Optional[str] = None,
     to_join: bool = False,
@@ -82,11 +246,19 @@ def get_units(
     joined_model_filter_value: Optional[str] = None,
     include_vehicle: bool = False,
     include_store: bool = False,
+    with_total: bool = False,
+    facets: Optional[str] = None,  # comma separated, e.g. make,year
 ) -> List[UnitResponseModel]:
 
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
+    if order_by:
+        sort_key = parse_order_by(Unit, order_by)
+    page_cursor, sort_key = resolve_page(Unit, cursor, sort_key)
     filter = {filter_key: filter_value} if filter_key and filter_value else None
+    # column__op=value terms, e.g. buy_now_price__lt=20000, see app.utils.filters
+    filters = parse_filters(Unit, request.query_params.multi_items())
+    facet_paths = parse_facets(Unit, facets)
     joined_model_filters = (
         {joined_model_filter_key: joined_model_filter_value}
         if joined_model_filter_key and joined_model_filter_value
@@ -99,30 +271,67 @@ def get_units(
         models_to_join_classes = [
             map_string_to_model(model) for model in models_to_join.split(",")
         ]
+    check_joins(Unit, to_join, models_to_join_classes, joined_model_filters)
+
+    tables = response_tables(
+        Unit,
+        units_schema.UnitOutput,
+        joined=[
+            *models_to_join_classes,
+            *(filters.joined if filters else ()),
+            *related_models(Unit, [path for _, path in facet_paths]),
+        ],
+        include_vehicle=include_vehicle,
+        include_store=include_store,
+    )
+    etag = make_etag(request, tables, scope=current_user)
+    unchanged = not_modified(request, etag)
+    if unchanged is not None:
+        return unchanged
 
-    units = unit_service.get_units(
+    units = await run_db(
         db,
+        unit_service.get_units,
         skip=skip,
-        limit=limit,
+        limit=limit + 1,
         filter=filter,
         to_join=to_join,
         models_to_join=models_to_join_classes,
         joined_model_filters=joined_model_filters,
+        cursor=page_cursor,
+        sort_key=sort_key,
+        filters=filters,
         include_vehicle=include_vehicle,
         include_store=include_store,
     )
 
     if not units:
         raise HTTPException(status_code=404, detail=f"Units not found")
-    return units
+    counts = None
+    if with_total or facet_paths:
+        counts = await run_db(
+            db,
+            unit_service.count_units,
+            filter=filter,
+            to_join=to_join,
+            models_to_join=models_to_join_classes,
+            joined_model_filters=joined_model_filters,
+            filters=filters,
+            facets=facet_paths,
+        )
+    units, next_cursor = paginate(units, limit, sort_key)
+    headers = {**etag_headers(etag), **count_headers(counts, with_total)}
+    if next_cursor:
+        headers[NEXT_CURSOR_HEADER] = next_cursor
+    return schema_response(List[UnitResponseModel], units, headers=headers)
 
 
 @router.delete("/{unit_id}", status_code=status.HTTP_200_OK, response_model=Optional[Any])
-def delete_unit(
-    current_user: CURRENT_USER, unit_id: int, db: Session = Depends(get_db)
+async def delete_unit(
+    current_user: CURRENT_USER, unit_id: int, db: SESSION
 ) -> None:
     if current_user.is_admin:
-        unit_service.delete_unit(db, unit_id=unit_id)
+        await write_db(db, unit_service.delete_unit, unit_id=unit_id)
         return {"Status": "Success", "Message": f"Unit with id {unit_id} deleted."}
     else:
         raise HTTPException(
@@ -131,29 +340,27 @@ def delete_unit(
 
 
 @router.post("/expire_units", status_code=status.HTTP_200_OK)
-async def expire_units(
-    background_tasks: BackgroundTasks, db: Session = Depends(get_db)
-) -> Any:
-    background_tasks.add_task(unit_service.check_and_expire_units, db)
+async def expire_units(db: SESSION) -> Any:
+    expired = await write_db(db, unit_service.expire_units)
     return {
         "Status": "Success",
-        "Message": "Expire units task added to background tasks.",
+        "Message": f"{expired} units expired.",
     }
 
 
 @router.put(
     "/{unit_id}", status_code=status.HTTP_200_OK, response_model=Optional[UnitResponseModel]
 )
-def update_unit(
+async def update_unit(
     current_user: CURRENT_USER,
     unit_id: int,
     unit: units_schema.UnitAdd,
-    db: Session = Depends(get_db),
+    db: SESSION,
 ) -> Optional[UnitResponseModel]:
 
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
-    db_unit = unit_service.update_unit(db, unit=unit, unit_id=unit_id)
+    db_unit = await write_db(db, unit_service.update_unit, unit=unit, unit_id=unit_id)
     if db_unit is None:
         raise HTTPException(status_code=404, detail="Unit not found")
-    return {"Status": "Success", "Unit": db_unit}
+    return db_unit
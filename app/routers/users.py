@@ -1,10 +1,12 @@
 from datetime import timedelta
 from typing import Annotated, Any, List, Literal, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordRequestForm
 
 from app.config import ACCESS_TOKEN_EXPIRE_MINUTES
+from app.dependencies import run_db, write_db
+from app.models.users import User
 from app.routers.security.dependencies import (
     CURRENT_USER, 
     SESSION,
@@ -13,7 +15,12 @@ from app.routers.security.dependencies import (
 from app.schemas import tokens as token_schema
 from app.schemas import users as schemas
 from app.services import users as user_service
+from app.services.passwords import password_hasher
+from app.utils.bulk import read_rows
+from app.utils.filters import check_joins
 from app.utils.mapper import map_string_to_model
+from app.utils.pagination import NEXT_CURSOR_HEADER, paginate, resolve_page
+from app.utils.responses import schema_response
 
 router = APIRouter(tags=["Users"])
 
@@ -25,32 +32,60 @@ async def login(form_data: Annotated[OAuth2PasswordRequestForm, Depends()], db:
     """
     OAuth2 compatible token login, get an access token for future requests
     """
-    user = user_service.authenticate_user(db, username=form_data.username, password=form_data.password)
-    if not user:
+    # Only the lookup runs on the session, bcrypt runs on the password hasher's
+    # workers and answers 503 when they are saturated
+    user = await run_db(db, user_service.get_user, username=form_data.username)
+    verified, new_hash = (
+        await password_hasher.verify(form_data.password, user.hashed_password)
+        if user
+        else (False, None)
+    )
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    if new_hash:
+        await write_db(
+            db, user_service.set_hashed_password, user_id=user.id, hashed_password=new_hash
+        )
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(data={"sub": user.username}, expires_delta=access_token_expires)
+    access_token = create_access_token(
+        data={"sub": user.username},
+        expires_delta=access_token_expires,
+        principal=user_service.principal_of(user),
+    )
     return {"access_token": access_token, "token_type": "bearer"}
 
 
 # ✅
 @router.post("/users/", status_code=status.HTTP_201_CREATED, response_model=UserResponseModel)
-def create_user(
+async def create_user(
     current_user: CURRENT_USER, 
     user: schemas.UserCreate,
     db: SESSION, 
     include_store: bool = False
 ) -> schemas.UserOutput:
     if current_user and current_user.is_admin:
-        db_user = user_service.get_user_by_email_or_username(db, email=user.email, username=user.username)
+        db_user = await run_db(
+            db,
+            user_service.get_user_by_email_or_username,
+            email=user.email,
+            username=user.username,
+        )
         if db_user:
             raise HTTPException(status_code=400, detail="User already registered")
        
-        db_user = user_service.create_user(db, user=user, include_store=include_store)
+        # Hash off the writer thread, it would hold up every write queued behind it
+        hashed_password = await password_hasher.hash(user.password)
+        db_user = await write_db(
+            db,
+            user_service.create_user,
+            user=user,
+            include_store=include_store,
+            hashed_password=hashed_password,
+        )
         if db_user is None:
             raise HTTPException(status_code=404, detail="User not found")
         return db_user
@@ -58,21 +93,23 @@ def create_user(
 
 
 @router.get("/users/{user_id}", status_code=status.HTTP_200_OK, response_model=UserResponseModel)
-def get_user(current_user: CURRENT_USER, user_id: int, db: SESSION) -> schemas.UserOutput:
+async def get_user(current_user: CURRENT_USER, user_id: int, db: SESSION) -> schemas.UserOutput:
     if current_user and current_user.is_admin:
-        user = user_service.get_user_by_id(db, user_id=user_id)
+        user = await run_db(db, user_service.get_user_by_id, user_id=user_id)
         if not user:
             raise HTTPException(status_code=404, detail=f"User with id {user_id} not found")
-        return user
+        return schema_response(UserResponseModel, user)
     return HTTPException(status_code=401, detail="Unauthorized")
 
 
 @router.get("/users/", status_code=status.HTTP_200_OK, response_model=List[UserResponseModel])
-def get_users(
+async def get_users(
     current_user: CURRENT_USER,
     db: SESSION,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
+    sort_key: str = "id",
     filter_key: Optional[str] = None,
     filter_value: Optional[str] = None,
     to_join: bool = False,
@@ -82,6 +119,7 @@ def get_users(
     include_store: bool = False,
 ) -> List[UserResponseModel]:
     if current_user and current_user.is_admin:
+        page_cursor, sort_key = resolve_page(User, cursor, sort_key)
         filter = {filter_key: filter_value} if filter_key and filter_value else None
         joined_model_filters = (
             {joined_model_filter_key: joined_model_filter_value}
@@ -94,40 +132,98 @@ def get_users(
             models_to_join_classes = [
                 map_string_to_model(model) for model in models_to_join.split(",")
             ]
+        check_joins(User, to_join, models_to_join_classes, joined_model_filters)
 
-        users = user_service.get_users(
+        users = await run_db(
             db,
+            user_service.get_users,
             skip=skip,
-            limit=limit,
+            limit=limit + 1,
             filter=filter,
             to_join=to_join,
             models_to_join=models_to_join_classes,
             joined_model_filters=joined_model_filters,
+            cursor=page_cursor,
+            sort_key=sort_key,
             include_store=include_store,
         )
 
         if not users:
             raise HTTPException(status_code=404, detail="No users found")
-        return users
+        users, next_cursor = paginate(users, limit, sort_key)
+        headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+        return schema_response(List[UserResponseModel], users, headers=headers)
     return HTTPException(status_code=401, detail="Unauthorized")
 
 
+@router.post(
+    "/users/bulk",
+    status_code=status.HTTP_200_OK,
+    response_model=schemas.UserBulkOutput,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {
+                    "schema": {
+                        "type": "array",
+                        "items": {"$ref": "#/components/schemas/UserCreate"},
+                    }
+                },
+                "application/x-ndjson": {"schema": {"type": "string"}},
+            },
+        }
+    },
+)
+async def create_users_bulk(
+    current_user: CURRENT_USER, request: Request, db: SESSION
+) -> Any:
+    """Create many users, body is a JSON array or NDJSON of UserCreate objects"""
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=403, detail=f"User {current_user.email} is not an admin"
+        )
+    rows = await read_rows(request)
+    # One IN query for the duplicates, then every password hashed in parallel
+    # before the rows are inserted in one transaction
+    users, failed = await run_db(db, user_service.check_users_bulk, rows)
+    hashes = await password_hasher.hash_many([user.password for _, user in users])
+    result = await write_db(
+        db,
+        user_service.create_users_bulk,
+        users=[(index, user, hashed) for (index, user), hashed in zip(users, hashes)],
+        failed=failed,
+    )
+    return schema_response(schemas.UserBulkOutput, result)
+
+
 @router.delete("/users/{user_id}", status_code=status.HTTP_200_OK)
-def delete_user(current_user: CURRENT_USER, user_id: int, db: SESSION):
+async def delete_user(current_user: CURRENT_USER, user_id: int, db: SESSION):
     if current_user and current_user.is_admin:
-        delete_result = user_service.delete_user(db, user_id=user_id)
+        delete_result = await write_db(db, user_service.delete_user, user_id=user_id)
         if delete_result["Status"] == "Failed":
             return delete_result
         return delete_result
     return HTTPException(status_code=401, detail="Unauthorized")
 
 
+@router.post("/users/{user_id}/revoke_tokens", status_code=status.HTTP_200_OK)
+async def revoke_user_tokens(current_user: CURRENT_USER, user_id: int) -> Any:
+    """Log the user out everywhere, every access token issued to them stops working"""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    user_service.revoke_tokens(user_id)
+    return {"Status": "Success", "Message": f"Tokens of user {user_id} revoked."}
+
+
 @router.put("/users/{user_id}", status_code=status.HTTP_200_OK, response_model=UserResponseModel)
-def update_user(
+async def update_user(
     current_user: CURRENT_USER, user_id: int, user: schemas.UserUpdate, db: SESSION
 ) -> schemas.UserOutput:
     if current_user and current_user.is_admin:
-        db_user = user_service.update_user(db, user_id=user_id, user=user)
+        db_user = await write_db(
+            db, user_service.update_user, user_id=user_id, user=user
+        )
         if db_user is None:
             raise HTTPException(status_code=404, detail="User not found")
         return db_user
@@ -136,5 +232,6 @@ def update_user(
 
 # ✅
 @router.get("/users/me/", response_model=UserResponseModel)
-def read_users_me(current_user: CURRENT_USER):
-    return current_user
+async def read_users_me(current_user: CURRENT_USER, db: SESSION):
+    # The cached principal only carries what authorization needs
+    return await run_db(db, user_service.get_user, username=current_user.username)
@@ -1,10 +1,9 @@
 from typing import Annotated, Any, List, Literal, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
 
-from app.dependencies import get_db
-from app.models.vehicles import Vehicle
+from app.dependencies import run_db
+from app.models.vehicles import VIN_LENGTH, Vehicle
 from app.routers.security.dependencies import (
     CURRENT_USER, 
     SESSION,
@@ -12,7 +11,13 @@ from app.routers.security.dependencies import (
     )
 from app.schemas import vehicles as vehicle_schemas
 from app.services import vehicles as vehicle_services
+from app.utils.etags import etag_headers, make_etag, not_modified, response_tables
+from app.utils.filters import (check_joins, parse_facets, parse_filters,
+                               parse_order_by, related_models)
 from app.utils.mapper import map_string_to_model
+from app.utils.pagination import (NEXT_CURSOR_HEADER, count_headers, paginate,
+                                  resolve_page)
+from app.utils.responses import schema_response
 
 router = APIRouter(prefix="/vehicles", tags=["Vehicles"])
 
@@ -20,22 +25,58 @@ router = APIRouter(prefix="/vehicles", tags=["Vehicles"])
 VEHICLE_RESPONSE_MODEL = Annotated[vehicle_schemas.VehicleOutput, Literal["Default Vehicle Response Model"]]
 
 
+@router.get("/lookup", status_code=status.HTTP_200_OK, response_model=List[VEHICLE_RESPONSE_MODEL])
+async def lookup_vehicles(
+    request: Request,
+    db: SESSION,
+    vin_suffix: Annotated[str, Query(min_length=6, max_length=VIN_LENGTH)],
+    limit: int = 100,
+) -> List[VEHICLE_RESPONSE_MODEL]:
+    """Vehicles whose VIN ends with vin_suffix, e.g. its last 6 to 8 characters"""
+    tables = response_tables(Vehicle, vehicle_schemas.VehicleOutput)
+    etag = make_etag(request, tables)
+    unchanged = not_modified(request, etag)
+    if unchanged is not None:
+        return unchanged
+    vehicles = await run_db(
+        db, vehicle_services.lookup_vehicles, vin_suffix=vin_suffix, limit=limit
+    )
+    return schema_response(
+        List[VEHICLE_RESPONSE_MODEL], vehicles, headers=etag_headers(etag)
+    )
+
+
 @router.get("/{vehicle_id}",status_code=status.HTTP_200_OK,response_model=Optional[VEHICLE_RESPONSE_MODEL],)
-def get_vehicle(vehicle_id: int, db: SESSION) -> Optional[VEHICLE_RESPONSE_MODEL]:
-    db_vehicle = vehicle_services.get_vehicle_by_id(db, vehicle_id=vehicle_id)
+async def get_vehicle(
+    request: Request, vehicle_id: int, db: SESSION
+) -> Optional[VEHICLE_RESPONSE_MODEL]:
+    tables = response_tables(Vehicle, vehicle_schemas.VehicleOutput)
+    etag = make_etag(request, tables)
+    unchanged = not_modified(request, etag)
+    if unchanged is not None:
+        return unchanged
+    db_vehicle = await run_db(
+        db, vehicle_services.get_vehicle_by_id, vehicle_id=vehicle_id
+    )
     if not db_vehicle:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Vehicle with id {vehicle_id} not found",
         )
-    return db_vehicle
+    return schema_response(
+        Optional[VEHICLE_RESPONSE_MODEL], db_vehicle, headers=etag_headers(etag)
+    )
 
 
 @router.get("/", status_code=status.HTTP_200_OK, response_model=List[VEHICLE_RESPONSE_MODEL])
-def get_vehicles(
+async def get_vehicles(
+    request: Request,
     db: SESSION,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
+    sort_key: str = "id",
+    order_by: Optional[str] = None,
     filter_key: Optional[str] = None,
     filter_value: Optional[str] = None,
     to_join: bool = False,
@@ -43,8 +84,16 @@ def get_vehicles(
     joined_model_filter_key: Optional[str] = None,
     joined_model_filter_value: Optional[str] = None,
     include_unit_model: bool = False,
+    with_total: bool = False,
+    facets: Optional[str] = None,  # comma separated, e.g. make,year
 ) -> List[VEHICLE_RESPONSE_MODEL]:
+    if order_by:
+        sort_key = parse_order_by(Vehicle, order_by)
+    page_cursor, sort_key = resolve_page(Vehicle, cursor, sort_key)
     filter = {filter_key: filter_value} if filter_key and filter_value else None
+    # column__op=value terms, e.g. year__gte=2018, see app.utils.filters
+    filters = parse_filters(Vehicle, request.query_params.multi_items())
+    facet_paths = parse_facets(Vehicle, facets)
     joined_model_filters = (
         {joined_model_filter_key: joined_model_filter_value}
         if joined_model_filter_key and joined_model_filter_value
@@ -57,15 +106,51 @@ def get_vehicles(
         models_to_join_classes = [
             map_string_to_model(model) for model in models_to_join.split(",")
         ]
+    check_joins(Vehicle, to_join, models_to_join_classes, joined_model_filters)
+
+    tables = response_tables(
+        Vehicle,
+        vehicle_schemas.VehicleOutput,
+        joined=[
+            *models_to_join_classes,
+            *(filters.joined if filters else ()),
+            *related_models(Vehicle, [path for _, path in facet_paths]),
+        ],
+        include_unit_model=include_unit_model,
+    )
+    etag = make_etag(request, tables)
+    unchanged = not_modified(request, etag)
+    if unchanged is not None:
+        return unchanged
 
-    vehicles = vehicle_services.get_vehicles(
+    vehicles = await run_db(
         db,
+        vehicle_services.get_vehicles,
         skip=skip,
-        limit=limit,
+        limit=limit + 1,
         filter=filter,
         to_join=to_join,
         models_to_join=models_to_join_classes,
         joined_model_filters=joined_model_filters,
+        cursor=page_cursor,
+        sort_key=sort_key,
+        filters=filters,
         include_unit_model=include_unit_model,
     )
-    return vehicles
+    counts = None
+    if with_total or facet_paths:
+        counts = await run_db(
+            db,
+            vehicle_services.count_vehicles,
+            filter=filter,
+            to_join=to_join,
+            models_to_join=models_to_join_classes,
+            joined_model_filters=joined_model_filters,
+            filters=filters,
+            facets=facet_paths,
+        )
+    vehicles, next_cursor = paginate(vehicles, limit, sort_key)
+    headers = {**etag_headers(etag), **count_headers(counts, with_total)}
+    if next_cursor:
+        headers[NEXT_CURSOR_HEADER] = next_cursor
+    return schema_response(List[VEHICLE_RESPONSE_MODEL], vehicles, headers=headers)
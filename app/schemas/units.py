@@ -1,4 +1,5 @@
 from datetime import datetime, timedelta
+from typing import List, Literal
 
 from pydantic import BaseModel, ConfigDict, Field
 
@@ -22,9 +23,29 @@ class UnitBase(BaseModel):
 
 
 class UnitAdd(UnitBase):
+    stock_number: str | None = Field(None, max_length=50)
     store_id: int | None = Field(1, description="Default store ID is 1.")
 
 
+class UnitVehicleAdd(BaseModel):
+    unit: UnitAdd
+    vehicle: vehicles_schema.VehicleAdd
+
+
+class UnitBulkResult(BaseModel):
+    index: int = Field(description="Position of the row in the request body.")
+    status: Literal["created", "failed"]
+    unit_id: int | None = None
+    vehicle_id: int | None = None
+    errors: List[str] | None = None
+
+
+class UnitBulkOutput(BaseModel):
+    created: int = 0
+    failed: int = 0
+    results: List[UnitBulkResult] = []
+
+
 class UnitUpdate(UnitBase):
     pass
 
@@ -46,6 +67,7 @@ class UnitVehicle(BaseModel):
 
 class UnitOutput(BaseModel):
     id: int | None = Field(None, serialization_alias="unit_id")
+    stock_number: str | None = None
     list_date: datetime | None = None
     purchase_date: datetime | None = None
     sold_date: datetime | None = None
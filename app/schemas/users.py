@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Literal
 
 from pydantic import BaseModel, ConfigDict, EmailStr, Field
 
@@ -74,6 +74,19 @@ class UserCreate(UserBase):
     )
 
 
+class UserBulkResult(BaseModel):
+    index: int = Field(description="Position of the row in the request body.")
+    status: Literal["created", "failed"]
+    user_id: int | None = None
+    errors: List[str] | None = None
+
+
+class UserBulkOutput(BaseModel):
+    created: int = 0
+    failed: int = 0
+    results: List[UserBulkResult] = []
+
+
 class UserUpdate(UserBase):
     id: int
 
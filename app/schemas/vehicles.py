@@ -1,6 +1,11 @@
+import re
 from datetime import datetime
 
-from pydantic import BaseModel, ConfigDict, Field
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+
+from app.models.vehicles import VIN_LENGTH
+
+VIN = re.compile(rf"[A-Z0-9]{{1,{VIN_LENGTH}}}")
 
 
 class VehicleBase(BaseModel):
@@ -8,7 +13,7 @@ class VehicleBase(BaseModel):
     make: str | None = Field(None, max_length=50)
     model: str | None = Field(None, max_length=50)
     trim: str | None = Field(None, max_length=50)
-    vin: str | None = Field(None, max_length=17)
+    vin: str | None = None
     mileage: int | None = Field(None, ge=0)
     color: str | None = Field(None, max_length=50)
 
@@ -17,7 +22,22 @@ class VehicleBase(BaseModel):
     )
 
 
-class VehicleAdd(VehicleBase):
+class VehicleWrite(VehicleBase):
+    @field_validator("vin")
+    @classmethod
+    def normalize_vin(cls, vin: str | None) -> str | None:
+        """
+        Upper case, as printed on the vehicle, so a VIN is unique whatever its
+        case. At most VIN_LENGTH letters and digits, the length the reversed VIN
+        index is built for; blank is no VIN.
+        """
+        vin = vin.strip().upper() if vin else None
+        if vin and not VIN.fullmatch(vin):
+            raise ValueError(f"A VIN is 1 to {VIN_LENGTH} letters and digits")
+        return vin or None
+
+
+class VehicleAdd(VehicleWrite):
     drivetrain: str | None = Field(None, max_length=50)
     transmission: str | None = Field(None, max_length=50)
     transmission_type: str | None = Field(None, max_length=50)
@@ -29,7 +49,7 @@ class VehicleAdd(VehicleBase):
     msrp: int | None = Field(None, ge=0)
 
 
-class VehicleUpdate(VehicleBase, validate_assignment=True):
+class VehicleUpdate(VehicleWrite, validate_assignment=True):
     pass
 
 
@@ -0,0 +1,189 @@
+import heapq
+import logging
+import threading
+from datetime import datetime
+from typing import Callable, List, Optional
+
+from sqlalchemy import false, select, update
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.models.units import Unit
+from app.repositories.base.table_versions import mark_changed
+
+logger = logging.getLogger(__name__)
+
+
+def expire_due_units(db: Session, now: Optional[datetime] = None) -> int:
+    """
+    Flag every live unit whose expire_date has passed with a single UPDATE
+
+    Args:
+        db (Session): The session to run it in, the caller commits
+        now (Optional[datetime], optional): The cut off. Defaults to utcnow().
+    Returns:
+        int: How many units were expired
+    """
+    now = now or datetime.utcnow()
+    stmt = (
+        update(Unit)
+        .where(Unit.is_expired == false(), Unit.expire_date <= now)
+        .values(is_expired=True)
+        .execution_options(synchronize_session=False)
+    )
+    mark_changed(db, Unit.__tablename__)
+    return db.execute(stmt).rowcount
+
+
+class ExpiryScheduler:
+    """
+    Expires units close to their expire_date from a background thread
+
+    Upcoming deadlines sit in a min-heap. The thread sleeps until the earliest
+    one, runs expire_due_units and goes back to sleep. The heap holds at most
+    `window` deadlines read from the database in expire_date order through the
+    (is_expired, expire_date) index. It is read again once the thread passes the
+    last deadline it read, so a restart rebuilds it from the database. New
+    deadlines come in through schedule().
+
+    Attributes:
+        lag (float): Seconds between the last deadline and the UPDATE that
+            handled it, the metric to alert on
+        expired (int): Units expired since start
+        runs (int): UPDATEs issued since start
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        window: int = 10_000,
+        idle_interval: float = 60.0,
+    ) -> None:
+        self.session_factory = session_factory
+        self.window = window
+        self.idle_interval = idle_interval
+        self.lag = 0.0
+        self.expired = 0
+        self.runs = 0
+        self.last_run: Optional[datetime] = None
+        self._heap: List[datetime] = []
+        self._horizon: Optional[datetime] = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="unit-expiry", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = 5.0) -> None:
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._thread = None
+
+    def schedule(self, *expire_dates: Optional[datetime]) -> None:
+        """
+        Add the deadlines of committed units, waking the thread if one is earlier
+        than the next. For several deadlines only the earliest is pushed, the
+        window is read again from the database when it passes.
+        """
+        deadlines = [d for d in expire_dates if d is not None]
+        if not deadlines or not self.running:
+            return
+        earliest = min(deadlines)
+        with self._lock:
+            heapq.heappush(self._heap, earliest)
+            if len(deadlines) > 1:
+                self._horizon = min(self._horizon or earliest, earliest)
+            wake = self._heap[0] == earliest
+        if wake:
+            self._wakeup.set()
+
+    def next_deadline(self) -> Optional[datetime]:
+        with self._lock:
+            deadlines = [d for d in (self._heap[:1] + [self._horizon]) if d]
+        return min(deadlines) if deadlines else None
+
+    def metrics(self) -> dict:
+        with self._lock:
+            pending = len(self._heap)
+        return {
+            "running": self.running,
+            "lag_seconds": self.lag,
+            "pending": pending,
+            "next_deadline": self.next_deadline(),
+            "last_run": self.last_run,
+            "runs": self.runs,
+            "expired": self.expired,
+        }
+
+    def _load(self) -> None:
+        """Read the next `window` deadlines of live units into the heap"""
+        stmt = (
+            select(Unit.expire_date)
+            .where(Unit.is_expired == false(), Unit.expire_date.is_not(None))
+            .order_by(Unit.expire_date)
+            .limit(self.window)
+        )
+        with self.session_factory() as db:
+            deadlines = db.scalars(stmt).all()
+        with self._lock:
+            for deadline in deadlines:
+                heapq.heappush(self._heap, deadline)
+            # A full window means there are later deadlines left to read
+            self._horizon = deadlines[-1] if len(deadlines) == self.window else None
+
+    def _expire(self, now: datetime) -> None:
+        with self._lock:
+            due = None
+            while self._heap and self._heap[0] <= now:
+                due = due or self._heap[0]
+                heapq.heappop(self._heap)
+            reload = self._horizon is not None and self._horizon <= now
+        with self.session_factory() as db:
+            expired = expire_due_units(db, now)
+            db.commit()
+        self.lag = (datetime.utcnow() - due).total_seconds() if due else 0.0
+        self.expired += expired
+        self.runs += 1
+        self.last_run = now
+        if reload:
+            self._load()
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                self._tick()
+            except Exception:
+                logger.exception("Unit expiry failed")
+                self._stopping.wait(self.idle_interval)
+
+    def _tick(self) -> None:
+        if self.next_deadline() is None:
+            # Nothing scheduled, pick up deadlines written by other processes
+            self._load()
+        deadline = self.next_deadline()
+        now = datetime.utcnow()
+        if deadline is not None and deadline <= now:
+            self._expire(now)
+            return
+        timeout = self.idle_interval
+        if deadline is not None:
+            timeout = min(timeout, (deadline - now).total_seconds())
+        self._wakeup.wait(timeout)
+        self._wakeup.clear()
+
+
+expiry_scheduler = ExpiryScheduler()
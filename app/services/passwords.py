@@ -0,0 +1,178 @@
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import (Executor, ProcessPoolExecutor,
+                                ThreadPoolExecutor)
+from typing import Any, Callable, List, Optional, Tuple
+
+import bcrypt
+from fastapi import HTTPException
+
+from app.config import (BCRYPT_ROUNDS, PASSWORD_HASH_BULK_QUEUE,
+                        PASSWORD_HASH_BULK_WORKERS, PASSWORD_HASH_PROCESSES,
+                        PASSWORD_HASH_QUEUE, PASSWORD_HASH_WORKERS)
+
+
+def hash_password(password: str, rounds: int = BCRYPT_ROUNDS) -> str:
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds)).decode(
+        "utf-8"
+    )
+
+
+def hash_passwords(passwords: List[str], rounds: int = BCRYPT_ROUNDS) -> List[str]:
+    return [hash_password(password, rounds) for password in passwords]
+
+
+def verify_password(password: str, hashed_password: str) -> bool:
+    return bcrypt.checkpw(password.encode("utf-8"), hashed_password.encode("utf-8"))
+
+
+def hash_rounds(hashed_password: str) -> int:
+    """The cost a bcrypt hash was made with, $2b$12$... -> 12"""
+    return int(hashed_password.split("$")[2])
+
+
+def verify_and_rehash(
+    password: str, hashed_password: str, rounds: int = BCRYPT_ROUNDS
+) -> Tuple[bool, Optional[str]]:
+    """
+    Check a password, and hash it again if its hash was made with another cost
+
+    Returns:
+        Tuple[bool, Optional[str]]: Whether it matched, and the new hash to store
+            when it matched and the cost changed
+    """
+    if not verify_password(password, hashed_password):
+        return False, None
+    if hash_rounds(hashed_password) == rounds:
+        return True, None
+    return True, hash_password(password, rounds)
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt for the async routes on its own bounded pools of workers
+
+    A hash at cost 12 is a few hundred milliseconds of CPU: on the event loop it
+    stalls every other request, and on the shared threadpool it takes the threads
+    the database calls need. Processes (PASSWORD_HASH_PROCESSES) also keep it off
+    the interpreter. At most `max_pending` calls run or wait at once; past that
+    a call fails fast with a 503 instead of queueing logins behind each other.
+    Batches (hash_many) run on `bulk_workers` of their own and count every
+    password against `max_bulk_pending`, so a bulk import neither takes the
+    logins' slots nor puts its chunks ahead of them in the workers' queue.
+
+    Attributes:
+        rejected (int): Calls refused since start because the queue was full
+    """
+
+    def __init__(
+        self,
+        rounds: int = BCRYPT_ROUNDS,
+        workers: int = PASSWORD_HASH_WORKERS,
+        max_pending: int = PASSWORD_HASH_QUEUE,
+        processes: bool = PASSWORD_HASH_PROCESSES,
+        bulk_workers: int = PASSWORD_HASH_BULK_WORKERS,
+        max_bulk_pending: int = PASSWORD_HASH_BULK_QUEUE,
+    ) -> None:
+        self.rounds = rounds
+        self.workers = workers
+        self.max_pending = max_pending
+        self.processes = processes
+        self.bulk_workers = bulk_workers
+        self.max_bulk_pending = max_bulk_pending
+        self.pending = 0
+        self.bulk_pending = 0
+        self.rejected = 0
+        self._executor: Optional[Executor] = None
+        self._bulk_executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+
+    def _make_executor(self, workers: int) -> Executor:
+        if self.processes:
+            # Forking a process that runs the writer and pool threads is
+            # unsafe, spawned workers only import this module
+            return ProcessPoolExecutor(
+                workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return ThreadPoolExecutor(workers, thread_name_prefix="bcrypt")
+
+    @property
+    def executor(self) -> Executor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = self._make_executor(self.workers)
+            return self._executor
+
+    @property
+    def bulk_executor(self) -> Executor:
+        with self._lock:
+            if self._bulk_executor is None:
+                self._bulk_executor = self._make_executor(self.bulk_workers)
+            return self._bulk_executor
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executors = (self._executor, self._bulk_executor)
+            self._executor = self._bulk_executor = None
+        for executor in executors:
+            if executor is not None:
+                executor.shutdown(wait=True, cancel_futures=True)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(hash_password, password, self.rounds)
+
+    async def hash_many(self, passwords: List[str]) -> List[str]:
+        """
+        Hash a batch split across the bulk workers, in the order given. The
+        batch is refused as a whole when its passwords do not fit in the bulk
+        queue.
+        """
+        if not passwords:
+            return []
+        if self.bulk_pending + len(passwords) > self.max_bulk_pending:
+            self._reject()
+        parts = min(len(passwords), self.bulk_workers * 4)
+        size = -(-len(passwords) // parts)
+        chunks = [passwords[i : i + size] for i in range(0, len(passwords), size)]
+        self.bulk_pending += len(passwords)
+        try:
+            hashed = await asyncio.gather(
+                *(
+                    asyncio.wrap_future(
+                        self.bulk_executor.submit(hash_passwords, chunk, self.rounds)
+                    )
+                    for chunk in chunks
+                )
+            )
+        finally:
+            self.bulk_pending -= len(passwords)
+        return [password for chunk in hashed for password in chunk]
+
+    async def verify(
+        self, password: str, hashed_password: str
+    ) -> Tuple[bool, Optional[str]]:
+        """verify_and_rehash at the configured cost"""
+        return await self._run(
+            verify_and_rehash, password, hashed_password, self.rounds
+        )
+
+    async def _run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        if self.pending >= self.max_pending:
+            self._reject()
+        self.pending += 1
+        try:
+            return await asyncio.wrap_future(self.executor.submit(fn, *args))
+        finally:
+            self.pending -= 1
+
+    def _reject(self) -> None:
+        self.rejected += 1
+        raise HTTPException(
+            status_code=503,
+            detail="Too many password checks in progress, retry shortly",
+            headers={"Retry-After": "1"},
+        )
+
+
+password_hasher = PasswordHasher()
@@ -1,28 +1,112 @@
-import time
-from datetime import datetime
-from typing import List, Optional
+from typing import Any, Iterator, List, Optional, Tuple
 
 from fastapi import HTTPException
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
 
+from app.database import SessionLocal
+from app.exceptions.custom_exceptions import CustomException
 from app.models import units as unit_model
+from app.models.loading import plan_relationships
 from app.models import vehicles as vehicle_model
 from app.schemas import units as unit_schema
 from app.schemas import users as user_schema
 from app.schemas import vehicles as vehicle_schema
+from app.services.expiry import expire_due_units, expiry_scheduler
+from app.services.vehicles import add_vehicle
 from app.unit_of_work.unit_of_work import UNIT_OF_WORK, UnitOfWork
+from app.utils.bulk import validate_rows
+from app.utils.exports import csv_chunks, flatten, ndjson_chunks
+from app.utils.filters import Filter
+from app.utils.pagination import Cursor
 
 
 def create_unit(
     db: Session, unit: unit_schema.UnitAdd, vehicle: vehicle_schema.VehicleAdd
 ) -> unit_model.Unit:
     with UnitOfWork(db) as uow:
-        db_unit = uow.units.add_unit(unit)
-        db_vehicle = uow.vehicles.add_vehicle(vehicle)
-        db_unit.vehicle_id = db_vehicle.id
+        db_vehicle = add_vehicle(uow, vehicle)
+        db_unit = uow.units.add_unit(unit, vehicle_id=db_vehicle.id)
+        uow.on_commit(lambda: expiry_scheduler.schedule(db_unit.expire_date))
         uow.commit()
-        uow.refresh(db_unit), uow.refresh(db_vehicle)
-        return db_unit.serialize() if db_unit else None
+    return db_unit.serialize()
+
+
+BULK_BATCH_SIZE = 1000
+
+
+def _insert_bulk_rows(
+    uow: UnitOfWork, batch: List[Tuple[int, unit_schema.UnitVehicleAdd]]
+) -> List[dict]:
+    vehicle_ids = uow.vehicles.add_vehicles(
+        [row.vehicle.model_dump() for _, row in batch]
+    )
+    unit_ids = uow.units.add_units(
+        [
+            {**row.unit.model_dump(), "vehicle_id": vehicle_id}
+            for (_, row), vehicle_id in zip(batch, vehicle_ids)
+        ]
+    )
+    return [
+        {
+            "index": index,
+            "status": "created",
+            "unit_id": unit_id,
+            "vehicle_id": vehicle_id,
+        }
+        for (index, _), unit_id, vehicle_id in zip(batch, unit_ids, vehicle_ids)
+    ]
+
+
+def create_units_bulk(
+    db: Session, rows: List[Any], batch_size: int = BULK_BATCH_SIZE
+) -> dict:
+    """
+    Insert many {unit, vehicle} pairs in one transaction
+
+    Rows are validated up front, then vehicles and units are inserted with one
+    executemany per batch. Each batch runs in a savepoint; if one fails its rows are
+    retried one at a time so a bad row only fails itself.
+
+    Args:
+        db (Session): The request session
+        rows (List[Any]): Raw {unit, vehicle} objects as decoded from the body
+        batch_size (int, optional): Rows per executemany. Defaults to BULK_BATCH_SIZE.
+    Returns:
+        dict: created and failed counts and one result per row, in request order
+    """
+    valid, errors = validate_rows(unit_schema.UnitVehicleAdd, rows)
+    results = [
+        {"index": index, "status": "failed", "errors": row_errors}
+        for index, row_errors in errors.items()
+    ]
+    with UnitOfWork(db) as uow:
+        for start in range(0, len(valid), batch_size):
+            batch = valid[start : start + batch_size]
+            try:
+                with uow.savepoint():
+                    results += _insert_bulk_rows(uow, batch)
+                continue
+            except (SQLAlchemyError, CustomException):
+                pass
+            for row in batch:
+                try:
+                    with uow.savepoint():
+                        results += _insert_bulk_rows(uow, [row])
+                except (SQLAlchemyError, CustomException) as e:
+                    results.append(
+                        {
+                            "index": row[0],
+                            "status": "failed",
+                            "errors": [str(getattr(e, "orig", e))],
+                        }
+                    )
+        expire_dates = [row.unit.expire_date for _, row in valid]
+        uow.on_commit(lambda: expiry_scheduler.schedule(*expire_dates))
+        uow.commit()
+    results.sort(key=lambda result: result["index"])
+    created = sum(result["status"] == "created" for result in results)
+    return {"created": created, "failed": len(results) - created, "results": results}
 
 
 # ✅
@@ -32,15 +116,35 @@ def get_unit_by_id(
     include_vehicle: bool = False,
     include_store: bool = False,
 ) -> Optional[unit_model.Unit]:
+    relationships = plan_relationships(
+        unit_model.Unit,
+        unit_schema.UnitOutput,
+        include_vehicle=include_vehicle,
+        include_store=include_store,
+    )
     with UnitOfWork(db) as uow:
-        db_unit = uow.units.get_unit(unit_id)
-        return (
-            db_unit.serialize(
-                include_vehicle=include_vehicle, include_store=include_store
-            )
-            if db_unit
-            else None
-        )
+        db_unit = uow.units.get_unit(unit_id, relationships)
+        return db_unit.serialize(relationships=relationships) if db_unit else None
+
+
+def lookup_units(
+    db: Session,
+    stock_number: str,
+    limit: int = 100,
+    include_vehicle: bool = False,
+    include_store: bool = False,
+) -> List[dict]:
+    """Units with this stock number"""
+    relationships = plan_relationships(
+        unit_model.Unit,
+        unit_schema.UnitOutput,
+        include_vehicle=include_vehicle,
+        include_store=include_store,
+    )
+    db_units = UNIT_OF_WORK(db).units.get_units_by_stock_number(
+        stock_number.strip(), limit, relationships
+    )
+    return [db_unit.serialize(relationships=relationships) for db_unit in db_units]
 
 
 # ✅
@@ -52,52 +156,132 @@ def get_units(
     to_join: bool = False,
     models_to_join: Optional[List[str]] = None,
     joined_model_filters: Optional[dict] = None,
+    cursor: Optional[Cursor] = None,
+    sort_key: str = "id",
     include_vehicle: bool = False,
     include_store: bool = False,
+    filters: Optional[Filter] = None,
 ) -> List[unit_model.Unit]:
-
+    relationships = plan_relationships(
+        unit_model.Unit,
+        unit_schema.UnitOutput,
+        include_vehicle=include_vehicle,
+        include_store=include_store,
+    )
     db_units = UNIT_OF_WORK(db).units.get_all_units(
-        skip, limit, filter, to_join, models_to_join, joined_model_filters
+        skip,
+        limit,
+        filter,
+        to_join,
+        models_to_join,
+        joined_model_filters,
+        cursor,
+        sort_key,
+        relationships,
+        filters,
+    )
+    return [db_unit.serialize(relationships=relationships) for db_unit in db_units]
+
+
+def count_units(
+    db: Session,
+    filter: Optional[dict] = None,
+    to_join: bool = False,
+    models_to_join: Optional[List[str]] = None,
+    joined_model_filters: Optional[dict] = None,
+    filters: Optional[Filter] = None,
+    facets: Tuple[Tuple[str, str], ...] = (),
+) -> dict:
+    """Total and facet counts of the units get_units pages through"""
+    return UNIT_OF_WORK(db).units.count_units(
+        filter, to_join, models_to_join, joined_model_filters, filters, facets
     )
+
+
+def search_units(
+    db: Session,
+    match: str,
+    limit: int = 100,
+    cursor: Optional[Cursor] = None,
+    include_vehicle: bool = True,
+    include_store: bool = False,
+) -> List[dict]:
+    """
+    Units matching a full-text search, best first, each with its `rank`, None
+    for the matches older than the ranked window
+    """
+    relationships = plan_relationships(
+        unit_model.Unit,
+        unit_schema.UnitOutput,
+        include_vehicle=include_vehicle,
+        include_store=include_store,
+    )
+    rows = UNIT_OF_WORK(db).units.search_units(match, limit, cursor, relationships)
     return [
-        db_unit.serialize(include_vehicle=include_vehicle, include_store=include_store)
-        for db_unit in db_units
+        {**db_unit.serialize(relationships=relationships), "rank": rank}
+        for db_unit, rank in rows
     ]
 
 
-def delete_unit(db: Session, unit_id: int) -> unit_model.Unit:
-    vehicle_id = (
-        db.query(unit_model.Unit)
-        .filter(unit_model.Unit.id == unit_id)
-        .first()
-        .vehicle_id
-    )
-    if not vehicle_id:
-        raise HTTPException(status_code=404, detail="Vehicle not found")
-    db_unit = UNIT_OF_WORK(db).units.delete_unit(unit_id)
-    UNIT_OF_WORK(db).vehicles.delete_vehicle(vehicle_id)
-    db.commit()
-    return db_unit
-
-
-def expire_units(db: Session) -> bool:
-    db_units = (
-        db.query(unit_model.Unit)
-        .filter(unit_model.Unit.expire_date <= datetime.utcnow())
-        .all()
+def export_units(
+    format: str = "ndjson",
+    filter: Optional[dict] = None,
+    to_join: bool = False,
+    models_to_join: Optional[List[str]] = None,
+    joined_model_filters: Optional[dict] = None,
+    include_vehicle: bool = True,
+    include_store: bool = True,
+    chunk_size: int = 500,
+    filters: Optional[Filter] = None,
+) -> Iterator[bytes]:
+    """
+    Stream every matching unit as NDJSON or CSV chunks
+
+    The generator owns its session: it outlives the request's get_db session, which
+    FastAPI closes before a StreamingResponse body is sent.
+    """
+    relationships = plan_relationships(
+        unit_model.Unit, include_vehicle=include_vehicle, include_store=include_store
     )
-    if not db_units:
-        return False
-    for db_unit in db_units:
-        db_unit.is_expired = True
-    db.commit()
-    return True
+    with SessionLocal() as db:
+        db_units = UnitOfWork(db).units.stream_units(
+            filter,
+            to_join,
+            models_to_join,
+            joined_model_filters,
+            relationships,
+            batch_size=chunk_size,
+            filters=filters,
+        )
+        rows = (db_unit.serialize(relationships=relationships) for db_unit in db_units)
+        if format == "csv":
+            columns = [c.name for c in unit_model.Unit.__table__.columns]
+            for key in relationships:
+                related = unit_model.Unit.__mapper__.relationships[key].mapper
+                columns += [f"{key}.{c.name}" for c in related.local_table.columns]
+            rows = (flatten(row, relationships) for row in rows)
+            yield from csv_chunks(rows, columns, chunk_size)
+        else:
+            yield from ndjson_chunks(rows, chunk_size)
+
 
+def delete_unit(db: Session, unit_id: int) -> unit_model.Unit:
+    with UnitOfWork(db) as uow:
+        db_unit = uow.units.get_unit(unit_id)
+        if db_unit is None or not db_unit.vehicle_id:
+            raise HTTPException(status_code=404, detail="Vehicle not found")
+        uow.units.delete_unit(unit_id)
+        uow.vehicles.delete_vehicle(db_unit.vehicle_id)
+        uow.commit()
+    return None
 
-def check_and_expire_units(db: Session) -> None:
-    while True:
-        expire_units(db)
-        time.sleep(60 * 15)
+
+def expire_units(db: Session) -> int:
+    """Expire every unit past its expire_date now, without waiting for the scheduler"""
+    with UnitOfWork(db) as uow:
+        expired = expire_due_units(db)
+        uow.commit()
+    return expired
 
 
 def update_unit(
@@ -105,6 +289,9 @@ def update_unit(
 ) -> unit_model.Unit:
     with UnitOfWork(db) as uow:
         db_unit = uow.units.update_unit(unit, unit_id)
+        if db_unit is not None:
+            uow.on_commit(lambda: expiry_scheduler.schedule(db_unit.expire_date))
         uow.commit()
-        uow.refresh(db_unit)
-        return db_unit
+    if db_unit is None:
+        return None
+    return db_unit.serialize()
@@ -1,33 +1,186 @@
-from typing import Any, List, Optional
+import threading
+from typing import Any, Dict, List, NamedTuple, Optional, Set, Tuple
 
-import bcrypt
 from fastapi import HTTPException
 from sqlalchemy import or_, and_, func, desc, asc, text, select, update
-from sqlalchemy.exc import IntegrityError, InvalidRequestError
+from sqlalchemy.exc import IntegrityError, InvalidRequestError, SQLAlchemyError
 from sqlalchemy.orm import Session
 from sqlalchemy.orm.exc import FlushError
 
+from app.config import PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL
+from app.exceptions.custom_exceptions import CustomException
 from app.models import users as models
+from app.models.loading import loader_options, plan_relationships
 from app.models.stores import Store
+from app.repositories.base.table_versions import mark_changed
+from app.services.passwords import hash_password, verify_password  # noqa: F401
 from app.schemas import users as schemas
 from app.unit_of_work.unit_of_work import UnitOfWork
+from app.utils.bulk import validate_rows
+from app.utils.cache import TTLCache
+from app.utils.pagination import Cursor
 
 
 
 # ✅ Takes 0.1808s to create user
-def create_user(db: Session, user: schemas.UserCreate, include_store: bool = False) -> models.User:
-        with UnitOfWork(db) as uow:
-            db_user = uow.users.add_user(user)
-            db_user.hashed_password = hash_password(user.password)
-            db_user.password = None
-            uow.commit()
-            return db_user.serialize(include_store=include_store)
+def create_user(
+    db: Session,
+    user: schemas.UserCreate,
+    include_store: bool = False,
+    hashed_password: Optional[str] = None,
+) -> models.User:
+    """
+    Insert a user with its password hashed, never the plain one. Pass
+    hashed_password to do the slow bcrypt hash before the transaction opens.
+    """
+    hashed_password = hashed_password or hash_password(user.password)
+    with UnitOfWork(db) as uow:
+        db_user = uow.users.add_user(
+            user, password=None, hashed_password=hashed_password
+        )
+        uow.commit()
+        return db_user.serialize(include_store=include_store)
+
+
+BULK_BATCH_SIZE = 1000
+
+# Flags the schema leaves optional, every row of an executemany needs the same keys
+_BULK_FLAGS = ("is_admin", "is_superuser", "is_active")
+
+
+def find_taken(
+    db: Session, emails: List[str], usernames: List[str]
+) -> Tuple[Set[str], Set[str]]:
+    """The emails and the usernames among these already registered, in one query"""
+    if not emails and not usernames:
+        return set(), set()
+    stmt = select(models.User.email, models.User.username).where(
+        or_(models.User.email.in_(emails), models.User.username.in_(usernames))
+    )
+    rows = db.execute(stmt).all()
+    return {email for email, _ in rows}, {username for _, username in rows}
+
+
+def check_users_bulk(
+    db: Session, rows: List[Any]
+) -> Tuple[List[Tuple[int, schemas.UserCreate]], List[dict]]:
+    """
+    Validate bulk user rows before their passwords are hashed
+
+    A row fails on a schema error, a missing password, or an email or username
+    taken in the database or by an earlier row of the request.
+
+    Args:
+        db (Session): The request session
+        rows (List[Any]): Raw UserCreate objects as decoded from the body
+    Returns:
+        Tuple[List[Tuple[int, schemas.UserCreate]], List[dict]]: The (index, user)
+            rows to create, and a failed result for each of the others
+    """
+    valid, errors = validate_rows(schemas.UserCreate, rows)
+    for index, user in valid:
+        if not user.password:
+            errors[index] = ["password: Field required"]
+    valid = [(index, user) for index, user in valid if index not in errors]
+    taken_emails, taken_usernames = find_taken(
+        db,
+        [user.email for _, user in valid if user.email],
+        [user.username for _, user in valid if user.username],
+    )
+    accepted = []
+    for index, user in valid:
+        problems = []
+        if user.email and user.email in taken_emails:
+            problems.append(f"email: {user.email} is already registered")
+        if user.username and user.username in taken_usernames:
+            problems.append(f"username: {user.username} is already registered")
+        if problems:
+            errors[index] = problems
+            continue
+        taken_emails.add(user.email)
+        taken_usernames.add(user.username)
+        accepted.append((index, user))
+    failed = [
+        {"index": index, "status": "failed", "errors": row_errors}
+        for index, row_errors in errors.items()
+    ]
+    return accepted, failed
+
+
+def _insert_bulk_users(
+    uow: UnitOfWork, batch: List[Tuple[int, schemas.UserCreate, str]]
+) -> List[dict]:
+    user_ids = uow.users.add_users(
+        [
+            {
+                **user.model_dump(),
+                **{flag: bool(getattr(user, flag)) for flag in _BULK_FLAGS},
+                "password": None,
+                "hashed_password": hashed_password,
+            }
+            for _, user, hashed_password in batch
+        ]
+    )
+    return [
+        {"index": index, "status": "created", "user_id": user_id}
+        for (index, _, _), user_id in zip(batch, user_ids)
+    ]
+
+
+def create_users_bulk(
+    db: Session,
+    users: List[Tuple[int, schemas.UserCreate, str]],
+    failed: Optional[List[dict]] = None,
+    batch_size: int = BULK_BATCH_SIZE,
+) -> dict:
+    """
+    Insert many checked users with their password hashes in one transaction
+
+    Each batch is one executemany in a savepoint; if one fails, on a unique column
+    taken since check_users_bulk for instance, its rows are retried one at a time
+    so a bad row only fails itself.
+
+    Args:
+        db (Session): The request session
+        users (List[Tuple[int, schemas.UserCreate, str]]): (index, user, hash) rows
+        failed (Optional[List[dict]]): Results of the rows already failed
+        batch_size (int, optional): Rows per executemany. Defaults to BULK_BATCH_SIZE.
+    Returns:
+        dict: created and failed counts and one result per row, in request order
+    """
+    results = list(failed or ())
+    with UnitOfWork(db) as uow:
+        for start in range(0, len(users), batch_size):
+            batch = users[start : start + batch_size]
+            try:
+                with uow.savepoint():
+                    results += _insert_bulk_users(uow, batch)
+                continue
+            except (SQLAlchemyError, CustomException):
+                pass
+            for row in batch:
+                try:
+                    with uow.savepoint():
+                        results += _insert_bulk_users(uow, [row])
+                except (SQLAlchemyError, CustomException) as e:
+                    results.append(
+                        {
+                            "index": row[0],
+                            "status": "failed",
+                            "errors": [str(getattr(e, "orig", e))],
+                        }
+                    )
+        uow.commit()
+    results.sort(key=lambda result: result["index"])
+    created = sum(result["status"] == "created" for result in results)
+    return {"created": created, "failed": len(results) - created, "results": results}
 
 
 def get_user_by_id(db: Session, user_id: int) -> Optional[models.User]:
+    relationships = plan_relationships(models.User, schemas.UserOutput)
     with UnitOfWork(db) as uow:
-        user = uow.users.get_user(user_id)
-        return user.serialize()
+        user = uow.users.get_user(user_id, relationships)
+        return user.serialize(relationships=relationships)
 
 
 def get_user_by_email_or_username(db: Session, email: str, username: str) -> Optional[models.User]:
@@ -49,20 +202,67 @@ def authenticate_user(
 
 
 # ✅
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+def get_user(db, username: str):
+    # The store rides along in the same query, the current user is rendered
+    # after the session has gone back to the event loop and cannot lazy load
+    stmt = (
+        select(models.User)
+        .where(models.User.username == username)
+        .options(*loader_options(models.User, ("store",)))
+    )
+    result = db.execute(stmt).first()
+    return result[0] if result else None
 
 
-# ✅
-def verify_password(password: str, hashed_password: str) -> bool:
-    return bcrypt.checkpw(password.encode("utf-8"), hashed_password.encode("utf-8"))
+class Principal(NamedTuple):
+    """What a request needs to know about the user it is authenticated as"""
 
+    id: int
+    username: str
+    email: Optional[str]
+    is_active: bool
+    is_admin: bool
+    store_id: Optional[int]
+
+
+# Principals by username, read by get_current_user on every authenticated request
+principal_cache: TTLCache[Principal] = TTLCache(PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL)
+
+
+# Per-user access token versions, a token is only valid at its user's current
+# version. They live in this process: revocations last until it restarts, when
+# tokens issued before it are at most ACCESS_TOKEN_EXPIRE_MINUTES away from expiry
+_token_versions: Dict[int, int] = {}
+_token_versions_lock = threading.Lock()
 
-# ✅
-def get_user(db, username: str):
-    stmt = select(models.User).where(models.User.username == username)
-    result = db.execute(stmt).first()
-    return result[0] if result else None
+
+def token_version(user_id: int) -> int:
+    return _token_versions.get(user_id, 0)
+
+
+def revoke_tokens(user_id: int) -> int:
+    """Invalidate every access token issued to the user so far, returns the new version"""
+    with _token_versions_lock:
+        _token_versions[user_id] = _token_versions.get(user_id, 0) + 1
+        return _token_versions[user_id]
+
+
+def principal_of(user: models.User) -> Principal:
+    return Principal(*(getattr(user, field) for field in Principal._fields))
+
+
+def get_principal(db: Session, username: str) -> Optional[Principal]:
+    stmt = select(*(getattr(models.User, field) for field in Principal._fields)).where(
+        models.User.username == username
+    )
+    row = db.execute(stmt).first()
+    return Principal(*row) if row else None
+
+
+def invalidate_principal(user_id: int) -> None:
+    """Drop the cached principal and revoke the tokens carrying it as claims"""
+    principal_cache.invalidate_where(lambda _, principal: principal.id == user_id)
+    revoke_tokens(user_id)
 
 
 # ✅
@@ -74,14 +274,26 @@ def get_users(
     to_join: bool = False,
     models_to_join: Optional[List[str]] = None,
     joined_model_filters: Optional[dict] = None,
+    cursor: Optional[Cursor] = None,
+    sort_key: str = "id",
     include_store: bool = False,
 ) -> List[Optional[models.User]]:
-
+    relationships = plan_relationships(
+        models.User, schemas.UserOutput, include_store=include_store
+    )
     with UnitOfWork(db) as uow:
         users = uow.users.get_users(
-            skip, limit, filter, to_join, models_to_join, joined_model_filters
+            skip,
+            limit,
+            filter,
+            to_join,
+            models_to_join,
+            joined_model_filters,
+            cursor,
+            sort_key,
+            relationships,
         )
-        return [user.serialize(include_store=include_store) for user in users]
+        return [user.serialize(relationships=relationships) for user in users]
 
 
 # ✅ Takes 0.0093s to delete user
@@ -92,39 +304,55 @@ def delete_user(db: Session, user_id: int) -> None:
     try:
         with UnitOfWork(db) as uow:
             uow.users.delete_user(user_id)
+            uow.on_commit(lambda: invalidate_principal(user_id))
             uow.commit()
             return {"Status": "Success", "Detail": "User deleted successfully"}
     except Exception as e:
         return {"Status": "Failed", "Detail": f"Error deleting user with id {user_id}"}
 
 
+def set_hashed_password(db: Session, user_id: int, hashed_password: str) -> None:
+    """Store a password hash made again at the current BCRYPT_ROUNDS"""
+    with UnitOfWork(db) as uow:
+        mark_changed(db, models.User.__tablename__)
+        db.execute(
+            update(models.User)
+            .where(models.User.id == user_id)
+            .values(hashed_password=hashed_password)
+        )
+        uow.commit()
+
+
 def update_user(db: Session, user_id: int, user: schemas.UserUpdate) -> models.User:
     with UnitOfWork(db) as uow:
-        db_user = uow.users.update_user(user_id, user)
+        db_user = uow.users.update_user(user, user_id)
+        uow.on_commit(lambda: invalidate_principal(user_id))
         uow.commit()
         return db_user.serialize()
 
 # ✅
 def confirm(db: Session, user: models.User) -> models.User:
-    user.confirmed = True
-    db.commit()
-    db.refresh(user)
+    with UnitOfWork(db) as uow:
+        user.confirmed = True
+        uow.commit()
     return user
 
 
 def activate_user(db: Session, user_id: int) -> models.User:
-    db_user = db.query(models.User).filter(models.User.id == user_id).first()
-    db_user.is_active = True
-    db.commit()
-    db.refresh(db_user)
+    with UnitOfWork(db) as uow:
+        db_user = db.query(models.User).filter(models.User.id == user_id).first()
+        db_user.is_active = True
+        uow.on_commit(lambda: invalidate_principal(user_id))
+        uow.commit()
     return db_user
 
 
 def deactivate_user(db: Session, user_id: int) -> models.User:
-    db_user = db.query(models.User).filter(models.User.id == user_id).first()
-    db_user.is_active = False
-    db.commit()
-    db.refresh(db_user)
+    with UnitOfWork(db) as uow:
+        db_user = db.query(models.User).filter(models.User.id == user_id).first()
+        db_user.is_active = False
+        uow.on_commit(lambda: invalidate_principal(user_id))
+        uow.commit()
     return db_user
 
 
@@ -1,26 +1,55 @@
-from datetime import datetime
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
 from fastapi import HTTPException
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from app.models import vehicles as models
+from app.models.loading import plan_relationships
 from app.schemas import vehicles as schemas
 from app.unit_of_work.unit_of_work import UnitOfWork
+from app.utils.filters import Filter
+from app.utils.pagination import Cursor
+
+
+def duplicate_vin(vin: Optional[str]) -> HTTPException:
+    """The 409 for a write refused by the unique index on vehicles.vin"""
+    return HTTPException(
+        status_code=409, detail=f"A vehicle with VIN {vin} already exists"
+    )
+
+
+def add_vehicle(uow: UnitOfWork, vehicle: schemas.VehicleAdd) -> models.Vehicle:
+    """Insert a vehicle in the unit of work, a VIN already taken is a 409"""
+    try:
+        return uow.vehicles.add_vehicle(vehicle)
+    except IntegrityError:
+        raise duplicate_vin(vehicle.vin)
 
 
 def create_vehicle(db: Session, vehicle: schemas.VehicleAdd) -> models.Vehicle:
     with UnitOfWork(db) as uow:
-        db_vehicle = uow.vehicles.add_vehicle(vehicle)
+        db_vehicle = add_vehicle(uow, vehicle)
         uow.commit()
-        uow.refresh(db_vehicle)
         return db_vehicle.serialize() if db_vehicle else None
 
 
 def get_vehicle_by_id(db: Session, vehicle_id: int) -> Optional[models.Vehicle]:
+    relationships = plan_relationships(models.Vehicle, schemas.VehicleOutput)
     with UnitOfWork(db) as uow:
-        db_vehicle = uow.vehicles.get_vehicle(vehicle_id)
-        return db_vehicle.serialize() if db_vehicle else None
+        db_vehicle = uow.vehicles.get_vehicle(vehicle_id, relationships)
+        return db_vehicle.serialize(relationships=relationships) if db_vehicle else None
+
+
+def lookup_vehicles(db: Session, vin_suffix: str, limit: int = 100) -> List[dict]:
+    """Vehicles whose VIN ends with vin_suffix, in any case"""
+    relationships = plan_relationships(models.Vehicle, schemas.VehicleOutput)
+    db_vehicles = UnitOfWork(db).vehicles.get_vehicles_by_vin_suffix(
+        vin_suffix.strip().upper(), limit, relationships
+    )
+    return [
+        db_vehicle.serialize(relationships=relationships) for db_vehicle in db_vehicles
+    ]
 
 
 def get_vehicles(
@@ -31,35 +60,68 @@ def get_vehicles(
     to_join: bool = False,
     models_to_join: Optional[List[str]] = None,
     joined_model_filters: Optional[dict] = None,
+    cursor: Optional[Cursor] = None,
+    sort_key: str = "id",
     include_unit_model: bool = False,
+    filters: Optional[Filter] = None,
 ) -> List[models.Vehicle]:
+    relationships = plan_relationships(
+        models.Vehicle, schemas.VehicleOutput, include_unit_model=include_unit_model
+    )
     db_vehicles = UnitOfWork(db).vehicles.get_all_vehicles(
-        skip, limit, filter, to_join, models_to_join, joined_model_filters
+        skip,
+        limit,
+        filter,
+        to_join,
+        models_to_join,
+        joined_model_filters,
+        cursor,
+        sort_key,
+        relationships,
+        filters,
     )
     return [
-        db_vehicle.serialize(include_unit_model=include_unit_model)
-        for db_vehicle in db_vehicles
+        db_vehicle.serialize(relationships=relationships) for db_vehicle in db_vehicles
     ]
 
 
-def delete_vehicle(db: Session, vehicle_id: int) -> models.Vehicle:
-
-    db_vehicle = (
-        db.query(models.Vehicle).filter(models.Vehicle.id == vehicle_id).first()
+def count_vehicles(
+    db: Session,
+    filter: Optional[dict] = None,
+    to_join: bool = False,
+    models_to_join: Optional[List[str]] = None,
+    joined_model_filters: Optional[dict] = None,
+    filters: Optional[Filter] = None,
+    facets: Tuple[Tuple[str, str], ...] = (),
+) -> dict:
+    """Total and facet counts of the vehicles get_vehicles pages through"""
+    return UnitOfWork(db).vehicles.count_vehicles(
+        filter, to_join, models_to_join, joined_model_filters, filters, facets
     )
-    db.delete(db_vehicle)
-    db.commit()
+
+
+def delete_vehicle(db: Session, vehicle_id: int) -> models.Vehicle:
+    with UnitOfWork(db) as uow:
+        db_vehicle = (
+            db.query(models.Vehicle).filter(models.Vehicle.id == vehicle_id).first()
+        )
+        db.delete(db_vehicle)
+        uow.commit()
     return db_vehicle
 
 
 def update_vehicle(db: Session, vehicle: schemas.VehicleUpdate) -> models.Vehicle:
-    db_vehicle = (
-        db.query(models.Vehicle).filter(models.Vehicle.id == vehicle.id).first()
-    )
-    if db_vehicle is None:
-        raise HTTPException(status_code=404, detail="Vehicle not found")
-    for var, value in vars(vehicle).items():
-        setattr(db_vehicle, var, value) if value else None
-    db.commit()
-    db.refresh(db_vehicle)
+    with UnitOfWork(db) as uow:
+        db_vehicle = (
+            db.query(models.Vehicle).filter(models.Vehicle.id == vehicle.id).first()
+        )
+        if db_vehicle is None:
+            raise HTTPException(status_code=404, detail="Vehicle not found")
+        for var, value in vars(vehicle).items():
+            setattr(db_vehicle, var, value) if value else None
+        try:
+            db.flush()
+        except IntegrityError:
+            raise duplicate_vin(vehicle.vin)
+        uow.commit()
     return db_vehicle
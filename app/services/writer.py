@@ -0,0 +1,138 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.unit_of_work.unit_of_work import UnitOfWork
+
+logger = logging.getLogger(__name__)
+
+Job = Tuple[Callable[..., Any], tuple, dict, Future]
+
+
+class GroupCommitWriter:
+    """
+    Runs the app's writes on one thread and commits them in groups
+
+    A job is a service call, fn(session, *args, **kwargs). The thread takes the
+    first job off the queue, gathers what else arrives within `window` seconds
+    (at most `max_batch` jobs) and runs them one after the other in a single
+    transaction, each under its own SAVEPOINT so a job that raises is rolled back
+    alone. One COMMIT, and one fsync, then covers the group and every caller's
+    future resolves to its job's result or exception. The services open their
+    own UnitOfWork, nested in the writer's: their commit() only marks the group.
+
+    SQLite has one writer at a time anyway, queueing here keeps the writes off
+    the lock and lets them share a commit.
+
+    Attributes:
+        jobs (int): Jobs run since start
+        commits (int): COMMITs issued since start
+        largest_batch (int): Most jobs committed together
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        max_batch: int = 128,
+        window: float = 0.002,
+    ) -> None:
+        self.session_factory = session_factory
+        self.max_batch = max_batch
+        self.window = window
+        self.jobs = 0
+        self.commits = 0
+        self.largest_batch = 0
+        self._queue: "queue.SimpleQueue[Optional[Job]]" = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = 5.0) -> None:
+        """Commit what is queued and stop the thread"""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout)
+        self._thread = None
+
+    def submit(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+        """Queue fn(session, *args, **kwargs), the future resolves once it is committed"""
+        future = Future()
+        self._queue.put((fn, args, kwargs, future))
+        return future
+
+    def metrics(self) -> dict:
+        return {
+            "running": self.running,
+            "pending": self._queue.qsize(),
+            "jobs": self.jobs,
+            "commits": self.commits,
+            "largest_batch": self.largest_batch,
+        }
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            job = self._queue.get()
+            if job is None:
+                break
+            batch = [job]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                try:
+                    job = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if job is None:
+                    stopping = True
+                    break
+                batch.append(job)
+            try:
+                self._commit(batch)
+            except Exception:
+                logger.exception("Group commit failed")
+
+    def _commit(self, batch: List[Job]) -> None:
+        outcomes = []
+        try:
+            with self.session_factory() as db:
+                with UnitOfWork(db) as uow:
+                    for fn, args, kwargs, future in batch:
+                        if not future.set_running_or_notify_cancel():
+                            continue
+                        try:
+                            with uow.savepoint():
+                                outcomes.append((future, fn(db, *args, **kwargs), None))
+                        except Exception as e:
+                            outcomes.append((future, None, e))
+                    uow.commit()
+        except Exception as e:
+            # The COMMIT itself failed, none of the group was written
+            for _, _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            raise
+        self.jobs += len(outcomes)
+        self.commits += 1
+        self.largest_batch = max(self.largest_batch, len(batch))
+        for future, result, error in outcomes:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+
+group_commit_writer = GroupCommitWriter()
@@ -1,7 +1,7 @@
 from abc import ABC, abstractmethod
 from typing import Callable
 
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, SessionTransaction
 
 from app.repositories.stores import store_repository, store_repository_base
 from app.repositories.units import unit_repository, unit_repository_base
@@ -29,6 +29,14 @@ class UnitOfWorkBase(ABC):
     def refresh(self, entity):
         raise NotImplementedError()
 
+    @abstractmethod
+    def savepoint(self):
+        raise NotImplementedError()
+
+    @abstractmethod
+    def on_commit(self, callback):
+        raise NotImplementedError()
+
     @abstractmethod
     def commit(self):
         raise NotImplementedError()
@@ -39,6 +47,19 @@ class UnitOfWorkBase(ABC):
 
 
 class UnitOfWork(UnitOfWorkBase):
+    """
+    Groups the repository writes of a request into one transaction
+
+    Units of work on the same session nest: commit() only marks the work as done
+    and the outermost unit issues the single COMMIT when it exits, so a request
+    touching several services still commits once. An exception rolls the whole
+    transaction back when it leaves the outermost unit; a savepoint() it passes
+    on the way out undoes only the writes made inside it.
+    Which engine each statement runs on is up to the session: SessionLocal reads
+    from the read-only pool until the first write takes the writer connection.
+    The session itself belongs to the request and is closed by get_db's RequestSession.
+    """
+
     def __init__(self, db: Callable[[], Session]):
         self.db = db
         self._users = None
@@ -47,11 +68,18 @@ class UnitOfWork(UnitOfWorkBase):
         self._stores = None
 
     def __enter__(self):
+        self.db.info["uow_depth"] = self.db.info.get("uow_depth", 0) + 1
         return super().__enter__()
 
-    def __exit__(self, *args):
-        super().__exit__(*args)
-        self.db.close()
+    def __exit__(self, exn_type, exn_value, traceback):
+        self.db.info["uow_depth"] -= 1
+        if exn_type is not None:
+            # A nested unit leaves it to the outermost one, or to a savepoint
+            # around it, which keeps the rest of the transaction
+            if self.db.info["uow_depth"] == 0:
+                self.rollback()
+        elif self.db.info["uow_depth"] == 0 and self.db.info.pop("uow_commit", False):
+            self._commit()
 
     @property
     def users(self) -> user_repository_base.UserRepositoryBase:
@@ -80,12 +108,30 @@ class UnitOfWork(UnitOfWorkBase):
     def refresh(self, entity):
         self.db.refresh(entity)
 
+    def savepoint(self) -> SessionTransaction:
+        """Context manager that rolls back only the writes made inside it on error"""
+        return self.db.begin_nested()
+
+    def on_commit(self, callback: Callable[[], None]) -> None:
+        """Call callback once the outermost unit has committed, e.g. to drop a cache"""
+        self.db.info.setdefault("uow_on_commit", []).append(callback)
+
     def commit(self):
-        self.db.commit()
+        if self.db.info.get("uow_depth"):
+            self.db.info["uow_commit"] = True
+        else:
+            self._commit()
 
     def rollback(self):
+        self.db.info.pop("uow_commit", None)
+        self.db.info.pop("uow_on_commit", None)
         self.db.rollback()
 
+    def _commit(self) -> None:
+        self.db.commit()
+        for callback in self.db.info.pop("uow_on_commit", ()):
+            callback()
+
 
 def UNIT_OF_WORK(db: Session) -> UnitOfWork:
     with UnitOfWork(db) as uow:
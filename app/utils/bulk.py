@@ -0,0 +1,53 @@
+from collections import defaultdict
+from typing import Any, List, Tuple
+
+import orjson
+from fastapi import HTTPException, Request
+from pydantic import ValidationError
+
+from app.utils.responses import get_type_adapter
+
+
+async def read_rows(request: Request) -> List[Any]:
+    """
+    Decode a bulk request body, a JSON array or NDJSON with one object per line
+
+    Raises:
+        HTTPException: If the body is not valid JSON or not an array
+    """
+    body = await request.body()
+    try:
+        if request.headers.get("content-type", "").startswith("application/x-ndjson"):
+            rows = [orjson.loads(line) for line in body.splitlines() if line.strip()]
+        else:
+            rows = orjson.loads(body)
+    except orjson.JSONDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"Malformed body: {e}")
+    if not isinstance(rows, list):
+        raise HTTPException(status_code=400, detail="Expected an array of objects")
+    return rows
+
+
+def validate_rows(schema: Any, rows: List[Any]) -> Tuple[List[Tuple[int, Any]], dict]:
+    """
+    Validate every row in one pass, going row by row only to split out failures
+
+    Returns:
+        Tuple[List[Tuple[int, Any]], dict]: The (index, model) of the valid rows,
+            and the error messages of the others by index
+    """
+    try:
+        return list(enumerate(get_type_adapter(List[schema]).validate_python(rows))), {}
+    except ValidationError as e:
+        errors = defaultdict(list)
+        for error in e.errors(include_url=False):
+            index, *loc = error["loc"]
+            field = ".".join(str(part) for part in loc)
+            errors[index].append(f"{field}: {error['msg']}" if field else error["msg"])
+    row_adapter = get_type_adapter(schema)
+    valid = [
+        (index, row_adapter.validate_python(row))
+        for index, row in enumerate(rows)
+        if index not in errors
+    ]
+    return valid, errors
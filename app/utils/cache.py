@@ -0,0 +1,109 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import (Callable, Dict, Generic, Hashable, Iterable, Optional,
+                    Tuple, TypeVar)
+
+V = TypeVar("V")
+
+
+class TTLCache(Generic[V]):
+    """
+    Thread safe LRU cache whose entries also expire `ttl` seconds after being set
+
+    Invalidating bumps `version`. A caller that loads a value on a miss passes
+    the version it read before loading to set(), which then drops the value if
+    an invalidation happened in between, so a load racing a write never puts
+    the old row back.
+
+    Attributes:
+        hits (int): Lookups answered from the cache
+        misses (int): Lookups that were absent or expired
+        version (int): Bumped by every invalidation
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.version = 0
+        self._entries: "OrderedDict[Hashable, Tuple[float, V]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[V]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def get_many(self, keys: Iterable[Hashable]) -> Dict[Hashable, V]:
+        """The live entries among keys, in one pass under the lock"""
+        found = {}
+        with self._lock:
+            now = time.monotonic()
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None or entry[0] < now:
+                    if entry is not None:
+                        del self._entries[key]
+                    self.misses += 1
+                    continue
+                self._entries.move_to_end(key)
+                self.hits += 1
+                found[key] = entry[1]
+        return found
+
+    def set(
+        self,
+        key: Hashable,
+        value: V,
+        version: Optional[int] = None,
+        ttl: Optional[float] = None,
+    ) -> None:
+        """
+        Store value, unless the cache was invalidated since `version` was read.
+        `ttl` overrides the cache's for this entry, capped at the cache's.
+        """
+        if self.maxsize <= 0:
+            return
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        with self._lock:
+            if version is not None and version != self.version:
+                return
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self.version += 1
+            self._entries.pop(key, None)
+
+    def invalidate_where(self, predicate: Callable[[Hashable, V], bool]) -> None:
+        """Drop every entry for which predicate(key, value) is true"""
+        with self._lock:
+            self.version += 1
+            for key in [k for k, (_, v) in self._entries.items() if predicate(k, v)]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
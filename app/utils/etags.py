@@ -0,0 +1,80 @@
+import time
+from hashlib import blake2b
+from typing import Any, Iterable, Optional, Tuple
+
+from fastapi import Request, Response
+from pydantic import BaseModel
+
+from app.config import ETAG_TTL
+from app.models.loading import plan_relationships
+from app.repositories.base.table_versions import table_versions
+
+ETAG_HEADER = "ETag"
+
+
+def response_tables(
+    model: Any,
+    schema: type[BaseModel] | None = None,
+    joined: Iterable[Any] = (),
+    **include: bool,
+) -> Tuple[str, ...]:
+    """
+    The tables a response of model is read from: its own, the ones of the
+    relationships it renders (see plan_relationships) and the joined models
+    it is filtered by
+    """
+    relationships = model.__mapper__.relationships
+    tables = {model.__table__.name}
+    tables.update(
+        relationships[key].mapper.local_table.name
+        for key in plan_relationships(model, schema, **include)
+    )
+    tables.update(joined_model.__table__.name for joined_model in joined)
+    return tuple(sorted(tables))
+
+
+def make_etag(request: Request, tables: Tuple[str, ...], scope: Any = None) -> str:
+    """
+    Tag a GET response by what it depends on, without running its query
+
+    The table versions are this process's own: a write committed by another
+    worker or a script does not change them. Tags also change every ETAG_TTL
+    seconds, so such a write is answered in full after that at the latest.
+
+    Args:
+        request (Request): The request, its path and query parameters go in
+        tables (Tuple[str, ...]): The tables it is read from, see response_tables
+        scope (Any, optional): What the caller is allowed to see, e.g. the principal. Defaults to None.
+    Returns:
+        str: A quoted entity tag, the same until one of the tables changes or
+            the ETAG_TTL window ends
+    """
+    key = repr(
+        (
+            table_versions.epoch,
+            int(time.time() // ETAG_TTL),
+            tables,
+            table_versions.get(tables),
+            request.url.path,
+            sorted(request.query_params.multi_items()),
+            scope,
+        )
+    )
+    return f'"{blake2b(key.encode("utf-8"), digest_size=16).hexdigest()}"'
+
+
+def etag_headers(etag: str) -> dict:
+    # Private to the caller's credentials, and always revalidated
+    return {ETAG_HEADER: etag, "Cache-Control": "private, no-cache"}
+
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+    """304 Not Modified when If-None-Match names etag, None to answer in full"""
+    header = request.headers.get("if-none-match")
+    if header is None:
+        return None
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/") == etag:
+            return Response(status_code=304, headers=etag_headers(etag))
+    return None
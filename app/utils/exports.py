@@ -0,0 +1,71 @@
+import csv
+import io
+from datetime import date, datetime
+from typing import Any, Iterable, Iterator, List
+
+import orjson
+
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def ndjson_chunks(rows: Iterable[dict], chunk_size: int = 500) -> Iterator[bytes]:
+    """Encode rows as newline delimited JSON, yielding chunk_size rows at a time"""
+    chunk = bytearray()
+    count = 0
+    for row in rows:
+        chunk += orjson.dumps(row, option=orjson.OPT_APPEND_NEWLINE)
+        count += 1
+        if count == chunk_size:
+            yield bytes(chunk)
+            chunk.clear()
+            count = 0
+    if chunk:
+        yield bytes(chunk)
+
+
+def _csv_value(value: Any) -> Any:
+    if value is None:
+        return ""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def csv_chunks(
+    rows: Iterable[dict], columns: List[str], chunk_size: int = 500
+) -> Iterator[bytes]:
+    """
+    Encode flat rows as CSV with a header line, yielding chunk_size rows at a time
+
+    Args:
+        rows (Iterable[dict]): Rows keyed by column name, missing keys are written empty
+        columns (List[str]): Header and column order
+        chunk_size (int, optional): Rows per yielded chunk. Defaults to 500.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.getvalue().encode("utf-8")
+    buffer.seek(0)
+    buffer.truncate()
+    count = 0
+    for row in rows:
+        writer.writerow([_csv_value(row.get(column)) for column in columns])
+        count += 1
+        if count == chunk_size:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+            count = 0
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def flatten(row: dict, relationships: Iterable[str]) -> dict:
+    """Move nested relationship dicts up to dotted keys, e.g. vehicle.make"""
+    flat = dict(row)
+    for key in relationships:
+        related = flat.pop(key, None) or {}
+        for column, value in related.items():
+            flat[f"{key}.{column}"] = value
+    return flat
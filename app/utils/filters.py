@@ -0,0 +1,331 @@
+import operator
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from fastapi import HTTPException
+from pydantic import ValidationError
+from sqlalchemy import Boolean, and_, bindparam, false, select, true
+from sqlalchemy.orm import MANYTOONE
+
+from app.models.stores import Store
+from app.models.units import Unit
+from app.models.users import User
+from app.models.vehicles import Vehicle
+from app.utils.responses import get_type_adapter
+
+# Columns the list endpoints filter and order by, per model
+FILTERABLE_COLUMNS = {
+    Unit: (
+        "id",
+        "stock_number",
+        "purchase_date",
+        "list_date",
+        "sold_date",
+        "expire_date",
+        "purchase_price",
+        "buy_now_price",
+        "vehicle_age",
+        "vehicle_cost",
+        "sold_status",
+        "purchased",
+        "is_expired",
+        "retailWholesale",
+        "zip_code_loc",
+        "delivery_status",
+        "store_id",
+        "vehicle_id",
+    ),
+    Vehicle: (
+        "id",
+        "year",
+        "make",
+        "model",
+        "trim",
+        "vin",
+        "mileage",
+        "color",
+        "drivetrain",
+        "transmission",
+        "transmission_type",
+        "highway_mileage",
+        "city_mileage",
+        "engine_cylinders",
+        "category",
+        "msrp",
+    ),
+    Store: ("id", "name", "city", "state", "zip_code", "is_primary_hub"),
+}
+# Columns the lists can be sorted by. A page's cursor carries the value of its
+# last row's sort column, so only columns a caller may read belong here
+SORTABLE_COLUMNS = {
+    **FILTERABLE_COLUMNS,
+    User: ("id", "first_name", "last_name", "email", "username", "store_id"),
+}
+# Relationships the list endpoints filter through, `vehicle.make=honda`
+FILTERABLE_RELATIONSHIPS = {
+    Unit: ("vehicle", "store"),
+    Vehicle: ("units",),
+    Store: ("units",),
+}
+
+# Counts the list endpoints group by, `facets=make,year`, and the column each counts
+FACETS = {
+    Unit: {
+        "make": "vehicle.make",
+        "model": "vehicle.model",
+        "year": "vehicle.year",
+        "store_id": "store_id",
+    },
+    Vehicle: {"make": "make", "model": "model", "year": "year"},
+}
+
+COMPARISONS = {
+    "eq": operator.eq,
+    "ne": operator.ne,
+    "gt": operator.gt,
+    "gte": operator.ge,
+    "lt": operator.lt,
+    "lte": operator.le,
+}
+# How many values an operator takes, None for one or more
+ARITY = {**{op: 1 for op in COMPARISONS}, "in": None, "between": 2}
+
+
+class Filter(NamedTuple):
+    """
+    A compiled WHERE clause and the values of its bind parameters
+
+    Attributes:
+        joined (Tuple[Any, ...]): Related models the clause reads, for response_tables
+        key (Tuple): Its shape and values, equal for filters selecting the same rows
+    """
+
+    where: Any
+    params: Dict[str, Any]
+    joined: Tuple[Any, ...] = ()
+    key: Tuple = ()
+
+
+def semi_join(model: Any, key: str, *criteria: Any) -> Any:
+    """
+    Rows of model with at least one row over relationship key matching criteria
+
+    Many-to-one compiles to `fk IN (SELECT id FROM target WHERE ...)`: the
+    target's indexes find the matches, the foreign key index the rows. A
+    collection compiles to a correlated EXISTS probing the target's foreign key
+    index per row, which stops at the page's LIMIT. Unlike a JOIN neither
+    repeats a row, so LIMIT and OFFSET count rows of model.
+    """
+    relationship = model.__mapper__.relationships[key]
+    if relationship.direction is MANYTOONE:
+        ((local, remote),) = relationship.local_remote_pairs
+        return local.in_(select(remote).where(*criteria))
+    return getattr(model, key).any(and_(*criteria) if criteria else None)
+
+
+def _target(model: Any, key: str) -> Tuple[Any, str]:
+    """The model a term's column lives on and the column, `vehicle.make` names Vehicle.make"""
+    path, _, name = key.rpartition(".")
+    if not path:
+        return model, name
+    if path not in FILTERABLE_RELATIONSHIPS.get(model, ()):
+        raise HTTPException(status_code=400, detail=f"Cannot filter by {key}")
+    return model.__mapper__.relationships[path].mapper.class_, name
+
+
+def _column(model: Any, key: str) -> Any:
+    target, name = _target(model, key)
+    if name not in FILTERABLE_COLUMNS.get(target, ()):
+        raise HTTPException(status_code=400, detail=f"Cannot filter by {key}")
+    return target.__table__.columns[name]
+
+
+def _values(column: Any, key: str, op: str, raw: List[str]) -> List[Any]:
+    values = raw
+    if op in ("in", "between"):
+        # Only the list operators split on commas, `make__ne=Rolls,Royce` is one value
+        values = [value for item in raw for value in item.split(",")]
+    arity = ARITY[op]
+    if (arity is not None and len(values) != arity) or not values:
+        raise HTTPException(
+            status_code=400,
+            detail=f"{key}__{op} takes {arity or 'one or more'} value(s)",
+        )
+    try:
+        return get_type_adapter(List[column.type.python_type]).validate_python(values)
+    except ValidationError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid {key}__{op}: {e.errors(include_url=False)[0]['msg']}",
+        )
+
+
+def _clause(column: Any, op: str, literal: Any, name: str) -> Any:
+    if literal is not None:
+        # Booleans are SQL literals, the planner only matches partial
+        # indexes against literals (see sql_repository._equals)
+        return COMPARISONS[op](column, true() if literal else false())
+    if op == "in":
+        return column.in_(bindparam(name, expanding=True))
+    if op == "between":
+        return column.between(bindparam(f"{name}_0"), bindparam(f"{name}_1"))
+    return COMPARISONS[op](column, bindparam(name))
+
+
+@lru_cache(maxsize=1024)
+def _compile(model: Any, shape: Tuple[Tuple[str, str, Any], ...]) -> Any:
+    """
+    The WHERE clause of a filter shape, its bind parameters named by position
+
+    Built once per shape: every request filtering the same columns the same way
+    reuses the clause, so SQLAlchemy also finds its compiled SQL in its cache.
+    Terms through the same relationship share one semi-join, a related row
+    has to match all of them.
+    """
+    clauses = []
+    related: Dict[str, List[Any]] = {}
+    for i, (key, op, literal) in enumerate(shape):
+        target, name = _target(model, key)
+        clause = _clause(getattr(target, name), op, literal, f"f{i}")
+        path = key.rpartition(".")[0]
+        if path:
+            related.setdefault(path, []).append(clause)
+        else:
+            clauses.append(clause)
+    for path, criteria in related.items():
+        clauses.append(semi_join(model, path, *criteria))
+    return and_(*clauses)
+
+
+def parse_filters(model: Any, query: Iterable[Tuple[str, str]]) -> Optional[Filter]:
+    """
+    Compile the filter terms of a query string, `column__op=value`, into a Filter
+
+    A bare `column=value` is `column__eq` for FILTERABLE_COLUMNS only, any
+    other bare parameter, the endpoint's own or a column that cannot be
+    filtered, is left alone. `in` takes comma separated or repeated values,
+    `between` two comma separated bounds, both inclusive, other operators take
+    the value whole. A column of a related model is named by its relationship,
+    `vehicle.year__gte=2018`, see semi_join. Terms with an operator or a
+    relationship on columns missing from FILTERABLE_COLUMNS, unknown operators
+    and values of the wrong type are refused.
+
+    Args:
+        model (Any): The model being listed, e.g. Unit
+        query (Iterable[Tuple[str, str]]): The query parameters, e.g. request.query_params.multi_items()
+    Returns:
+        Optional[Filter]: The filter, None when the query has no terms
+    Raises:
+        HTTPException: 400 for a term that cannot be applied
+    """
+    terms: Dict[Tuple[str, str], List[str]] = {}
+    for name, value in query:
+        key, _, op = name.partition("__")
+        # A bare name clashing with an endpoint's own parameter is not a term
+        if not op and "." not in key and key not in FILTERABLE_COLUMNS.get(model, ()):
+            continue
+        op = op or "eq"
+        if op not in ARITY:
+            raise HTTPException(status_code=400, detail=f"Unknown filter operator {op}")
+        _column(model, key)
+        terms.setdefault((key, op), []).append(value)
+    if not terms:
+        return None
+
+    shape = []
+    params = {}
+    for key, op in sorted(terms):
+        column = _column(model, key)
+        values = _values(column, key, op, terms[key, op])
+        name = f"f{len(shape)}"
+        if isinstance(column.type, Boolean) and op in ("eq", "ne"):
+            shape.append((key, op, values[0]))
+            continue
+        shape.append((key, op, None))
+        if op == "in":
+            params[name] = values
+        elif op == "between":
+            params[f"{name}_0"], params[f"{name}_1"] = values
+        else:
+            params[name] = values[0]
+    shape = tuple(shape)
+    values = tuple(
+        (name, tuple(value) if isinstance(value, list) else value)
+        for name, value in sorted(params.items())
+    )
+    return Filter(
+        _compile(model, shape),
+        params,
+        related_models(model, [key for key, _, _ in shape]),
+        (shape, values),
+    )
+
+
+def check_joins(
+    model: Any,
+    to_join: bool,
+    models_to_join: Iterable[Any],
+    joined_model_filters: Optional[dict],
+) -> None:
+    """
+    Check the legacy to_join parameters before the repositories apply them
+
+    Raises:
+        HTTPException: 400 for a model that model has no relationship to, or a
+            joined filter key that none of the joined models can be filtered by
+    """
+    if not to_join or not models_to_join:
+        return
+    targets = {
+        relationship.mapper.class_ for relationship in model.__mapper__.relationships
+    }
+    for joined in models_to_join:
+        if joined not in targets:
+            raise HTTPException(
+                status_code=400,
+                detail=f"{model.__name__} has no relationship to {joined.__name__}",
+            )
+    for key in joined_model_filters or ():
+        if not any(
+            key in FILTERABLE_COLUMNS.get(joined, ()) for joined in models_to_join
+        ):
+            raise HTTPException(status_code=400, detail=f"Cannot filter by {key}")
+
+
+def parse_facets(model: Any, facets: Optional[str]) -> Tuple[Tuple[str, str], ...]:
+    """
+    The facets named by a comma separated `facets` parameter and the column
+    path each counts, see FACETS
+
+    Raises:
+        HTTPException: 400 for a facet the model does not have
+    """
+    if not facets:
+        return ()
+    paths = {}
+    for name in facets.split(","):
+        name = name.strip()
+        path = FACETS.get(model, {}).get(name)
+        if path is None:
+            raise HTTPException(status_code=400, detail=f"Cannot count by {name}")
+        paths[name] = path
+    return tuple(paths.items())
+
+
+def related_models(model: Any, paths: Iterable[str]) -> Tuple[Any, ...]:
+    """The models column paths such as `vehicle.make` read through a relationship"""
+    relationships = model.__mapper__.relationships
+    return tuple(
+        {
+            relationships[path.rpartition(".")[0]].mapper.class_: None
+            for path in paths
+            if "." in path
+        }
+    )
+
+
+def parse_order_by(model: Any, order_by: str) -> str:
+    """`column` or `-column` for descending, checked against SORTABLE_COLUMNS"""
+    if order_by.removeprefix("-") not in SORTABLE_COLUMNS.get(model, ()):
+        raise HTTPException(status_code=400, detail=f"Cannot sort by {order_by}")
+    return order_by
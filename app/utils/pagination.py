@@ -0,0 +1,103 @@
+import base64
+import json
+from datetime import date, datetime
+from typing import Any, List, NamedTuple, Optional, Tuple
+
+from fastapi import HTTPException
+
+from app.utils.filters import parse_order_by
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+TOTAL_COUNT_HEADER = "X-Total-Count"
+FACETS_HEADER = "X-Facets"
+
+
+class Cursor(NamedTuple):
+    sort_key: str
+    value: Any
+    id: int
+
+
+def encode_cursor(sort_key: str, value: Any, entity_id: int) -> str:
+    if isinstance(value, (datetime, date)):
+        value = value.isoformat()
+    payload = json.dumps([sort_key, value, entity_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Cursor:
+    """
+    Decode an opaque cursor produced by encode_cursor
+
+    Raises:
+        HTTPException: If the cursor is malformed
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_key, value, entity_id = json.loads(base64.urlsafe_b64decode(padded))
+        if not isinstance(sort_key, str) or not isinstance(entity_id, int):
+            raise ValueError(cursor)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return Cursor(sort_key, value, entity_id)
+
+
+def validate_sort_key(model: Any, sort_key: str) -> str:
+    """
+    A column of SORTABLE_COLUMNS, or -name to sort descending
+
+    Raises:
+        HTTPException: 400 for any other column, its values would end up in the cursor
+    """
+    return parse_order_by(model, sort_key)
+
+
+def resolve_page(
+    model: Any, cursor: Optional[str], sort_key: str
+) -> Tuple[Optional[Cursor], str]:
+    """Decode the cursor query parameter, a cursor always carries its own sort key"""
+    page_cursor = decode_cursor(cursor) if cursor else None
+    if page_cursor is not None:
+        sort_key = page_cursor.sort_key
+    return page_cursor, validate_sort_key(model, sort_key)
+
+
+def paginate(
+    rows: List[dict], limit: int, sort_key: str
+) -> Tuple[List[dict], Optional[str]]:
+    """
+    Trim a page fetched with limit + 1 rows and build the cursor for the next page
+
+    Args:
+        rows (List[dict]): Serialized rows, at most limit + 1 of them
+        limit (int): Page size requested by the client
+        sort_key (str): Column the page is ordered by, -name when descending
+    Returns:
+        Tuple[List[dict], Optional[str]]: The page and the next cursor, None on the last page
+    """
+    if len(rows) <= limit or limit <= 0:
+        return rows[: max(limit, 0)], None
+    page = rows[:limit]
+    last = page[-1]
+    return page, encode_cursor(sort_key, last[sort_key.removeprefix("-")], last["id"])
+
+
+def count_headers(counts: Optional[dict], with_total: bool) -> dict:
+    """
+    Headers carrying the counts of a list, see SqlRepository._count
+
+    X-Total-Count is the number of rows over all pages, X-Facets a JSON object
+    of the rows per value of each facet requested.
+    """
+    headers = {}
+    if counts is None:
+        return headers
+    if with_total:
+        headers[TOTAL_COUNT_HEADER] = str(counts["total"])
+    if counts["facets"]:
+        facets = {
+            facet: {str(value): count for value, count in values.items()}
+            for facet, values in counts["facets"].items()
+        }
+        headers[FACETS_HEADER] = json.dumps(facets, separators=(",", ":"))
+    return headers
@@ -0,0 +1,60 @@
+from functools import lru_cache
+from typing import Any, Mapping, Optional
+
+import orjson
+from fastapi import Response
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, TypeAdapter
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(by_alias=True)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class ORJSONResponse(JSONResponse):
+    """
+    JSONResponse rendered with orjson
+
+    Datetimes, dates and UUIDs are encoded natively and pydantic models are dumped
+    by alias, so content does not need a jsonable_encoder pass first. Used as the
+    application's default_response_class, or per route with response_class=.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+@lru_cache(maxsize=None)
+def get_type_adapter(schema: Any) -> TypeAdapter:
+    return TypeAdapter(schema)
+
+
+def schema_response(
+    schema: Any,
+    content: Any,
+    status_code: int = 200,
+    headers: Optional[Mapping[str, str]] = None,
+) -> Response:
+    """
+    Validate content against a response schema and encode it straight to JSON bytes
+
+    Does what FastAPI does for response_model (aliases, from_attributes, the same
+    JSON) in one pass through a TypeAdapter built once per schema.
+
+    Args:
+        schema (Any): The response type, e.g. List[UnitOutput]
+        content (Any): Serialized rows or ORM objects
+        status_code (int, optional): Defaults to 200.
+        headers (Optional[Mapping[str, str]], optional): Extra response headers. Defaults to None.
+    Returns:
+        Response: application/json response
+    """
+    adapter = get_type_adapter(schema)
+    body = adapter.dump_json(
+        adapter.validate_python(content, from_attributes=True), by_alias=True
+    )
+    return Response(
+        body, status_code=status_code, headers=headers, media_type="application/json"
+    )
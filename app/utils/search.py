@@ -0,0 +1,27 @@
+import re
+
+from fastapi import HTTPException
+
+# What the unicode61 tokenizer keeps as a token: runs of letters and digits
+TOKEN = re.compile(r"[^\W_]+")
+MAX_TERMS = 16
+
+
+def match_query(q: str) -> str:
+    """
+    The FTS5 MATCH expression of what a buyer typed, e.g. `2019 civic tour`
+
+    Every word has to match a word of the unit, in any column, and the last
+    one, still being typed, only its start: `"2019" "civic" "tour"*`. A prefix
+    longer than the index's prefix lengths reads every term it starts, whole
+    words keep multi-word searches to one doclist each. Quoting each word keeps
+    FTS5 operators and punctuation in the input from being parsed as query
+    syntax.
+
+    Raises:
+        HTTPException: 400 when q has no words
+    """
+    terms = TOKEN.findall(q)[:MAX_TERMS]
+    if not terms:
+        raise HTTPException(status_code=400, detail="Search needs at least one word")
+    return " ".join(f'"{term}"' for term in terms) + "*"
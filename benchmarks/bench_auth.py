@@ -0,0 +1,68 @@
+"""
+Per-request cost of authentication on a route that needs no database
+
+    python -m benchmarks.bench_auth
+
+    name only   token naming the user, decoded and verified every request,
+                the user from the principal cache
+    claims      token carrying the principal, decoded and verified every request
+    cached      token carrying the principal, verified once (the default)
+"""
+import asyncio
+import os
+import tempfile
+import time
+from datetime import timedelta
+
+# Point the app's engines at a scratch database before anything imports them
+os.environ["DB_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+os.environ["UNIT_EXPIRY_SCHEDULER"] = "false"
+os.environ.setdefault("SECRET_KEY", "bench")
+
+import httpx  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+
+from app.database import SessionLocal, engine  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models.users import User  # noqa: E402
+from app.routers.security import dependencies as security  # noqa: E402
+from app.services.users import get_principal  # noqa: E402
+from app.utils.cache import TTLCache  # noqa: E402
+
+REQUESTS = 5_000
+URL = "/api/v1/units/expiry"
+
+
+async def run(token: str) -> float:
+    headers = {"Authorization": f"Bearer {token}"}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+        for _ in range(100):
+            assert (await http.get(URL, headers=headers)).status_code == 200
+        start = time.perf_counter()
+        for _ in range(REQUESTS):
+            await http.get(URL, headers=headers)
+        return (time.perf_counter() - start) / REQUESTS
+
+
+def main() -> None:
+    with engine.begin() as conn:
+        conn.execute(insert(User), {"username": "bench", "is_active": True})
+    with SessionLocal() as db:
+        principal = get_principal(db, "bench")
+    expires = timedelta(minutes=30)
+    name_only = security.create_access_token({"sub": "bench"}, expires)
+    claims = security.create_access_token({"sub": "bench"}, expires, principal)
+    token_cache = security.token_cache
+    print(f"{REQUESTS:,} sequential requests to {URL}")
+    for label, token, cache in (
+        ("name only", name_only, TTLCache(0)),
+        ("claims", claims, TTLCache(0)),
+        ("cached", claims, token_cache),
+    ):
+        security.token_cache = cache
+        print(f"{label:10} {asyncio.run(run(token)) * 1e6:8.1f}us/request")
+
+
+if __name__ == "__main__":
+    main()
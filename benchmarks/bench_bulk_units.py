@@ -0,0 +1,57 @@
+"""
+Compare creating units one request-shaped call at a time with the bulk service
+
+    python -m benchmarks.bench_bulk_units
+"""
+import os
+import tempfile
+import time
+
+# Point the app's engine at a scratch database before anything imports it
+os.environ["DB_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+
+from app.database import Base, SessionLocal, engine  # noqa: E402
+from app.models import stores, units, users, vehicles  # noqa: E402,F401
+from app.schemas.units import UnitAdd  # noqa: E402
+from app.schemas.vehicles import VehicleAdd  # noqa: E402
+from app.services import units as unit_service  # noqa: E402
+from test.utils.unit_randomizer import create_random_unit_data  # noqa: E402
+from test.utils.vehicle_randomizer import create_random_vehicle_data  # noqa: E402
+
+SINGLE_ROWS = 1_000
+BULK_ROWS = 50_000
+
+
+def rows(count: int) -> list:
+    return [
+        {"unit": create_random_unit_data(), "vehicle": create_random_vehicle_data()}
+        for _ in range(count)
+    ]
+
+
+def main() -> None:
+    Base.metadata.create_all(bind=engine)
+
+    single = rows(SINGLE_ROWS)
+    start = time.perf_counter()
+    for row in single:
+        unit_service.create_unit(
+            SessionLocal(), UnitAdd(**row["unit"]), VehicleAdd(**row["vehicle"])
+        )
+    single_rate = SINGLE_ROWS / (time.perf_counter() - start)
+
+    bulk = rows(BULK_ROWS)
+    start = time.perf_counter()
+    with SessionLocal() as db:
+        result = unit_service.create_units_bulk(db, bulk)
+    bulk_rate = BULK_ROWS / (time.perf_counter() - start)
+    assert result["created"] == BULK_ROWS
+
+    print(f"create_unit       {single_rate:10,.0f} units/s")
+    print(
+        f"create_units_bulk {bulk_rate:10,.0f} units/s  ({bulk_rate / single_rate:.0f}x)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Onboarding users one POST /users/ at a time against one POST /users/bulk
+
+    python -m benchmarks.bench_bulk_users
+
+bcrypt dominates both, run with BCRYPT_ROUNDS set to the cost to measure. The
+bulk endpoint hashes on every PASSWORD_HASH_WORKERS process at once.
+"""
+import asyncio
+import os
+import tempfile
+import time
+
+# Point the app's engines at a scratch database before anything imports them
+os.environ["DB_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+os.environ["UNIT_EXPIRY_SCHEDULER"] = "false"
+os.environ.setdefault("SECRET_KEY", "bench")
+
+import httpx  # noqa: E402
+from faker import Faker  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+
+from app.config import BCRYPT_ROUNDS, PASSWORD_HASH_WORKERS  # noqa: E402
+from app.database import engine  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models.users import User  # noqa: E402
+from app.services.passwords import hash_password, password_hasher  # noqa: E402
+
+USERS = 200
+faker = Faker("en_US")
+
+
+def new_users(prefix: str) -> list:
+    return [
+        {
+            "first_name": faker.first_name(),
+            "last_name": faker.last_name(),
+            "email": f"{prefix}{i}@example.com",
+            "username": f"{prefix}{i}",
+            "password": "password",
+            "is_active": True,
+        }
+        for i in range(USERS)
+    ]
+
+
+async def run() -> None:
+    with engine.begin() as conn:
+        conn.execute(
+            insert(User),
+            {
+                "username": "admin",
+                "hashed_password": hash_password("password"),
+                "is_admin": True,
+                "is_active": True,
+            },
+        )
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench", timeout=None
+    ) as http:
+        r = await http.post(
+            "/api/v1/token", data={"username": "admin", "password": "password"}
+        )
+        headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+        start = time.perf_counter()
+        for user in new_users("single"):
+            r = await http.post("/api/v1/users/", headers=headers, json=user)
+            assert r.status_code == 201, r.text
+        single = time.perf_counter() - start
+
+        start = time.perf_counter()
+        r = await http.post("/api/v1/users/bulk", headers=headers, json=new_users("bulk"))
+        bulk = time.perf_counter() - start
+        assert r.json()["created"] == USERS, r.text
+    password_hasher.shutdown()
+
+    print(f"{USERS} users at cost {BCRYPT_ROUNDS}, {PASSWORD_HASH_WORKERS} hash workers")
+    for label, elapsed in (("one by one", single), ("bulk", bulk)):
+        print(
+            f"{label:10} {elapsed:7.2f}s  {USERS / elapsed:7.1f} users/s  "
+            f"1,000 users in {1000 / USERS * elapsed:6.1f}s"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
@@ -0,0 +1,81 @@
+"""
+500 concurrent clients reading vehicles, with ASYNC_DATABASE on and off
+
+    python -m benchmarks.bench_concurrency
+
+Off, every request holds one of the 40 threadpool threads for its whole
+database round trip. On, it parks a coroutine on aiosqlite instead.
+"""
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+# Point the app's engines at a scratch database before anything imports them
+os.environ["DB_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+os.environ["UNIT_EXPIRY_SCHEDULER"] = "false"
+
+import httpx  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+
+from app import config  # noqa: E402
+from app.database import async_engine, engine  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models.vehicles import Vehicle  # noqa: E402
+from test.utils.vehicle_randomizer import create_random_vehicle_data  # noqa: E402
+
+CLIENTS = 500
+REQUESTS_PER_CLIENT = 20
+VEHICLES = 10_000
+
+
+def seed() -> None:
+    with engine.begin() as conn:
+        conn.execute(
+            insert(Vehicle), [create_random_vehicle_data() for _ in range(VEHICLES)]
+        )
+
+
+async def client(http: httpx.AsyncClient, latencies: list) -> None:
+    for i in range(REQUESTS_PER_CLIENT):
+        if i % 4:
+            url = f"/api/v1/vehicles/{random.randint(1, VEHICLES)}"
+        else:
+            url = f"/api/v1/vehicles/?limit=20&skip={random.randint(0, VEHICLES - 20)}"
+        start = time.perf_counter()
+        r = await http.get(url)
+        latencies.append(time.perf_counter() - start)
+        assert r.status_code == 200, r.text
+
+
+async def run() -> tuple:
+    latencies = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+        await client(http, [])  # warm up the pools
+        start = time.perf_counter()
+        await asyncio.gather(*(client(http, latencies) for _ in range(CLIENTS)))
+        elapsed = time.perf_counter() - start
+    await async_engine.dispose()
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[int(len(latencies) * 0.99)]
+    return len(latencies) / elapsed, p50, p99
+
+
+def main() -> None:
+    seed()
+    print(f"{CLIENTS} clients x {REQUESTS_PER_CLIENT} requests")
+    for async_database in (False, True):
+        config.ASYNC_DATABASE = async_database
+        rate, p50, p99 = asyncio.run(run())
+        label = "async" if async_database else "sync"
+        print(
+            f"{label:6} {rate:8,.0f} req/s  p50 {p50 * 1000:7.1f}ms  "
+            f"p99 {p99 * 1000:7.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+A page of units rendered with their vehicle and store, with the related rows
+joined into the page query against read from the entity cache
+
+    python -m benchmarks.bench_entity_cache
+
+    joined   no entity cache, vehicles and stores joinedload'ed (as before it)
+    cold     the cache emptied before every request, one SELECT ... IN per model
+    warm     every vehicle and store of the page cached
+
+Rounds alternate between the modes, the best round of each is reported.
+"""
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+# Point the app's engines at a scratch database before anything imports them
+os.environ["DB_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+os.environ["UNIT_EXPIRY_SCHEDULER"] = "false"
+os.environ.setdefault("SECRET_KEY", "bench")
+
+import httpx  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+
+from app.database import SessionLocal, engine  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models.stores import Store  # noqa: E402
+from app.models.units import Unit  # noqa: E402
+from app.models.users import User  # noqa: E402
+from app.models.vehicles import Vehicle  # noqa: E402
+from app.repositories.base import sql_repository  # noqa: E402
+from app.repositories.base.entity_cache import EntityCache, entity_cache  # noqa: E402
+from app.routers.security import dependencies as security  # noqa: E402
+from app.services.users import get_principal  # noqa: E402
+
+UNITS = 2_000
+STORES = 20
+PAGE = 100
+REQUESTS = 200
+ROUNDS = 5
+URL = f"/api/v1/units/?limit={PAGE}&include_vehicle=true&include_store=true"
+
+
+def seed() -> None:
+    with engine.begin() as conn:
+        conn.execute(insert(User), {"username": "bench", "is_active": True})
+        conn.execute(insert(Store), [{"name": f"Store {i}"} for i in range(STORES)])
+        conn.execute(
+            insert(Vehicle),
+            [{"year": 2015 + i % 9, "make": "Honda"} for i in range(UNITS)],
+        )
+        conn.execute(
+            insert(Unit),
+            [
+                {"vehicle_id": i + 1, "store_id": random.randint(1, STORES)}
+                for i in range(UNITS)
+            ],
+        )
+
+
+async def run(http: httpx.AsyncClient, headers: dict, clear: bool) -> float:
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        if clear:
+            entity_cache.clear()
+        assert (await http.get(URL, headers=headers)).status_code == 200
+    return (time.perf_counter() - start) / REQUESTS
+
+
+async def main() -> None:
+    seed()
+    with SessionLocal() as db:
+        principal = get_principal(db, "bench")
+    token = security.create_access_token({"sub": "bench"}, principal=principal)
+    headers = {"Authorization": f"Bearer {token}"}
+    no_cache = EntityCache({}, 0)
+    best = {"joined": [], "cold": [], "warm": []}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+        await run(http, headers, clear=False)
+        for _ in range(ROUNDS):
+            sql_repository.entity_cache = no_cache
+            best["joined"].append(await run(http, headers, clear=False))
+            sql_repository.entity_cache = entity_cache
+            best["cold"].append(await run(http, headers, clear=True))
+            best["warm"].append(await run(http, headers, clear=False))
+
+    print(f"GET {URL}, {UNITS:,} units over {STORES} stores, best of {ROUNDS}x{REQUESTS}")
+    for label, times in best.items():
+        print(f"{label:7} {min(times) * 1000:7.2f}ms/request")
+    stats = entity_cache.stats()
+    for table in ("vehicles", "stores"):
+        print(f"{table:9} hit ratio {stats[table]['hit_ratio']:.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
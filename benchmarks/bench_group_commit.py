@@ -0,0 +1,89 @@
+"""
+200 concurrent writers creating units, each committing its own transaction on
+the writer engine and then through the group commit writer
+
+    python -m benchmarks.bench_group_commit
+"""
+import os
+import tempfile
+import threading
+import time
+
+# Point the app's engines at a scratch database before anything imports them
+os.environ["DB_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+
+from sqlalchemy import event  # noqa: E402
+
+from app.database import Base, SessionLocal, engine  # noqa: E402
+from app.models import stores, units, users, vehicles  # noqa: E402,F401
+from app.schemas.units import UnitAdd  # noqa: E402
+from app.schemas.vehicles import VehicleAdd  # noqa: E402
+from app.services import units as unit_service  # noqa: E402
+from app.services.writer import GroupCommitWriter  # noqa: E402
+from test.utils.unit_randomizer import create_random_unit_data  # noqa: E402
+from test.utils.vehicle_randomizer import create_random_vehicle_data  # noqa: E402
+
+WRITERS = 200
+WRITES_PER_WRITER = 10
+
+
+def payload() -> tuple:
+    return (
+        UnitAdd(**create_random_unit_data()),
+        VehicleAdd(**create_random_vehicle_data()),
+    )
+
+
+def direct(write_payloads: list) -> None:
+    for unit, vehicle in write_payloads:
+        with SessionLocal() as db:
+            unit_service.create_unit(db, unit, vehicle)
+
+
+def queued(writer: GroupCommitWriter):
+    def write(write_payloads: list) -> None:
+        for unit, vehicle in write_payloads:
+            writer.submit(unit_service.create_unit, unit, vehicle).result()
+
+    return write
+
+
+def run(write) -> tuple:
+    # Build the payloads first so only the writes are timed
+    work = [[payload() for _ in range(WRITES_PER_WRITER)] for _ in range(WRITERS)]
+    commits = []
+
+    def count(conn):
+        commits.append(conn)
+
+    event.listen(engine, "commit", count)
+    threads = [threading.Thread(target=write, args=(w,)) for w in work]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    event.remove(engine, "commit", count)
+    return WRITERS * WRITES_PER_WRITER / elapsed, len(commits)
+
+
+def main() -> None:
+    Base.metadata.create_all(bind=engine)
+    print(f"{WRITERS} writers x {WRITES_PER_WRITER} units")
+    rate, commits = run(direct)
+    print(f"direct  {rate:8,.0f} units/s  {commits:6,} commits")
+    writer = GroupCommitWriter()
+    writer.start()
+    try:
+        rate, commits = run(queued(writer))
+    finally:
+        writer.stop()
+    print(
+        f"grouped {rate:8,.0f} units/s  {commits:6,} commits  "
+        f"largest batch {writer.largest_batch}"
+    )
+
+
+if __name__ == "__main__":
+    main()
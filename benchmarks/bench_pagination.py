@@ -0,0 +1,83 @@
+"""
+Compare offset and keyset pagination of GET /units/ at page 1 and page 10,000
+
+    python -m benchmarks.bench_pagination
+"""
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+
+from app.database import Base
+from app.models import stores, units, users, vehicles  # noqa: F401 register tables
+from app.repositories.units.unit_repository import UnitRepository
+from app.utils.pagination import decode_cursor, encode_cursor
+
+PAGE_SIZE = 100
+PAGES = 10_000
+ROUNDS = 20
+
+
+def seed(engine) -> None:
+    start = datetime(2024, 1, 1)
+    rows = (
+        {"list_date": start + timedelta(seconds=i), "store_id": i % 25 + 1}
+        for i in range(PAGE_SIZE * PAGES + PAGE_SIZE)
+    )
+    with engine.begin() as conn:
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == 50_000:
+                conn.execute(insert(units.Unit), batch)
+                batch = []
+        if batch:
+            conn.execute(insert(units.Unit), batch)
+
+
+def timed(fn) -> float:
+    best = float("inf")
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main() -> None:
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    seed(engine)
+
+    with Session(engine) as db:
+        repo = UnitRepository(db)
+        last_page = PAGE_SIZE * (PAGES - 1)
+        for sort_key in ("id", "list_date"):
+            # The row just before page 10,000 is where a client walking the cursor would be
+            anchor = repo.get_all_units(last_page - 1, 1, sort_key=sort_key)[0]
+            cursor = decode_cursor(
+                encode_cursor(sort_key, getattr(anchor, sort_key), anchor.id)
+            )
+            results = {
+                "page 1": timed(
+                    lambda: repo.get_all_units(0, PAGE_SIZE, sort_key=sort_key)
+                ),
+                "offset page 10,000": timed(
+                    lambda: repo.get_all_units(last_page, PAGE_SIZE, sort_key=sort_key)
+                ),
+                "cursor page 10,000": timed(
+                    lambda: repo.get_all_units(
+                        0, PAGE_SIZE, cursor=cursor, sort_key=sort_key
+                    )
+                ),
+            }
+            for name, ms in results.items():
+                print(f"sort_key={sort_key:<10} {name:<20} {ms:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
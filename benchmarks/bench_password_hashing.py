@@ -0,0 +1,123 @@
+"""
+Concurrent logins alongside requests that need no password, with bcrypt on the
+event loop (as the login route used to run it), on a thread pool and on a
+process pool
+
+    python -m benchmarks.bench_password_hashing
+
+Reports logins per second and the latency of the other requests, which is how
+long the event loop was held up.
+"""
+import asyncio
+import os
+import tempfile
+import time
+
+# Point the app's engines at a scratch database before anything imports them
+os.environ["DB_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+os.environ["UNIT_EXPIRY_SCHEDULER"] = "false"
+os.environ.setdefault("SECRET_KEY", "bench")
+
+import httpx  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+
+from app.config import BCRYPT_ROUNDS  # noqa: E402
+from app.database import engine  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models.users import User  # noqa: E402
+from app.routers import users as users_router  # noqa: E402
+from app.services.passwords import PasswordHasher, hash_password  # noqa: E402
+
+USERS = 20
+LOGINS_PER_USER = 5
+PING_INTERVAL = 0.01
+
+
+class InlineHasher(PasswordHasher):
+    async def _run(self, fn, *args):
+        return fn(*args)
+
+
+def seed() -> None:
+    hashed = hash_password("password", BCRYPT_ROUNDS)
+    with engine.begin() as conn:
+        conn.execute(
+            insert(User),
+            [
+                {"username": f"bench{i}", "email": f"bench{i}@example.com",
+                 "hashed_password": hashed, "is_active": True}
+                for i in range(USERS)
+            ],
+        )
+
+
+async def login(http: httpx.AsyncClient, username: str) -> None:
+    for _ in range(LOGINS_PER_USER):
+        r = await http.post(
+            "/api/v1/token", data={"username": username, "password": "password"}
+        )
+        assert r.status_code == 200, r.text
+
+
+async def ping(http: httpx.AsyncClient, due: float, latencies: list) -> None:
+    await http.get("/api/v1/home/")
+    latencies.append(time.perf_counter() - due)
+
+
+async def ping_every(http: httpx.AsyncClient, done: asyncio.Event, latencies: list) -> None:
+    """
+    Start a /home/ request every PING_INTERVAL, timed from when it was due: the
+    time it spends waiting for the event loop counts
+    """
+    pings = []
+    due = time.perf_counter()
+    while not done.is_set():
+        due += PING_INTERVAL
+        await asyncio.sleep(max(due - time.perf_counter(), 0))
+        pings.append(asyncio.create_task(ping(http, due, latencies)))
+    await asyncio.gather(*pings)
+
+
+async def run() -> tuple:
+    latencies = []
+    done = asyncio.Event()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+        await login(http, "bench0")  # start the workers
+        pinger = asyncio.create_task(ping_every(http, done, latencies))
+        start = time.perf_counter()
+        await asyncio.gather(*(login(http, f"bench{i}") for i in range(USERS)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        await pinger
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[int(len(latencies) * 0.99)]
+    return USERS * LOGINS_PER_USER / elapsed, p50, p99
+
+
+def main() -> None:
+    seed()
+    print(
+        f"{USERS} users x {LOGINS_PER_USER} logins at cost {BCRYPT_ROUNDS}, "
+        f"/api/v1/home/ requested every {PING_INTERVAL * 1000:.0f}ms meanwhile"
+    )
+    hashers = (
+        ("event loop", InlineHasher()),
+        ("threads", PasswordHasher(processes=False)),
+        ("processes", PasswordHasher(processes=True)),
+    )
+    for label, hasher in hashers:
+        users_router.password_hasher = hasher
+        try:
+            rate, p50, p99 = asyncio.run(run())
+        finally:
+            hasher.shutdown()
+        print(
+            f"{label:11} {rate:6,.1f} logins/s  other requests p50 "
+            f"{p50 * 1000:7.1f}ms  p99 {p99 * 1000:7.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""
+Per-request overhead of routes that never touch the database
+
+    python -m benchmarks.bench_request_overhead
+"""
+import asyncio
+import os
+import tempfile
+import time
+
+# Point the app's engines at a scratch database before anything imports them
+os.environ["DB_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+os.environ["UNIT_EXPIRY_SCHEDULER"] = "false"
+
+import httpx  # noqa: E402
+
+from app.main import app  # noqa: E402
+
+REQUESTS = 5_000
+ROUTES = ("/api/v1/home/", "/")
+
+
+async def run(url: str) -> float:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+        for _ in range(100):
+            await http.get(url)
+        start = time.perf_counter()
+        for _ in range(REQUESTS):
+            await http.get(url)
+        return (time.perf_counter() - start) / REQUESTS
+
+
+def main() -> None:
+    print(f"{REQUESTS:,} sequential requests per route")
+    for url in ROUTES:
+        per_request = asyncio.run(run(url))
+        print(f"{url:16} {per_request * 1e6:8.1f}us/request")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+GET /units/?limit=1000&include_vehicle=true rendered three ways:
+
+    json      response_model + Starlette's JSONResponse (stdlib json)
+    orjson    response_model + ORJSONResponse
+    schema    schema_response, one TypeAdapter validate + dump_json pass
+
+    python -m benchmarks.bench_responses
+"""
+import time
+from datetime import datetime
+from typing import List
+
+from fastapi import Depends, FastAPI
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from app.database import Base
+from app.models.stores import Store
+from app.models.units import Unit
+from app.models.users import User  # noqa: F401 resolve Store.users
+from app.models.vehicles import Vehicle
+from app.schemas.units import UnitOutput
+from app.services import units as unit_service
+from app.utils.responses import ORJSONResponse, schema_response
+
+ROWS = 1000
+ROUNDS = 30
+
+engine = create_engine(
+    "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+)
+
+
+def get_bench_db():
+    with Session(engine) as db:
+        yield db
+
+
+def get_page(db: Session) -> list:
+    return unit_service.get_units(db, limit=ROWS, include_vehicle=True)
+
+
+app = FastAPI()
+
+
+@app.get("/json", response_model=List[UnitOutput], response_class=JSONResponse)
+def units_json(db: Session = Depends(get_bench_db)):
+    return get_page(db)
+
+
+@app.get("/orjson", response_model=List[UnitOutput], response_class=ORJSONResponse)
+def units_orjson(db: Session = Depends(get_bench_db)):
+    return get_page(db)
+
+
+@app.get("/schema", response_model=List[UnitOutput])
+def units_schema(db: Session = Depends(get_bench_db)):
+    return schema_response(List[UnitOutput], get_page(db))
+
+
+def seed() -> None:
+    Base.metadata.create_all(bind=engine)
+    with Session(engine) as db:
+        store = Store(name="Main", city="Chicago", state="IL", zip_code=60610)
+        for i in range(ROWS):
+            vehicle = Vehicle(year=2020, make="honda", model="civic", vin=f"{i:017d}")
+            db.add(
+                Unit(
+                    list_date=datetime(2024, 1, 1),
+                    buy_now_price=i,
+                    store=store,
+                    vehicle=vehicle,
+                )
+            )
+        db.commit()
+
+
+def main() -> None:
+    seed()
+    client = TestClient(app)
+    bodies = {}
+    for path in ("/json", "/orjson", "/schema"):
+        client.get(path)
+        start = time.perf_counter()
+        for _ in range(ROUNDS):
+            bodies[path] = client.get(path).content
+        elapsed = (time.perf_counter() - start) / ROUNDS * 1000
+        print(f"{path:<8} {elapsed:8.2f} ms/request  {len(bodies[path]):,} bytes")
+    assert bodies["/json"] == bodies["/orjson"] == bodies["/schema"]
+
+
+if __name__ == "__main__":
+    main()
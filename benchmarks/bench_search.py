@@ -0,0 +1,114 @@
+"""
+Full-text search of the inventory at a million units, each with its own vehicle
+
+    python -m benchmarks.bench_search [units]
+
+Times the backfill create_search_index runs against an existing database, then
+the first page (20 units, vehicles loaded) of searches from very selective to
+matching a third of the inventory. Best of ROUNDS runs each.
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Point the app's engines at a scratch database before anything imports them
+os.environ["DB_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+os.environ.setdefault("SECRET_KEY", "bench")
+
+from sqlalchemy import insert  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from app.database import Base, engine  # noqa: E402
+from app.migrations import create_search_index  # noqa: E402
+from app.models import stores, users  # noqa: E402,F401 register tables
+from app.models.units import Unit  # noqa: E402
+from app.models.vehicles import Vehicle  # noqa: E402
+from app.services.units import search_units  # noqa: E402
+from app.utils.search import match_query  # noqa: E402
+
+UNITS = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+PAGE = 20
+ROUNDS = 20
+BATCH = 50_000
+
+MODELS = {
+    "honda": ["civic", "accord", "cr-v", "pilot", "odyssey", "fit", "hr-v"],
+    "toyota": ["camry", "corolla", "rav4", "tacoma", "highlander", "prius"],
+    "mazda": ["mazda3", "mazda6", "cx-5", "cx-9", "mx-5 miata"],
+}
+TRIMS = ["lx", "ex", "ex-l", "sport", "touring", "limited", "grand touring", "se", "xle"]
+COLORS = ["black", "white", "silver", "gray", "red", "blue", "green"]
+CATEGORIES = ["sedan", "suv", "truck", "hatchback", "van", "coupe"]
+VIN_CHARS = "ABCDEFGHJKLMNPRSTUVWXYZ0123456789"
+
+
+def vehicle(rng: random.Random) -> dict:
+    make = rng.choice(list(MODELS))
+    return {
+        "year": rng.randint(2000, 2024),
+        "make": make,
+        "model": rng.choice(MODELS[make]),
+        "trim": rng.choice(TRIMS),
+        "color": rng.choice(COLORS),
+        "category": rng.choice(CATEGORIES),
+        "vin": "".join(rng.choices(VIN_CHARS, k=17)),
+    }
+
+
+def seed() -> list:
+    rng = random.Random(0)
+    vins = []
+    with engine.begin() as conn:
+        for start in range(0, UNITS, BATCH):
+            rows = [vehicle(rng) for _ in range(min(BATCH, UNITS - start))]
+            vins += [row["vin"] for row in rows]
+            conn.execute(insert(Vehicle), rows)
+            conn.execute(
+                insert(Unit),
+                [
+                    {"vehicle_id": start + i + 1, "stock_number": f"STK{start + i:07d}"}
+                    for i in range(len(rows))
+                ],
+            )
+    return vins
+
+
+def timed(q: str) -> tuple:
+    match = match_query(q)
+    best = float("inf")
+    with Session(engine) as db:
+        for _ in range(ROUNDS):
+            start = time.perf_counter()
+            units = search_units(db, match, limit=PAGE + 1)
+            best = min(best, time.perf_counter() - start)
+    return best * 1000, len(units)
+
+
+def main() -> None:
+    Base.metadata.create_all(bind=engine)
+    vins = seed()
+    start = time.perf_counter()
+    create_search_index(engine)
+    backfill = time.perf_counter() - start
+    print(f"{UNITS:,} units, search index backfilled in {backfill:.1f}s")
+
+    queries = [
+        f"STK{UNITS // 2:07d}",
+        f"STK{UNITS // 2 // 100:05d}",
+        vins[UNITS // 3][:8],
+        "2019 civic touring black",
+        "civic tour",
+        "mx-5 2010 red",
+        "civic",
+        "honda",
+    ]
+    print(f"{'query':28} {'first page':>10}  rows")
+    for q in queries:
+        elapsed, rows = timed(q)
+        print(f"{q:28} {elapsed:8.2f}ms  {min(rows, PAGE)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Rows per second for a 100-unit page with vehicle and store included
+
+"before" is the reflective SerializerMixin.serialize followed by FastAPI's
+response_model validation and the stdlib json encoder, "after" is the compiled
+serializer fed to a prebuilt TypeAdapter.
+
+    python -m benchmarks.bench_serializers
+"""
+import asyncio
+import json
+import time
+from datetime import datetime
+from typing import List
+
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, class_mapper
+
+from app.database import Base
+from app.models.loading import plan_relationships
+from app.models.stores import Store
+from app.models.units import Unit
+from app.models.users import User  # noqa: F401 resolve Store.users
+from app.models.vehicles import Vehicle
+from app.repositories.units.unit_repository import UnitRepository
+from app.schemas.units import UnitOutput
+from app.utils.responses import schema_response
+
+ROWS = 100
+ROUNDS = 200
+
+
+def reflective_serialize(obj, depth=1, include_vehicle=False, include_store=False):
+    """SerializerMixin.serialize as it was before compiled serializers"""
+    data = {c.name: getattr(obj, c.name) for c in obj.__table__.columns}
+    if depth > 0:
+        for relationship in class_mapper(obj.__class__).relationships:
+            if (
+                (relationship.key == "vehicle" and not include_vehicle)
+                or (relationship.key == "store" and not include_store)
+                or relationship.key not in ("vehicle", "store")
+            ):
+                continue
+            related = getattr(obj, relationship.key)
+            data[relationship.key] = (
+                reflective_serialize(related, depth - 1) if related is not None else None
+            )
+    return data
+
+
+def load_rows(db: Session, relationships) -> List[Unit]:
+    store = Store(name="Main", city="Chicago", state="IL", zip_code=60610)
+    for i in range(ROWS):
+        vehicle = Vehicle(year=2020, make="honda", model="civic", vin=f"VIN{i:014d}")
+        db.add(
+            Unit(
+                list_date=datetime(2024, 1, 1),
+                buy_now_price=20000 + i,
+                store=store,
+                vehicle=vehicle,
+            )
+        )
+    db.commit()
+    db.expunge_all()
+    return UnitRepository(db).get_all_units(0, ROWS, relationships=relationships)
+
+
+def rate(fn) -> float:
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        fn()
+    return ROWS * ROUNDS / (time.perf_counter() - start)
+
+
+def main() -> None:
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    relationships = plan_relationships(
+        Unit, UnitOutput, include_vehicle=True, include_store=True
+    )
+    field = create_response_field(name="response", type_=List[UnitOutput])
+    loop = asyncio.new_event_loop()
+
+    with Session(engine) as db:
+        rows = load_rows(db, relationships)
+
+        def before() -> bytes:
+            content = [
+                reflective_serialize(row, include_vehicle=True, include_store=True)
+                for row in rows
+            ]
+            payload = loop.run_until_complete(
+                serialize_response(field=field, response_content=content)
+            )
+            return json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode()
+
+        def after() -> bytes:
+            content = [row.serialize(relationships=relationships) for row in rows]
+            return schema_response(List[UnitOutput], content).body
+
+        assert before() == after()
+        before_rate, after_rate = rate(before), rate(after)
+    print(f"before {before_rate:12,.0f} rows/s")
+    print(f"after  {after_rate:12,.0f} rows/s  ({after_rate / before_rate:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Mixed unit reads and writes from 16 threads, on the old single default SQLite
+engine and on the tuned writer/reader engines of app.database
+
+    python -m benchmarks.bench_sqlite_profile
+"""
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+# Point the app's engines at a scratch database before anything imports them
+os.environ["DB_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+
+from sqlalchemy import create_engine, event, insert  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app.database import Base, RoutingSession, create_engines  # noqa: E402
+from app.models import stores, users  # noqa: E402,F401
+from app.models.units import Unit  # noqa: E402
+from app.models.vehicles import Vehicle  # noqa: E402
+from app.schemas.units import UnitAdd  # noqa: E402
+from app.schemas.vehicles import VehicleAdd  # noqa: E402
+from app.services import units as unit_service  # noqa: E402
+from test.utils.unit_randomizer import create_random_unit_data  # noqa: E402
+from test.utils.vehicle_randomizer import create_random_vehicle_data  # noqa: E402
+
+THREADS = 16
+SECONDS = 10
+WRITE_RATIO = 0.5
+ROWS = 20_000
+
+
+def default_sessions(url: str) -> sessionmaker:
+    """The engine app.database built before: rollback journal, deferred BEGIN"""
+    engine = create_engine(url, connect_args={"check_same_thread": False})
+
+    @event.listens_for(engine, "connect")
+    def _disable_pysqlite_begin(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def _emit_begin(conn):
+        conn.exec_driver_sql("BEGIN")
+
+    return sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+
+
+def tuned_sessions(url: str) -> sessionmaker:
+    writer, reader = create_engines(url)
+    return sessionmaker(
+        class_=RoutingSession,
+        reader=reader,
+        writer=writer,
+        autoflush=False,
+        expire_on_commit=False,
+    )
+
+
+def seed(url: str) -> None:
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    start = datetime(2024, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(
+            insert(Vehicle), [create_random_vehicle_data() for _ in range(ROWS)]
+        )
+        conn.execute(
+            insert(Unit),
+            [
+                {
+                    "vehicle_id": i + 1,
+                    "store_id": i % 25 + 1,
+                    "list_date": start + timedelta(minutes=i),
+                }
+                for i in range(ROWS)
+            ],
+        )
+    engine.dispose()
+
+
+def worker(sessions: sessionmaker, deadline: float, counts: Counter) -> None:
+    while time.perf_counter() < deadline:
+        with sessions() as db:
+            try:
+                if random.random() < WRITE_RATIO:
+                    unit_service.create_unit(
+                        db,
+                        UnitAdd(**create_random_unit_data()),
+                        VehicleAdd(**create_random_vehicle_data()),
+                    )
+                    counts["writes"] += 1
+                else:
+                    unit_service.get_unit_by_id(
+                        db, random.randint(1, ROWS), include_vehicle=True
+                    )
+                    counts["reads"] += 1
+            except OperationalError as e:
+                counts["locked" if "locked" in str(e) else "errors"] += 1
+
+
+def run(sessions: sessionmaker) -> Counter:
+    counts = Counter()
+    deadline = time.perf_counter() + SECONDS
+    threads = [
+        threading.Thread(target=worker, args=(sessions, deadline, counts))
+        for _ in range(THREADS)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return counts
+
+
+def main() -> None:
+    print(f"{THREADS} threads, {WRITE_RATIO:.0%} writes, {SECONDS}s each")
+    setups = (("default", default_sessions), ("tuned", tuned_sessions))
+    for label, make_sessions in setups:
+        url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), f'{label}.db')}"
+        seed(url)
+        counts = run(make_sessions(url))
+        print(
+            f"{label:8} {counts['reads'] / SECONDS:8,.0f} reads/s "
+            f"{counts['writes'] / SECONDS:7,.0f} writes/s  "
+            f"{counts['locked']} locked  {counts['errors']} other errors"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+from datetime import datetime
+from typing import Callable, Generator, List
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.database import engine
+from app.models.units import Unit
+from app.models.vehicles import Vehicle
+from app.services.expiry import ExpiryScheduler, expire_due_units
+from app.unit_of_work.unit_of_work import UnitOfWork
+from app.utils.filters import parse_filters
+from app.utils.pagination import Cursor
+
+LIVE = {"sold_status": False, "is_expired": False}
+
+# (name, repository call, index the plan must use or None for any)
+HOT_PATHS = [
+    ("unit", lambda uow: uow.units.get_unit(1, ("vehicle", "store")), None),
+    (
+        "units by store",
+        lambda uow: uow.units.get_all_units(0, 100, {"store_id": 1}),
+        "ix_units_store_id",
+    ),
+    (
+        "units by vehicle",
+        lambda uow: uow.units.get_all_units(0, 100, {"vehicle_id": 1}),
+        "ix_units_vehicle_id",
+    ),
+    (
+        "units by buyer",
+        lambda uow: uow.units.get_all_units(0, 100, {"purchased_by": 1}),
+        "ix_units_purchased_by",
+    ),
+    (
+        "sold units",
+        lambda uow: uow.units.get_all_units(0, 100, {"sold_status": True}),
+        "ix_units_sold_status",
+    ),
+    (
+        "units by expire_date",
+        lambda uow: uow.units.get_all_units(
+            0, 100, {"expire_date": datetime(2024, 1, 1)}
+        ),
+        None,
+    ),
+    (
+        "live units of a store",
+        lambda uow: uow.units.get_all_units(
+            0, 100, {"store_id": 1, **LIVE}, sort_key="list_date"
+        ),
+        "ix_units_live_store_list_date",
+    ),
+    (
+        "units page by list_date",
+        lambda uow: uow.units.get_all_units(
+            0,
+            100,
+            cursor=Cursor("list_date", "2024-01-01T00:00:00", 1),
+            sort_key="list_date",
+        ),
+        "ix_units_list_date",
+    ),
+    (
+        "units by vehicle make",
+        lambda uow: uow.units.get_all_units(
+            0,
+            100,
+            to_join=True,
+            models_to_join=[Vehicle],
+            joined_model_filters={"make": "Honda"},
+        ),
+        "ix_vehicles_make_model_year",
+    ),
+    (
+        "units by vehicle make, filtered through the relationship",
+        lambda uow: uow.units.get_all_units(
+            0, 100, filters=parse_filters(Unit, [("vehicle.make", "Honda")])
+        ),
+        "ix_units_vehicle_id",
+    ),
+    (
+        "vehicles by make",
+        lambda uow: uow.vehicles.get_all_vehicles(0, 100, {"make": "Honda"}),
+        "ix_vehicles_make_model_year",
+    ),
+    (
+        "vehicles by make and model",
+        lambda uow: uow.vehicles.get_all_vehicles(
+            0, 100, {"make": "Honda", "model": "Civic"}
+        ),
+        None,
+    ),
+    (
+        "vehicles by model",
+        lambda uow: uow.vehicles.get_all_vehicles(0, 100, {"model": "Civic"}),
+        "ix_vehicles_model",
+    ),
+    (
+        "vehicles by year",
+        lambda uow: uow.vehicles.get_all_vehicles(0, 100, {"year": 2020}),
+        "ix_vehicles_year",
+    ),
+    (
+        "vehicle by vin",
+        lambda uow: uow.vehicles.get_all_vehicles(0, 100, {"vin": "1HGCM82633A004352"}),
+        "ix_vehicles_vin",
+    ),
+    (
+        "vehicles by vin suffix",
+        lambda uow: uow.vehicles.get_vehicles_by_vin_suffix("004352", 100),
+        "ix_vehicles_vin_reversed",
+    ),
+    (
+        "units by stock number",
+        lambda uow: uow.units.get_units_by_stock_number("STK0001", 100, ("vehicle",)),
+        "ix_units_stock_number",
+    ),
+    (
+        "vehicle with units",
+        lambda uow: uow.vehicles.get_vehicle(1, ("units",)),
+        "ix_units_vehicle_id",
+    ),
+    (
+        "store with users",
+        lambda uow: uow.stores.get_store(1, ("users",)),
+        "ix_users_store_id",
+    ),
+    (
+        "users of a store",
+        lambda uow: uow.users.get_users(0, 40, {"store_id": 1}),
+        "ix_users_store_id",
+    ),
+    (
+        "expire units",
+        lambda uow: expire_due_units(uow.db),
+        "ix_units_is_expired_expire_date",
+    ),
+    (
+        "expiry deadlines",
+        lambda uow: ExpiryScheduler(lambda: uow.db)._load(),
+        "ix_units_is_expired_expire_date",
+    ),
+]
+
+
+@pytest.fixture
+def query_plans(db: Session) -> Generator:
+    """Runs a callable and returns the EXPLAIN QUERY PLAN of every statement it sent"""
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith(("SELECT", "UPDATE", "DELETE")):
+            statements.append((statement, parameters))
+
+    def explain(fn: Callable) -> List[List[str]]:
+        statements.clear()
+        event.listen(engine, "before_cursor_execute", capture)
+        try:
+            fn(UnitOfWork(db))
+        finally:
+            event.remove(engine, "before_cursor_execute", capture)
+        conn = db.connection()
+        return [
+            [row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}", params)]
+            for sql, params in statements
+        ]
+
+    yield explain
+    db.rollback()
+
+
+@pytest.mark.parametrize("name, call, index", HOT_PATHS, ids=[p[0] for p in HOT_PATHS])
+def test_hot_path_uses_index(
+    query_plans: Callable, name: str, call: Callable, index: str
+) -> None:
+    """
+    GIVEN a repository query on a hot path
+    WHEN its statements are run through EXPLAIN QUERY PLAN
+    THEN no table is read with a full SCAN and the expected index is used
+    """
+    plans = query_plans(call)
+    assert plans
+    steps = [step for plan in plans for step in plan]
+    assert not [step for step in steps if step.startswith("SCAN")], steps
+    if index:
+        assert any(index in step for step in steps), steps
@@ -0,0 +1,103 @@
+from datetime import datetime
+from itertools import product
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, class_mapper
+
+from app.database import Base
+from app.models.loading import GATED_RELATIONSHIPS, plan_relationships
+from app.models.stores import Store
+from app.models.units import Unit
+from app.models.users import User
+from app.models.vehicles import Vehicle
+
+FLAGS = ("include_vehicle", "include_store", "include_unit_model")
+
+
+def reflective_serialize(
+    obj,
+    depth=1,
+    include_vehicle=False,
+    include_store=False,
+    include_unit_model=False,
+    relationships=None,
+):
+    """SerializerMixin.serialize as it was before compiled serializers"""
+    flags = {
+        "include_vehicle": include_vehicle,
+        "include_store": include_store,
+        "include_unit_model": include_unit_model,
+    }
+    data = {c.name: getattr(obj, c.name) for c in obj.__table__.columns}
+    if depth > 0:
+        if relationships is not None:
+            keys = relationships
+        else:
+            keys = [
+                relationship.key
+                for relationship in class_mapper(obj.__class__).relationships
+                if flags.get(GATED_RELATIONSHIPS.get(relationship.key), True)
+            ]
+        for key in keys:
+            related = getattr(obj, key)
+            if related is None:
+                data[key] = None
+            elif isinstance(related, list):
+                data[key] = [reflective_serialize(item, depth - 1) for item in related]
+            else:
+                data[key] = reflective_serialize(related, depth - 1)
+    return data
+
+
+@pytest.fixture()
+def rows():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    with Session(engine) as db:
+        store = Store(name="Main", city="Chicago", state="IL", zip_code=60610)
+        vehicle = Vehicle(year=2020, make="honda", model="civic", vin="1HGCM82633A004352")
+        db.add_all(
+            [
+                Unit(
+                    stock_number="A1",
+                    list_date=datetime(2024, 1, 1, 9, 30),
+                    buy_now_price=20000.5,
+                    store=store,
+                    vehicle=vehicle,
+                ),
+                Unit(stock_number="A2", store=store, vehicle=vehicle),
+                # No store, no vehicle
+                Unit(stock_number="A3"),
+                User(username="buyer", email="buyer@example.com", store=store),
+                # No users, no units
+                Store(name="Empty"),
+                Vehicle(year=2021, make="kia", model="rio"),
+            ]
+        )
+        db.commit()
+        yield db
+    engine.dispose()
+
+
+def test_compiled_serializer_matches_reflective_serializer(rows: Session) -> None:
+    """
+    GIVEN rows of every model, with empty collections and None relationships
+    WHEN they are serialized at every depth, by include flags and by load plan
+    THEN the compiled serializer returns what the reflective one did, for
+        expired rows as for loaded ones
+    """
+    models = (Unit, Vehicle, Store, User)
+    for expired, model, depth in product((True, False), models, range(4)):
+        for enabled in product((False, True), repeat=len(FLAGS)):
+            flags = dict(zip(FLAGS, enabled))
+            plan = plan_relationships(model, **flags)
+            for obj in rows.query(model).order_by(model.id):
+                if expired:
+                    rows.expire_all()
+                assert obj.serialize(depth, **flags) == reflective_serialize(
+                    obj, depth, **flags
+                ), (model, depth, flags)
+                assert obj.serialize(depth, relationships=plan) == reflective_serialize(
+                    obj, depth, relationships=plan
+                ), (model, depth, plan)
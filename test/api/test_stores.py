@@ -1,13 +1,19 @@
+from types import SimpleNamespace
 from typing import Dict
 
 from fastapi.testclient import TestClient
 from fastapi import status
+from sqlalchemy import false, select
 from sqlalchemy.orm import Session
 
 from app.schemas.stores import StoreUpdate, StoreDelete, StoreOutput, StoreAdd
 from app.schemas.users import UserLogin
 
-from app.services.stores import create_store, get_store_by_id
+from app.config import ETAG_TTL
+from app.database import SessionLocal
+from app.models.units import Unit
+from app.services.stores import create_store, delete_store, get_store_by_id
+from app.utils import etags
 
 from test.utils.store_randomizer import random_store_create
 
@@ -45,4 +51,132 @@ from test.utils.store_randomizer import random_store_create
 #         "qb_customer_id": 123456,
 #     }
 #     r = client.post("/api/v1/stores/", json=store_data)
-#     assert 409 == r.status_code
\ No newline at end of file
+#     assert 409 == r.status_code
+
+def test_get_stores_statement_count(
+    client: TestClient, admin_headers: dict, query_counter: list
+) -> None:
+    """
+    GIVEN StoreOutput renders users but not units
+    WHEN '/api/v1/stores/' is requested
+    THEN users are loaded with one extra SELECT ... IN and units are never loaded
+    """
+    r = client.get("/api/v1/stores/", headers=admin_headers)
+    assert r.status_code == status.HTTP_200_OK
+    assert len(query_counter) == 2
+    assert not any("FROM units" in statement for statement in query_counter)
+
+
+def test_get_store_statement_count(
+    client: TestClient, admin_headers: dict, query_counter: list
+) -> None:
+    r = client.get("/api/v1/stores/1", headers=admin_headers)
+    assert r.status_code == status.HTTP_200_OK
+    assert len(query_counter) == 2
+
+
+def test_get_stores_through_units(client: TestClient, admin_headers: dict) -> None:
+    """
+    GIVEN stores with many units each
+    WHEN '/api/v1/stores/' is filtered through its units, by a relationship
+        path or by joining units
+    THEN every store with a matching unit comes back once and pages stay full
+    """
+    with SessionLocal() as db:
+        live = set(
+            db.execute(select(Unit.store_id).where(Unit.sold_status == false())).scalars()
+        )
+    for params in (
+        {"units.sold_status": "false"},
+        {"to_join": True, "models_to_join": "unit", "joined_model_filter_key": "sold_status", "joined_model_filter_value": 0},
+    ):
+        r = client.get("/api/v1/stores/", headers=admin_headers, params=params)
+        assert r.status_code == status.HTTP_200_OK
+        assert [store["id"] for store in r.json()] == sorted(live - {None})
+
+        r = client.get("/api/v1/stores/", headers=admin_headers, params={**params, "limit": 5})
+        assert len(r.json()) == 5
+
+
+def test_get_stores_etag_follows_writes(
+    client: TestClient, admin_headers: dict, query_counter: list
+) -> None:
+    """
+    GIVEN a list and a detail response with their ETags
+    WHEN they are requested again with If-None-Match, before and after a
+        store is created, updated and deleted
+    THEN unchanged tables answer 304 without a query, and every write makes
+        the next request return the new rows under a new ETag
+    """
+
+    def get(url: str, etag: str = None):
+        headers = {**admin_headers, "If-None-Match": etag} if etag else admin_headers
+        query_counter.clear()
+        return client.get(url, headers=headers)
+
+    r = get("/api/v1/stores/?limit=1000")
+    list_etag = r.headers["ETag"]
+    r = get("/api/v1/stores/1")
+    detail_etag = r.headers["ETag"]
+    for url, etag in (("/api/v1/stores/?limit=1000", list_etag), ("/api/v1/stores/1", detail_etag)):
+        r = get(url, etag)
+        assert r.status_code == status.HTTP_304_NOT_MODIFIED
+        assert r.headers["ETag"] == etag
+        assert not r.content
+        assert query_counter == []
+    # Other query parameters are another response
+    assert get("/api/v1/stores/?limit=999", list_etag).status_code == status.HTTP_200_OK
+
+    r = client.post("/api/v1/stores/", headers=admin_headers, json=random_store_create())
+    assert r.status_code == status.HTTP_201_CREATED
+    store_id = r.json()["id"]
+    r = get("/api/v1/stores/?limit=1000", list_etag)
+    assert r.status_code == status.HTTP_200_OK
+    assert store_id in [store["id"] for store in r.json()]
+    list_etag = r.headers["ETag"]
+    # Every store table write changes every store response
+    assert get("/api/v1/stores/1", detail_etag).status_code == status.HTTP_200_OK
+
+    r = client.put(
+        f"/api/v1/stores/{store_id}", headers=admin_headers, json={"name": "Renamed"}
+    )
+    assert r.status_code == status.HTTP_200_OK
+    r = get("/api/v1/stores/?limit=1000", list_etag)
+    assert r.status_code == status.HTTP_200_OK
+    assert {"id": store_id, "name": "Renamed"}.items() <= next(
+        store for store in r.json() if store["id"] == store_id
+    ).items()
+    list_etag = r.headers["ETag"]
+    r = get(f"/api/v1/stores/{store_id}")
+    assert r.json()["name"] == "Renamed"
+    detail_etag = r.headers["ETag"]
+    assert get(f"/api/v1/stores/{store_id}", detail_etag).status_code == 304
+
+    # DELETE /stores/{id} answers with a body its response_model rejects
+    with SessionLocal() as db:
+        delete_store(db, store_id)
+    r = get("/api/v1/stores/?limit=1000", list_etag)
+    assert r.status_code == status.HTTP_200_OK
+    assert store_id not in [store["id"] for store in r.json()]
+    assert get(f"/api/v1/stores/{store_id}", detail_etag).status_code == 404
+
+
+def test_get_stores_etag_expires(
+    client: TestClient, admin_headers: dict, monkeypatch
+) -> None:
+    """
+    GIVEN a detail response with its ETag
+    WHEN it is requested again with If-None-Match and no write bumps the
+        table versions, as with one by another worker
+    THEN it stays 304 within ETAG_TTL and is answered in full after it
+    """
+    now = 1_000_000 * ETAG_TTL
+    monkeypatch.setattr(etags, "time", SimpleNamespace(time=lambda: now))
+    etag = client.get("/api/v1/stores/1", headers=admin_headers).headers["ETag"]
+    headers = {**admin_headers, "If-None-Match": etag}
+    now += ETAG_TTL / 2
+    assert client.get("/api/v1/stores/1", headers=headers).status_code == 304
+    now += ETAG_TTL
+    r = client.get("/api/v1/stores/1", headers=headers)
+    assert r.status_code == status.HTTP_200_OK
+    assert r.headers["ETag"] != etag
@@ -1,10 +1,44 @@
+import asyncio
+import csv
+import io
+import json
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Optional
+
 from fastapi.testclient import TestClient
 
 from fastapi import status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
 
+import pytest
+from sqlalchemy import event, false, text, update
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import Session
 
+from app.database import (SessionLocal, async_engine, async_read_engine, engine,
+                          read_engine)
+from app.models.stores import Store
+from app.models.units import EXPIRY_INDEX, Unit
+from app.models.vehicles import Vehicle
+from app.repositories.units import unit_repository
+from app.repositories.base.count_cache import count_cache
+from app.repositories.base.entity_cache import entity_cache
+from app.schemas.units import UnitAdd, UnitOutput
+from app.schemas.vehicles import VehicleAdd
 from app.schemas.users import UserLogin
+from app.schemas.stores import StoreUpdate
+from app.services import stores as store_service
+from app.services import units as unit_service
+from app.services.expiry import ExpiryScheduler, expire_due_units
+from app.services.writer import GroupCommitWriter
+from app.utils.responses import ORJSONResponse
 
 from test.utils.unit_randomizer import create_random_unit_data
 from test.utils.vehicle_randomizer import create_random_vehicle_data
@@ -30,4 +64,889 @@ def test_create_unit(client: TestClient, db: Session) -> None:
         random_vehicle = create_random_vehicle_data()
         response = client.post("/api/v1/units/", headers=headers, json={"unit": random_unit, "vehicle": random_vehicle})
         assert response.status_code == status.HTTP_201_CREATED
-        
\ No newline at end of file
+        
+
+def test_get_units_cursor_matches_skip(client: TestClient, admin_headers: dict) -> None:
+    """
+    GIVEN units in the database
+    WHEN '/api/v1/units/' is walked with the X-Next-Cursor header
+    THEN the pages match the ones returned by skip/limit
+    """
+    headers = admin_headers
+    cursor = None
+    for page in range(3):
+        params = {"limit": 50}
+        if cursor:
+            params["cursor"] = cursor
+        by_cursor = client.get("/api/v1/units/", headers=headers, params=params)
+        by_skip = client.get(
+            "/api/v1/units/", headers=headers, params={"skip": page * 50, "limit": 50}
+        )
+        assert by_cursor.status_code == status.HTTP_200_OK
+        assert [u["unit_id"] for u in by_cursor.json()] == [
+            u["unit_id"] for u in by_skip.json()
+        ]
+        cursor = by_cursor.headers["X-Next-Cursor"]
+
+
+def test_get_units_cursor_with_sort_key(client: TestClient, admin_headers: dict) -> None:
+    headers = admin_headers
+    first = client.get(
+        "/api/v1/units/", headers=headers, params={"limit": 20, "sort_key": "list_date"}
+    )
+    second = client.get(
+        "/api/v1/units/",
+        headers=headers,
+        params={"limit": 20, "cursor": first.headers["X-Next-Cursor"]},
+    )
+    list_dates = [u["list_date"] for u in first.json() + second.json()]
+    assert list_dates == sorted(list_dates)
+    assert len({u["unit_id"] for u in first.json() + second.json()}) == 40
+
+
+def test_get_units_last_page_has_no_cursor(client: TestClient, admin_headers: dict) -> None:
+    headers = admin_headers
+    all_units = client.get("/api/v1/units/", headers=headers, params={"limit": 100000})
+    assert "X-Next-Cursor" not in all_units.headers
+
+
+def test_get_units_invalid_cursor(client: TestClient, admin_headers: dict) -> None:
+    headers = admin_headers
+    r = client.get("/api/v1/units/", headers=headers, params={"cursor": "not-a-cursor"})
+    assert r.status_code == status.HTTP_400_BAD_REQUEST
+    r = client.get("/api/v1/units/", headers=headers, params={"sort_key": "nope"})
+    assert r.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_get_units_filters_with_descending_order(
+    client: TestClient, admin_headers: dict
+) -> None:
+    """
+    GIVEN units in the database
+    WHEN '/api/v1/units/' is walked with purchase_price__between and order_by=-list_date
+    THEN the pages hold exactly the units in range, newest listing first
+    """
+    every_unit = client.get(
+        "/api/v1/units/", headers=admin_headers, params={"limit": 100000}
+    ).json()
+    prices = sorted(u["purchase_price"] for u in every_unit)
+    low, high = prices[len(prices) // 4], prices[len(prices) * 3 // 4]
+    expected = sorted(
+        (u for u in every_unit if low <= u["purchase_price"] <= high),
+        key=lambda u: (u["list_date"], u["unit_id"]),
+        reverse=True,
+    )
+
+    between = f"{low},{high}"
+    params = {"limit": 40, "purchase_price__between": between, "order_by": "-list_date"}
+    walked = []
+    while True:
+        r = client.get("/api/v1/units/", headers=admin_headers, params=params)
+        assert r.status_code == status.HTTP_200_OK
+        walked += r.json()
+        if "X-Next-Cursor" not in r.headers:
+            break
+        cursor = r.headers["X-Next-Cursor"]
+        params = {"limit": 40, "purchase_price__between": between, "cursor": cursor}
+    assert [u["unit_id"] for u in walked] == [u["unit_id"] for u in expected]
+
+
+def test_get_units_filters_through_vehicle(client: TestClient, admin_headers: dict) -> None:
+    """
+    GIVEN units with vehicles
+    WHEN '/api/v1/units/' is filtered by vehicle.year__gte and vehicle.make__in
+    THEN exactly the units whose vehicle matches both come back, and the ETag
+        follows the vehicles table the response does not render
+    """
+    every_unit = client.get(
+        "/api/v1/units/", headers=admin_headers, params={"limit": 100000, "include_vehicle": True}
+    ).json()
+    makes = sorted({u["vehicle"]["make"] for u in every_unit if u["vehicle"]})[:2]
+    expected = [
+        u["unit_id"]
+        for u in every_unit
+        if u["vehicle"] and u["vehicle"]["year"] >= 2018 and u["vehicle"]["make"] in makes
+    ]
+    params = {"limit": 100000, "vehicle.year__gte": 2018, "vehicle.make__in": ",".join(makes)}
+    r = client.get("/api/v1/units/", headers=admin_headers, params=params)
+    assert r.status_code == status.HTTP_200_OK
+    assert [u["unit_id"] for u in r.json()] == expected
+
+    etag = r.headers["ETag"]
+    with SessionLocal() as db:
+        db.get(Vehicle, 1).color = "Ultramarine"
+        db.commit()
+    r = client.get(
+        "/api/v1/units/", headers={**admin_headers, "If-None-Match": etag}, params=params
+    )
+    assert r.status_code == status.HTTP_200_OK
+
+
+def test_get_units_invalid_filters(client: TestClient, admin_headers: dict) -> None:
+    for params in (
+        {"purchase_price__gte": "cheap"},
+        {"purchase_price__between": "1"},
+        {"purchase_price__like": "1"},
+        {"transport_company__eq": "acme"},
+        {"order_by": "-transport_company"},
+        {"vehicle.vin_suffix": "1234"},
+        {"purchaser.username": "admin"},
+        {"facets": "make,color"},
+        {"to_join": True, "models_to_join": "vehicle", "joined_model_filter_key": "mkae",
+         "joined_model_filter_value": "Honda"},
+        {"to_join": True, "models_to_join": "user"},
+    ):
+        r = client.get("/api/v1/units/", headers=admin_headers, params=params)
+        assert r.status_code == status.HTTP_400_BAD_REQUEST, params
+
+    # Not a filterable column, a bare name is left to the endpoint
+    params = {"transport_company": "acme", "limit": 1}
+    r = client.get("/api/v1/units/", headers=admin_headers, params=params)
+    assert r.status_code == status.HTTP_200_OK
+    # Commas only separate the values of in and between
+    params = {"delivery_status__ne": "Rolls,Royce", "limit": 1}
+    r = client.get("/api/v1/units/", headers=admin_headers, params=params)
+    assert r.status_code == status.HTTP_200_OK
+
+
+def test_get_units_counts(
+    client: TestClient, admin_headers: dict, query_counter: list
+) -> None:
+    """
+    GIVEN units with vehicles and stores
+    WHEN '/api/v1/units/' is asked for with_total and facets, twice, then after
+        a vehicle changes
+    THEN the headers count every matching unit over all pages, the repeat
+        reads them from the count cache and the write makes them counted again
+    """
+    count_cache.clear()
+    params = {
+        "limit": 10,
+        "with_total": True,
+        "facets": "make,year,store_id",
+        "vehicle.year__gte": 2010,
+    }
+    every_unit = client.get(
+        "/api/v1/units/",
+        headers=admin_headers,
+        params={"limit": 100000, "include_vehicle": True, "vehicle.year__gte": 2010},
+    ).json()
+    makes = Counter(u["vehicle"]["make"] for u in every_unit if u["vehicle"])
+
+    r = client.get("/api/v1/units/", headers=admin_headers, params=params)
+    assert len(r.json()) == 10
+    assert r.headers["X-Total-Count"] == str(len(every_unit))
+    facets = json.loads(r.headers["X-Facets"])
+    assert facets["make"] == dict(makes)
+    assert sum(facets["year"].values()) == sum(facets["store_id"].values()) == len(every_unit)
+
+    query_counter.clear()
+    again = client.get("/api/v1/units/", headers=admin_headers, params=params)
+    assert again.headers["X-Facets"] == r.headers["X-Facets"]
+    assert not [statement for statement in query_counter if "matched" in statement]
+
+    vehicle_id = next(u["vehicle"]["id"] for u in every_unit if u["vehicle"])
+    with SessionLocal() as db:
+        db.get(Vehicle, vehicle_id).make = "Zastava"
+        db.commit()
+    query_counter.clear()
+    r = client.get("/api/v1/units/", headers=admin_headers, params=params)
+    assert json.loads(r.headers["X-Facets"])["make"]["Zastava"] >= 1
+    assert [statement for statement in query_counter if "matched" in statement]
+
+
+def test_search_units(client: TestClient, admin_headers: dict) -> None:
+    """
+    GIVEN units of a make no other unit has
+    WHEN '/api/v1/search' is asked for words of their vehicles and stock numbers,
+        a page at a time, and again after a vehicle changes and a unit is deleted
+    THEN the matching units come back best first with every word matched, the
+        last one as a prefix, and the index follows the writes
+    """
+    with SessionLocal() as db:
+        units = [
+            Unit(
+                stock_number=stock_number,
+                vehicle=Vehicle(
+                    **{
+                        **create_random_vehicle_data(),
+                        "make": "zhiguli",
+                        "model": model,
+                        "trim": trim,
+                        "year": 2019,
+                    }
+                ),
+            )
+            for stock_number, model, trim in [
+                ("ZHA100", "Zephyr", "Touring"),
+                ("ZHB200", "Zephyr", "Sport"),
+                ("ZHC300", "Zephyrine", "Sport"),
+            ]
+        ]
+        db.add_all(units)
+        db.commit()
+        touring, sport, other = [(unit.id, unit.vehicle_id) for unit in units]
+
+    def ids(q: str) -> set:
+        r = client.get("/api/v1/search", headers=admin_headers, params={"q": q})
+        assert r.status_code == status.HTTP_200_OK
+        return {u["unit_id"] for u in r.json()}
+
+    assert ids("zhiguli zephyr tour") == {touring[0]}
+    assert ids("ZHB2") == {sport[0]}
+    assert ids("2019 Zhiguli zeph") == {touring[0], sport[0], other[0]}
+    assert ids("zhiguli zeph touring") == set()
+
+    seen, cursor = [], None
+    while True:
+        params = {"q": "zhiguli zeph", "limit": 1, "cursor": cursor}
+        r = client.get("/api/v1/search", headers=admin_headers, params=params)
+        seen += [u["unit_id"] for u in r.json()]
+        cursor = r.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert sorted(seen) == sorted({touring[0], sport[0], other[0]})
+
+    with SessionLocal() as db:
+        db.get(Vehicle, sport[1]).trim = "Touring"
+        db.delete(db.get(Unit, touring[0]))
+        db.commit()
+    assert ids("zhiguli zephyr tour") == {sport[0]}
+
+    r = client.get("/api/v1/search", headers=admin_headers, params={"q": " -*! "})
+    assert r.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_search_units_past_rank_window(
+    client: TestClient, admin_headers: dict, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    GIVEN more units matching a search than the ranked window holds
+    WHEN '/api/v1/search' is paged through with X-Next-Cursor
+    THEN the window's units come first and every older match follows, newest first
+    """
+    with SessionLocal() as db:
+        units = [
+            Unit(
+                stock_number=f"MSK{index}",
+                vehicle=Vehicle(**{**create_random_vehicle_data(), "make": "moskvich"}),
+            )
+            for index in range(5)
+        ]
+        db.add_all(units)
+        db.commit()
+        unit_ids = [unit.id for unit in units]
+    monkeypatch.setattr(unit_repository, "SEARCH_RANK_WINDOW", 2)
+
+    for limit in (1, 2, 100):
+        seen, cursor = [], None
+        while True:
+            params = {"q": "moskvich", "limit": limit, "cursor": cursor}
+            r = client.get("/api/v1/search", headers=admin_headers, params=params)
+            assert r.status_code == status.HTTP_200_OK
+            seen += [u["unit_id"] for u in r.json()]
+            cursor = r.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+        assert sorted(seen[:2]) == unit_ids[3:]
+        assert seen[2:] == unit_ids[2::-1], limit
+
+
+def test_lookup_units_by_stock_number(client: TestClient, admin_headers: dict) -> None:
+    """
+    GIVEN units created with stock numbers, the last reusing the first's VIN
+    WHEN '/api/v1/units/lookup' is asked for a stock number, and a unit is
+        created with a VIN already taken
+    THEN the units with exactly that stock number come back, and the vehicles
+        with a taken VIN, in any case, or an overlong one are refused
+    """
+    rows = [
+        {
+            "unit": {**create_random_unit_data(), "stock_number": f"LK{i:04d}"},
+            "vehicle": create_random_vehicle_data(),
+        }
+        for i in range(3)
+    ]
+    rows[2]["vehicle"]["vin"] = rows[0]["vehicle"]["vin"].lower()
+    r = client.post("/api/v1/units/bulk", headers=admin_headers, json=rows)
+    results = r.json()["results"]
+    assert [result["status"] for result in results] == ["created", "created", "failed"]
+
+    r = client.get(
+        "/api/v1/units/lookup",
+        headers=admin_headers,
+        params={"stock_number": "LK0001", "include_vehicle": True},
+    )
+    assert r.status_code == status.HTTP_200_OK
+    assert [u["unit_id"] for u in r.json()] == [results[1]["unit_id"]]
+    assert r.json()[0]["stock_number"] == "LK0001"
+    assert r.json()[0]["vehicle"]["id"] == results[1]["vehicle_id"]
+    r = client.get(
+        "/api/v1/units/lookup", headers=admin_headers, params={"stock_number": "LK000"}
+    )
+    assert r.json() == []
+
+    vehicle = {**create_random_vehicle_data(), "vin": rows[1]["vehicle"]["vin"]}
+    r = client.post(
+        "/api/v1/units/",
+        headers=admin_headers,
+        json={"unit": create_random_unit_data(), "vehicle": vehicle},
+    )
+    assert r.status_code == status.HTTP_409_CONFLICT
+
+    # longer than the 17 characters the reversed VIN index is built for
+    vehicle = {**create_random_vehicle_data(), "vin": "1HGCM82633A0043521"}
+    r = client.post(
+        "/api/v1/units/",
+        headers=admin_headers,
+        json={"unit": create_random_unit_data(), "vehicle": vehicle},
+    )
+    assert r.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+def test_get_units_statement_count(
+    client: TestClient, admin_headers: dict, query_counter: list
+) -> None:
+    """
+    GIVEN include_vehicle and include_store
+    WHEN '/api/v1/units/' is requested twice
+    THEN vehicles and stores are loaded with one SELECT ... IN each instead of
+        lazy loaded, and the second time come from the entity cache
+    """
+    entity_cache.clear()
+    params = {"limit": 100, "include_vehicle": True, "include_store": True}
+    r = client.get("/api/v1/units/", headers=admin_headers, params=params)
+    assert r.status_code == status.HTTP_200_OK
+    assert all(u["vehicle"] and u["store"] for u in r.json())
+    # the page, the vehicles and the stores, the current user comes from the
+    # principal cache
+    assert len(query_counter) == 3
+    assert sum("WHERE vehicles.id IN" in statement for statement in query_counter) == 1
+
+    query_counter.clear()
+    assert client.get("/api/v1/units/", headers=admin_headers, params=params).json() == r.json()
+    assert len(query_counter) == 1
+    stats = client.get("/api/v1/home/cache", headers=admin_headers).json()
+    assert stats["stores"]["hit_ratio"] > 0 and stats["vehicles"]["hits"] >= 100
+
+
+def test_entity_cache_under_concurrent_reads_and_writes() -> None:
+    """
+    GIVEN threads rendering units with their store from the entity cache
+    WHEN the stores are renamed meanwhile
+    THEN no read fails and, once the writes are committed, every read sees
+        the last name
+    """
+    done = threading.Event()
+
+    def read() -> int:
+        reads = 0
+        while not done.is_set() or reads == 0:
+            with SessionLocal() as db:
+                unit_service.get_units(db, skip=0, limit=50, include_store=True)
+            reads += 1
+        return reads
+
+    def rename(name: str) -> None:
+        with SessionLocal() as db:
+            for store_id in range(1, 6):
+                store_service.update_store(db, store_id, StoreUpdate(name=name))
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        readers = [pool.submit(read) for _ in range(6)]
+        for i in range(20):
+            rename(f"Store {i}")
+        done.set()
+        assert all(reader.result() > 0 for reader in readers)
+    with SessionLocal() as db:
+        units = unit_service.get_units(db, skip=0, limit=500, include_store=True)
+    assert {u["store"]["name"] for u in units if u["store"] and u["store_id"] <= 5} == {"Store 19"}
+
+
+def test_unit_response_bytes_match_json_response(
+    client: TestClient, admin_headers: dict
+) -> None:
+    """
+    GIVEN a unit with microsecond datetimes and non-ASCII text in its vehicle
+        and store
+    WHEN '/api/v1/units/{id}' renders it through schema_response, and
+        ORJSONResponse renders a payload with floats and datetimes
+    THEN the bytes are the ones response_model and Starlette's JSONResponse
+        produced before
+    """
+    with SessionLocal() as db:
+        unit = Unit(
+            stock_number="ÜBER-東京",
+            list_date=datetime(2024, 2, 29, 23, 59, 59, 123456),
+            purchase_price=19999,
+            vehicle=Vehicle(**{**create_random_vehicle_data(), "make": "Škoda", "color": "Grün"}),
+            store=Store(name="Zürich Straße", city="Montréal"),
+        )
+        db.add(unit)
+        db.commit()
+        unit_id = unit.id
+
+    params = {"include_vehicle": True, "include_store": True}
+    r = client.get(f"/api/v1/units/{unit_id}", headers=admin_headers, params=params)
+    assert r.status_code == status.HTTP_200_OK
+    with SessionLocal() as db:
+        content = unit_service.get_unit_by_id(db, unit_id, True, True)
+    field = create_response_field(name="response", type_=Optional[UnitOutput])
+    payload = asyncio.run(serialize_response(field=field, response_content=content))
+    assert r.content == JSONResponse(payload).body
+    assert "Zürich Straße".encode() in r.content
+
+    floats = {"lag_seconds": 0.1 + 0.2, "price": 1234.5678, "ratio": 0.0001, "big": 1e15}
+    content = {**content, **floats, "now": datetime(2024, 1, 1, 9, 30, 0, 5)}
+    assert ORJSONResponse(content).body == JSONResponse(jsonable_encoder(content)).body
+    # orjson spells exponents differently (0.000025, 1e16), the numbers are the same
+    exponents = {"small": 2.5e-05, "large": 1e16}
+    assert json.loads(ORJSONResponse(exponents).body) == exponents
+
+
+def test_get_unit_statement_count(
+    client: TestClient, admin_headers: dict, query_counter: list
+) -> None:
+    """
+    GIVEN unit 1 read once, which caches its vehicle and store
+    WHEN it is read again with include_vehicle and include_store
+    THEN only the unit is queried, the vehicle and store come from the entity cache
+    """
+    entity_cache.clear()
+    params = {"include_vehicle": True, "include_store": True}
+    client.get("/api/v1/units/1", headers=admin_headers, params=params)
+    query_counter.clear()
+    r = client.get("/api/v1/units/1", headers=admin_headers, params=params)
+    assert r.status_code == status.HTTP_200_OK
+    assert r.json()["vehicle"] and r.json()["store"]
+    assert len(query_counter) == 1
+
+
+def test_get_units_without_includes_loads_no_relationships(
+    client: TestClient, admin_headers: dict, query_counter: list
+) -> None:
+    r = client.get("/api/v1/units/", headers=admin_headers, params={"limit": 100})
+    assert r.status_code == status.HTTP_200_OK
+    assert len(query_counter) == 1
+    assert "JOIN" not in query_counter[-1]
+
+
+def test_create_unit_statement_count(
+    client: TestClient, admin_headers: dict, query_counter: list
+) -> None:
+    """
+    GIVEN a unit and vehicle to create
+    WHEN the POST endpoint '/api/v1/units/' is requested
+    THEN each row is written and read back by a single INSERT ... RETURNING
+    """
+    r = client.post(
+        "/api/v1/units/",
+        headers=admin_headers,
+        json={"unit": create_random_unit_data(), "vehicle": create_random_vehicle_data()},
+    )
+    assert r.status_code == status.HTTP_201_CREATED
+    assert r.json()["id"]
+    # one INSERT per table, the current user comes from the principal cache
+    assert len(query_counter) == 2
+    assert all("RETURNING" in statement for statement in query_counter[1:])
+
+
+def test_update_unit_writes_only_set_fields(
+    client: TestClient, admin_headers: dict, query_counter: list
+) -> None:
+    before = client.get("/api/v1/units/2", headers=admin_headers).json()
+    query_counter.clear()
+    r = client.put("/api/v1/units/2", headers=admin_headers, json={"buy_now_price": 4321})
+    assert r.status_code == status.HTTP_200_OK
+    assert r.json() == before
+    assert len(query_counter) == 1
+    assert query_counter[-1].startswith("UPDATE units SET buy_now_price=")
+
+
+def test_mutating_requests_commit_once(
+    client: TestClient, admin_headers: dict, commit_counter: list
+) -> None:
+    """
+    GIVEN the unit write endpoints
+    WHEN each is requested
+    THEN every request commits exactly once and reads never commit
+    """
+    pair = {"unit": create_random_unit_data(), "vehicle": create_random_vehicle_data()}
+
+    r = client.post("/api/v1/units/", headers=admin_headers, json=pair)
+    assert r.status_code == status.HTTP_201_CREATED
+    assert len(commit_counter) == 1
+    unit_id = r.json()["id"]
+
+    # VINs are unique, each row its own vehicle
+    rows = [
+        {"unit": pair["unit"], "vehicle": create_random_vehicle_data()} for _ in range(3)
+    ]
+    r = client.post("/api/v1/units/bulk", headers=admin_headers, json=rows)
+    assert r.json()["created"] == 3
+    assert len(commit_counter) == 2
+
+    r = client.put(
+        f"/api/v1/units/{unit_id}", headers=admin_headers, json={"buy_now_price": 1}
+    )
+    assert r.status_code == status.HTTP_200_OK
+    assert len(commit_counter) == 3
+
+    r = client.get(f"/api/v1/units/{unit_id}", headers=admin_headers)
+    assert r.status_code == status.HTTP_200_OK
+    assert len(commit_counter) == 3
+
+    r = client.delete(f"/api/v1/units/{unit_id}", headers=admin_headers)
+    assert r.status_code == status.HTTP_200_OK
+    assert len(commit_counter) == 4
+    r = client.get(f"/api/v1/units/{unit_id}", headers=admin_headers)
+    assert r.status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_sqlite_connections_are_tuned() -> None:
+    """
+    GIVEN the writer and reader engines
+    WHEN a connection is opened on each
+    THEN WAL and the other pragmas are set and the reader cannot write
+    """
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+        assert conn.exec_driver_sql("PRAGMA synchronous").scalar() == 1  # NORMAL
+        assert conn.exec_driver_sql("PRAGMA busy_timeout").scalar() == 5000
+        assert conn.exec_driver_sql("PRAGMA temp_store").scalar() == 2  # MEMORY
+    with read_engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA query_only").scalar() == 1
+        with pytest.raises(OperationalError):
+            conn.exec_driver_sql("DELETE FROM units WHERE id = -1")
+
+
+def test_unit_requests_split_between_reader_and_writer(
+    client: TestClient, admin_headers: dict
+) -> None:
+    """
+    GIVEN a unit to create
+    WHEN it is created and then read back
+    THEN the INSERTs go to the writer and every statement of the read to a reader
+    """
+    sent = []
+    binds = {
+        engine: "writer",
+        async_engine.sync_engine: "writer",
+        read_engine: "reader",
+        async_read_engine.sync_engine: "reader",
+    }
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        sent.append((binds[conn.engine], statement.split()[0]))
+
+    for bind in binds:
+        event.listen(bind, "before_cursor_execute", capture)
+    try:
+        r = client.post(
+            "/api/v1/units/",
+            headers=admin_headers,
+            json={
+                "unit": create_random_unit_data(),
+                "vehicle": create_random_vehicle_data(),
+            },
+        )
+        assert r.status_code == status.HTTP_201_CREATED
+        created = list(sent)
+        sent.clear()
+        r = client.get(f"/api/v1/units/{r.json()['id']}", headers=admin_headers)
+        assert r.status_code == status.HTTP_200_OK
+    finally:
+        for bind in binds:
+            event.remove(bind, "before_cursor_execute", capture)
+    assert ("writer", "INSERT") in created
+    assert ("reader", "INSERT") not in created
+    assert sent and all(role == "reader" for role, _ in sent)
+
+
+def _submit_unit(writer: GroupCommitWriter) -> dict:
+    future = writer.submit(
+        unit_service.create_unit,
+        UnitAdd(**create_random_unit_data()),
+        VehicleAdd(**create_random_vehicle_data()),
+    )
+    return future.result(timeout=30)
+
+
+def test_group_commit_writer_under_concurrent_writes(commit_counter: list) -> None:
+    """
+    GIVEN a group commit writer
+    WHEN 200 threads each queue a unit at once
+    THEN every unit is written and the writes share far fewer than 200 COMMITs
+    """
+    writer = GroupCommitWriter(window=0.01)
+    writer.start()
+    try:
+        with ThreadPoolExecutor(max_workers=200) as pool:
+            units = list(pool.map(lambda _: _submit_unit(writer), range(200)))
+    finally:
+        writer.stop()
+    assert len({unit["id"] for unit in units}) == 200
+    with SessionLocal() as db:
+        ids = [unit["id"] for unit in units]
+        assert db.query(Unit).filter(Unit.id.in_(ids)).count() == 200
+    assert writer.metrics()["jobs"] == 200
+    assert writer.commits == len(commit_counter) < 200
+    assert writer.largest_batch > 1
+
+
+def test_group_commit_writer_isolates_a_failing_write() -> None:
+    """
+    GIVEN writes queued together with one that fails after inserting
+    WHEN the group is committed
+    THEN only the failing write is rolled back and its caller gets the error
+    """
+
+    rejected = create_random_vehicle_data()
+
+    def failing(db: Session) -> None:
+        unit_service.create_unit(
+            db, UnitAdd(**create_random_unit_data()), VehicleAdd(**rejected)
+        )
+        raise ValueError("rejected")
+
+    writer = GroupCommitWriter(window=0.05)
+    futures = [
+        writer.submit(
+            unit_service.create_unit,
+            UnitAdd(**create_random_unit_data()),
+            VehicleAdd(**create_random_vehicle_data()),
+        ),
+        writer.submit(failing),
+        writer.submit(
+            unit_service.create_unit,
+            UnitAdd(**create_random_unit_data()),
+            VehicleAdd(**create_random_vehicle_data()),
+        ),
+    ]
+    writer.start()
+    try:
+        with pytest.raises(ValueError, match="rejected"):
+            futures[1].result(timeout=30)
+        ids = [futures[0].result(timeout=30)["id"], futures[2].result(timeout=30)["id"]]
+    finally:
+        writer.stop()
+    assert writer.commits == 1
+    with SessionLocal() as db:
+        assert db.query(Unit).filter(Unit.id.in_(ids)).count() == 2
+        assert not db.query(Vehicle).filter_by(vin=rejected["vin"]).count()
+
+
+def test_write_requests_commit_on_the_writer_thread(
+    client: TestClient, admin_headers: dict, commit_counter: list
+) -> None:
+    """
+    GIVEN the app running with GROUP_COMMIT on
+    WHEN a unit is created and deleted
+    THEN both requests commit from the group commit writer's thread
+    """
+    threads = []
+
+    def record(conn):
+        threads.append(threading.current_thread().name)
+
+    event.listen(engine, "commit", record)
+    try:
+        r = client.post(
+            "/api/v1/units/",
+            headers=admin_headers,
+            json={
+                "unit": create_random_unit_data(),
+                "vehicle": create_random_vehicle_data(),
+            },
+        )
+        assert r.status_code == status.HTTP_201_CREATED
+        r = client.delete(f"/api/v1/units/{r.json()['id']}", headers=admin_headers)
+        assert r.status_code == status.HTTP_200_OK
+    finally:
+        event.remove(engine, "commit", record)
+    assert threads == ["db-writer", "db-writer"]
+    assert len(commit_counter) == 2
+
+
+def test_export_units_ndjson(client: TestClient, admin_headers: dict) -> None:
+    """
+    GIVEN units in the database
+    WHEN '/api/v1/units/export?format=ndjson' is requested
+    THEN every unit is streamed as one JSON object per line with its vehicle and store
+    """
+    r = client.get(
+        "/api/v1/units/export",
+        headers=admin_headers,
+        params={"format": "ndjson", "filter_key": "store_id", "filter_value": 3},
+    )
+    assert r.status_code == status.HTTP_200_OK
+    assert r.headers["content-type"] == "application/x-ndjson"
+    rows = [json.loads(line) for line in r.text.splitlines()]
+    assert rows and all(row["store_id"] == 3 for row in rows)
+    assert all(row["store"]["id"] == 3 and row["vehicle"] for row in rows)
+
+    listed = client.get(
+        "/api/v1/units/",
+        headers=admin_headers,
+        params={"filter_key": "store_id", "filter_value": 3, "limit": 100000},
+    )
+    assert [row["id"] for row in rows] == [u["unit_id"] for u in listed.json()]
+
+
+def test_export_units_csv(client: TestClient, admin_headers: dict) -> None:
+    r = client.get("/api/v1/units/export", headers=admin_headers, params={"format": "csv"})
+    assert r.status_code == status.HTTP_200_OK
+    assert r.headers["content-type"].startswith("text/csv")
+    reader = csv.DictReader(io.StringIO(r.text))
+    rows = list(reader)
+    assert "vehicle.make" in reader.fieldnames and "store.name" in reader.fieldnames
+    listed = client.get("/api/v1/units/", headers=admin_headers, params={"limit": 100000})
+    assert len(rows) == len(listed.json())
+
+
+def test_create_units_bulk(client: TestClient, admin_headers: dict, db: Session) -> None:
+    """
+    GIVEN a JSON array of {unit, vehicle} pairs with one invalid vehicle
+    WHEN the POST endpoint '/api/v1/units/bulk' is requested by an admin
+    THEN the valid rows are created and linked, and the invalid row is reported
+    """
+    rows = [
+        {"unit": create_random_unit_data(), "vehicle": create_random_vehicle_data()}
+        for _ in range(25)
+    ]
+    rows[3]["vehicle"]["year"] = 1990
+    response = client.post("/api/v1/units/bulk", headers=admin_headers, json=rows)
+    assert response.status_code == status.HTTP_200_OK
+    body = response.json()
+    assert body["created"] == 24 and body["failed"] == 1
+    assert [result["index"] for result in body["results"]] == list(range(25))
+    assert body["results"][3]["status"] == "failed"
+    assert body["results"][3]["errors"][0].startswith("vehicle.year")
+
+    result = body["results"][0]
+    unit = client.get(
+        f"/api/v1/units/{result['unit_id']}",
+        headers=admin_headers,
+        params={"include_vehicle": True},
+    ).json()
+    assert unit["vehicle"]["id"] == result["vehicle_id"]
+    assert unit["vehicle"]["make"] == rows[0]["vehicle"]["make"]
+
+
+def test_create_units_bulk_ndjson(client: TestClient, admin_headers: dict) -> None:
+    rows = [
+        {"unit": create_random_unit_data(), "vehicle": create_random_vehicle_data()}
+        for _ in range(10)
+    ]
+    response = client.post(
+        "/api/v1/units/bulk",
+        headers={**admin_headers, "Content-Type": "application/x-ndjson"},
+        content="\n".join(json.dumps(row) for row in rows) + "\n",
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["created"] == 10
+
+    response = client.post(
+        "/api/v1/units/bulk", headers=admin_headers, content=b'{"unit": {}}'
+    )
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def is_expired(client: TestClient, headers: dict, unit_id: int) -> bool:
+    return client.get(f"/api/v1/units/{unit_id}", headers=headers).json()["is_expired"]
+
+
+def test_expire_units(client: TestClient, admin_headers: dict) -> None:
+    """
+    GIVEN units whose expire_date has passed
+    WHEN the POST endpoint '/api/v1/units/expire_units' is requested
+    THEN they are flagged by one UPDATE and a second request has nothing to do
+    """
+    past = (datetime.utcnow() - timedelta(minutes=1)).isoformat()
+    pair = {"unit": {"expire_date": past}, "vehicle": create_random_vehicle_data()}
+    unit_id = client.post("/api/v1/units/", headers=admin_headers, json=pair).json()["id"]
+
+    r = client.post("/api/v1/units/expire_units", headers=admin_headers)
+    assert r.status_code == status.HTTP_200_OK
+    assert is_expired(client, admin_headers, unit_id)
+    r = client.post("/api/v1/units/expire_units", headers=admin_headers)
+    assert r.json()["Message"] == "0 units expired."
+
+
+def test_expiry_scheduler(client: TestClient, admin_headers: dict) -> None:
+    """
+    GIVEN a unit expiring in a moment, written before the scheduler starts
+    WHEN the scheduler runs
+    THEN it reads the deadline back from the database and expires the unit on time
+    """
+    def create(expire_date: datetime) -> int:
+        pair = {
+            "unit": {"expire_date": expire_date.isoformat()},
+            "vehicle": create_random_vehicle_data(),
+        }
+        return client.post("/api/v1/units/", headers=admin_headers, json=pair).json()["id"]
+
+    unit_id = create(datetime.utcnow() + timedelta(seconds=1))
+    scheduler = ExpiryScheduler(SessionLocal, idle_interval=0.1)
+    scheduler.start()
+    try:
+        time.sleep(1.5)
+        assert is_expired(client, admin_headers, unit_id)
+        assert 0 <= scheduler.metrics()["lag_seconds"] < 0.5
+
+        deadline = datetime.utcnow() + timedelta(seconds=0.5)
+        unit_id = create(deadline)
+        scheduler.schedule(deadline)
+        time.sleep(1)
+        assert is_expired(client, admin_headers, unit_id)
+        assert scheduler.runs >= 2
+    finally:
+        scheduler.stop()
+
+
+def test_expire_units_uses_index(db: Session) -> None:
+    EXPIRY_INDEX.create(bind=db.get_bind(), checkfirst=True)
+    stmt = update(Unit).where(
+        Unit.is_expired == false(), Unit.expire_date <= datetime.utcnow()
+    ).values(is_expired=True)
+    compiled = stmt.compile(db.get_bind(), compile_kwargs={"literal_binds": True})
+    plan = db.execute(text(f"EXPLAIN QUERY PLAN {compiled}")).all()
+    db.rollback()
+    assert any("ix_units_is_expired_expire_date" in row[-1] for row in plan), plan
+
+
+def test_get_units_etag_follows_related_tables(
+    client: TestClient, admin_headers: dict
+) -> None:
+    """
+    GIVEN units rendered with and without their store
+    WHEN a store is updated, a write is rolled back and units are expired
+    THEN only the responses reading the written tables get a new ETag
+    """
+    urls = ("/api/v1/units/?limit=5", "/api/v1/units/?limit=5&include_store=true")
+    etags = [client.get(url, headers=admin_headers).headers["ETag"] for url in urls]
+
+    def unchanged() -> list:
+        return [
+            client.get(url, headers={**admin_headers, "If-None-Match": etag}).status_code
+            == status.HTTP_304_NOT_MODIFIED
+            for url, etag in zip(urls, etags)
+        ]
+
+    assert unchanged() == [True, True]
+    r = client.put("/api/v1/stores/1", headers=admin_headers, json={"city": "Lexington"})
+    assert r.status_code == status.HTTP_200_OK
+    assert unchanged() == [True, False]
+
+    etags[1] = client.get(urls[1], headers=admin_headers).headers["ETag"]
+    with SessionLocal() as db:
+        expire_due_units(db, now=datetime.max)
+        db.rollback()
+    assert unchanged() == [True, True]
+
+    past = (datetime.utcnow() - timedelta(minutes=1)).isoformat()
+    pair = {"unit": {"expire_date": past}, "vehicle": create_random_vehicle_data()}
+    client.post("/api/v1/units/", headers=admin_headers, json=pair)
+    etags = [client.get(url, headers=admin_headers).headers["ETag"] for url in urls]
+    client.post("/api/v1/units/expire_units", headers=admin_headers)
+    assert unchanged() == [False, False]
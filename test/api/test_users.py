@@ -1,9 +1,25 @@
-from typing import Dict
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Generator
 
+import pytest
 from fastapi.testclient import TestClient
 from fastapi import status
 from sqlalchemy.orm import Session
 
+from app import dependencies
+from app.database import SessionLocal
+from app.models.users import User
+from app.services import passwords
+from app.services import users as user_service
+from app.services.passwords import hash_rounds, password_hasher
+from app.routers.security import dependencies as security
+from app.routers.security.dependencies import (create_access_token, token_cache,
+                                               verify_token)
+from app.repositories.base.entity_cache import entity_cache
+from app.services.users import principal_cache
+from app.utils.pagination import decode_cursor, encode_cursor
+
 from app.schemas.users import (
     UserLogin,
     UserCreate,
@@ -90,4 +106,279 @@ from test.utils.user_randomizer import random_user_create, create_admin
 #     user.store_id = 1
 #     db.commit()
 #     assert user.store_id == 1
-#     assert user.is_admin == True
\ No newline at end of file
+#     assert user.is_admin == True
+
+def test_get_users_statement_count(
+    client: TestClient, admin_headers: dict, query_counter: list
+) -> None:
+    entity_cache.clear()
+    params = {"limit": 40, "include_store": True}
+    r = client.get("/api/v1/users/", headers=admin_headers, params=params)
+    assert r.status_code == status.HTTP_200_OK
+    # the page and its stores, then the stores come from the entity cache
+    assert len(query_counter) == 2
+    query_counter.clear()
+    assert client.get("/api/v1/users/", headers=admin_headers, params=params).json() == r.json()
+    assert len(query_counter) == 1
+
+
+
+def test_get_users_cannot_sort_by_secret_columns(
+    client: TestClient, admin_headers: dict
+) -> None:
+    """
+    GIVEN the users list, whose cursor carries the sort column's value
+    WHEN it is sorted by hashed_password, directly or through a forged cursor
+    THEN the request is refused instead of leaking hashes in X-Next-Cursor
+    """
+    for params in (
+        {"sort_key": "hashed_password", "limit": 2},
+        {"cursor": encode_cursor("hashed_password", "", 0), "limit": 2},
+    ):
+        r = client.get("/api/v1/users/", headers=admin_headers, params=params)
+        assert r.status_code == status.HTTP_400_BAD_REQUEST
+        assert "X-Next-Cursor" not in r.headers
+    params = {"sort_key": "id", "limit": 2}
+    r = client.get("/api/v1/users/", headers=admin_headers, params=params)
+    assert r.status_code == status.HTTP_200_OK
+    assert decode_cursor(r.headers["X-Next-Cursor"]).sort_key == "id"
+
+@pytest.fixture
+def session_counter(monkeypatch: pytest.MonkeyPatch) -> Generator:
+    """Collects every session the request dependencies create during the test"""
+    sessions = []
+
+    def counting(factory):
+        def create():
+            sessions.append(factory())
+            return sessions[-1]
+
+        return create
+
+    for name in ("SessionLocal", "AsyncSessionLocal"):
+        monkeypatch.setattr(dependencies, name, counting(getattr(dependencies, name)))
+    yield sessions
+
+
+def test_request_opens_one_session_lazily(
+    client: TestClient, admin_headers: dict, session_counter: list
+) -> None:
+    """
+    GIVEN a route that needs the current user and a route with no database access
+    WHEN each is requested
+    THEN the first authenticates and reads on one shared session, the second opens none
+    """
+    r = client.get("/api/v1/users/", headers=admin_headers, params={"limit": 5})
+    assert r.status_code == status.HTTP_200_OK
+    assert len(session_counter) == 1
+
+    session_counter.clear()
+    r = client.get("/api/v1/home/")
+    assert r.status_code == status.HTTP_200_OK
+    assert not session_counter
+
+
+def test_current_user_from_a_name_only_token_is_cached(
+    client: TestClient, query_counter: list
+) -> None:
+    """
+    GIVEN a token that only names the admin, as issued before principal claims
+    WHEN two authenticated requests are made
+    THEN only the first one queries the user and the second is a cache hit
+    """
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': 'admin'})}"}
+    admin = principal_cache.get("admin")
+    principal_cache.invalidate("admin")
+    before = principal_cache.stats()
+    for expected in (2, 1):
+        query_counter.clear()
+        r = client.get("/api/v1/users/", headers=headers, params={"limit": 1})
+        assert r.status_code == status.HTTP_200_OK
+        assert len(query_counter) == expected
+    after = principal_cache.stats()
+    assert after["misses"] - before["misses"] == 1
+    assert after["hits"] - before["hits"] == 1
+    assert admin is None or principal_cache.get("admin") == admin
+
+
+def test_current_user_from_token_claims(
+    client: TestClient, query_counter: list, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    GIVEN a freshly issued token carrying the admin's principal
+    WHEN it is used twice
+    THEN neither request queries the user and only the first verifies the signature
+    """
+    r = client.post("/api/v1/token", data={"username": "admin", "password": "password"})
+    headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+    # Tokens signed within the same second are identical, it may be cached already
+    token_cache.clear()
+    verified = []
+
+    def verify(token: str):
+        verified.append(token)
+        return verify_token(token)
+
+    monkeypatch.setattr(security, "verify_token", verify)
+    for _ in range(2):
+        query_counter.clear()
+        r = client.get("/api/v1/users/", headers=headers, params={"limit": 1})
+        assert r.status_code == status.HTTP_200_OK
+        assert len(query_counter) == 1
+    assert len(verified) == 1
+
+
+def test_user_writes_revoke_tokens(client: TestClient, admin_headers: dict) -> None:
+    """
+    GIVEN a user authenticated once, so their token is verified and cached
+    WHEN the user is deactivated, their tokens revoked, and the user deleted
+    THEN each write makes their current token fail and a new login carries the change
+    """
+    new_user = random_user_create()
+    r = client.post("/api/v1/users/", headers=admin_headers, json=new_user)
+    assert r.status_code == status.HTTP_201_CREATED
+    user_id = r.json()["id"]
+    creds = {"username": new_user["username"], "password": new_user["password"]}
+
+    def login() -> dict:
+        r = client.post("/api/v1/token", data=creds)
+        return {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+    headers = login()
+    assert client.get("/api/v1/users/me/", headers=headers).status_code == 200
+
+    with SessionLocal() as db:
+        user_service.deactivate_user(db, user_id)
+    r = client.get("/api/v1/users/me/", headers=headers)
+    assert r.status_code == status.HTTP_401_UNAUTHORIZED
+    headers = login()
+    r = client.get("/api/v1/units/", headers=headers)
+    assert r.status_code == status.HTTP_400_BAD_REQUEST  # inactive user
+
+    r = client.post(f"/api/v1/users/{user_id}/revoke_tokens", headers=admin_headers)
+    assert r.status_code == status.HTTP_200_OK
+    r = client.get("/api/v1/users/me/", headers=headers)
+    assert r.status_code == status.HTTP_401_UNAUTHORIZED
+    headers = login()
+
+    r = client.delete(f"/api/v1/users/{user_id}", headers=admin_headers)
+    assert r.json()["Status"] == "Success"
+    r = client.get("/api/v1/users/me/", headers=headers)
+    assert r.status_code == status.HTTP_401_UNAUTHORIZED
+    assert client.post("/api/v1/token", data=creds).status_code == 401
+
+
+def test_login_rehashes_password_at_configured_cost(
+    client: TestClient, admin_headers: dict, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    GIVEN a user whose password was hashed at a cost since changed
+    WHEN they log in
+    THEN the login succeeds and their hash is stored again at the new cost
+    """
+    new_user = random_user_create()
+    monkeypatch.setattr(password_hasher, "rounds", 4)
+    r = client.post("/api/v1/users/", headers=admin_headers, json=new_user)
+    assert r.status_code == status.HTTP_201_CREATED
+
+    monkeypatch.setattr(password_hasher, "rounds", 5)
+    creds = {"username": new_user["username"], "password": new_user["password"]}
+    for _ in range(2):
+        r = client.post("/api/v1/token", data=creds)
+        assert r.status_code == status.HTTP_200_OK
+        with SessionLocal() as db:
+            user = db.query(User).filter_by(username=new_user["username"]).one()
+            assert hash_rounds(user.hashed_password) == 5
+            assert user.password is None
+
+
+def test_login_is_refused_when_password_hashing_is_saturated(
+    client: TestClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    GIVEN the password hasher's queue is full
+    WHEN a login arrives
+    THEN it is answered 503 with a Retry-After instead of waiting
+    """
+    monkeypatch.setattr(password_hasher, "max_pending", 0)
+    rejected = password_hasher.rejected
+    r = client.post("/api/v1/token", data={"username": "admin", "password": "password"})
+    assert r.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert r.headers["Retry-After"] == "1"
+    assert password_hasher.rejected == rejected + 1
+
+
+def test_login_succeeds_during_bulk_hashing(
+    client: TestClient, admin_headers: dict, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """
+    GIVEN a bulk import of more users than the hasher's queue holds, still
+        hashing
+    WHEN a login arrives
+    THEN it is answered at once, bulk hashing has workers and a queue of its own
+    """
+    monkeypatch.setattr(password_hasher, "rounds", 4)
+    monkeypatch.setattr(password_hasher, "max_pending", 2)
+    bulk_executor = ThreadPoolExecutor(1, thread_name_prefix="bcrypt-bulk")
+    monkeypatch.setattr(password_hasher, "_bulk_executor", bulk_executor)
+    hashing, release = threading.Event(), threading.Event()
+    hash_passwords = passwords.hash_passwords
+
+    def held_hash_passwords(*args):
+        hashing.set()
+        release.wait(10)
+        return hash_passwords(*args)
+
+    monkeypatch.setattr(passwords, "hash_passwords", held_hash_passwords)
+    rows = [random_user_create() for _ in range(10)]
+    with ThreadPoolExecutor(1) as pool:
+        bulk = pool.submit(
+            TestClient(client.app).post,
+            "/api/v1/users/bulk",
+            headers=admin_headers,
+            json=rows,
+        )
+        assert hashing.wait(10)
+        assert password_hasher.bulk_pending == 10
+        creds = {"username": "admin", "password": "password"}
+        assert client.post("/api/v1/token", data=creds).status_code == status.HTTP_200_OK
+        assert not bulk.done()
+        release.set()
+        r = bulk.result(10)
+    bulk_executor.shutdown()
+    assert r.status_code == status.HTTP_200_OK
+    assert r.json()["created"] == 10
+
+
+def test_create_users_bulk(
+    client: TestClient,
+    admin_headers: dict,
+    query_counter: list,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """
+    GIVEN a JSON array of users, some invalid or already registered
+    WHEN the POST endpoint '/api/v1/users/bulk' is requested by an admin
+    THEN duplicates are found in one query, the rest are created and can log in
+    """
+    monkeypatch.setattr(password_hasher, "rounds", 4)
+    rows = [random_user_create() for _ in range(20)]
+    rows[2]["username"] = "admin"
+    rows[5]["email"] = rows[4]["email"]
+    del rows[7]["password"]
+    rows[9]["email"] = "not an email"
+
+    r = client.post("/api/v1/users/bulk", headers=admin_headers, json=rows)
+    assert r.status_code == status.HTTP_200_OK
+    body = r.json()
+    assert body["created"] == 16 and body["failed"] == 4
+    assert [result["index"] for result in body["results"]] == list(range(20))
+    failed = {result["index"]: result["errors"] for result in body["results"] if result["errors"]}
+    assert failed[2] == ["username: admin is already registered"]
+    assert failed[5][0].startswith("email:")
+    assert failed[7] == ["password: Field required"]
+    assert failed[9][0].startswith("email:")
+    assert len([sql for sql in query_counter if sql.startswith("SELECT")]) == 1
+
+    creds = {"username": rows[0]["username"], "password": rows[0]["password"]}
+    assert client.post("/api/v1/token", data=creds).status_code == status.HTTP_200_OK
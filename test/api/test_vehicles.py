@@ -0,0 +1,221 @@
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, delete, event, insert, select
+
+from app import config
+from app.database import Base, SessionLocal, async_read_engine, read_engine
+from app.migrations import DuplicateValuesError, create_missing_indexes, normalize_vins
+from app.repositories.base.entity_cache import entity_cache
+from app.models.vehicles import Vehicle
+from app.schemas.vehicles import VehicleAdd
+from app.services.vehicles import delete_vehicle
+from app.unit_of_work.unit_of_work import UnitOfWork
+from app.utils.filters import _compile
+
+from test.utils.vehicle_randomizer import create_random_vehicle_data
+
+
+def test_get_vehicles_statement_count(client: TestClient, query_counter: list) -> None:
+    """
+    GIVEN VehicleOutput does not render units
+    WHEN '/api/v1/vehicles/' is requested, with or without include_unit_model
+    THEN only the vehicles page is queried
+    """
+    for params in ({"limit": 100}, {"limit": 100, "include_unit_model": True}):
+        query_counter.clear()
+        r = client.get("/api/v1/vehicles/", params=params)
+        assert r.status_code == status.HTTP_200_OK
+        assert len(query_counter) == 1
+
+
+def test_get_vehicle_statement_count(client: TestClient, query_counter: list) -> None:
+    """
+    GIVEN an empty entity cache
+    WHEN '/api/v1/vehicles/1' is requested twice
+    THEN the vehicle is queried once and then read from the cache
+    """
+    entity_cache.clear()
+    r = client.get("/api/v1/vehicles/1")
+    assert r.status_code == status.HTTP_200_OK
+    assert len(query_counter) == 1
+    assert client.get("/api/v1/vehicles/1").json() == r.json()
+    assert len(query_counter) == 1
+    assert entity_cache.stats()["vehicles"]["hits"] >= 1
+
+
+def test_entity_cache_drops_written_rows(client: TestClient) -> None:
+    """
+    GIVEN a cached vehicle
+    WHEN it is updated through the ORM, deleted in a transaction that rolls
+        back, then deleted
+    THEN reads after each commit see the database and the rolled back delete
+        leaves the entry cached
+    """
+    entity_cache.clear()
+    with SessionLocal() as db, UnitOfWork(db) as uow:
+        vehicle = uow.vehicles.add_vehicle(VehicleAdd(**create_random_vehicle_data()))
+        uow.commit()
+    vehicle_id = vehicle.id
+    url = f"/api/v1/vehicles/{vehicle_id}"
+    client.get(url)
+
+    with SessionLocal() as db:
+        db.get(Vehicle, vehicle_id).color = "Ultramarine"
+        db.commit()
+    assert client.get(url).json()["color"] == "Ultramarine"
+
+    with SessionLocal() as db:
+        with pytest.raises(RuntimeError), UnitOfWork(db) as uow:
+            uow.vehicles.delete_vehicle(vehicle_id)
+            raise RuntimeError()
+    hits = entity_cache.stats()["vehicles"]["hits"]
+    assert client.get(url).json()["color"] == "Ultramarine"
+    assert entity_cache.stats()["vehicles"]["hits"] == hits + 1
+
+    with SessionLocal() as db:
+        delete_vehicle(db, vehicle_id)
+    assert client.get(url).status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_get_vehicles_filters(client: TestClient) -> None:
+    """
+    GIVEN vehicles in the database
+    WHEN '/api/v1/vehicles/' is filtered by year__gte, make__in and mileage__lt
+    THEN only the matching vehicles are returned, and a second request of the
+        same shape with other values reuses the compiled filter
+    """
+    every_vehicle = client.get("/api/v1/vehicles/", params={"limit": 100000}).json()
+    makes = sorted({v["make"] for v in every_vehicle})[:2]
+
+    def expected(year: int, mileage: int) -> list:
+        return [
+            v["id"]
+            for v in every_vehicle
+            if v["year"] >= year and v["make"] in makes and v["mileage"] < mileage
+        ]
+
+    _compile.cache_clear()
+    for year, mileage in ((2010, 100000), (2018, 50000)):
+        r = client.get(
+            "/api/v1/vehicles/",
+            params=[
+                ("limit", 100000),
+                ("year__gte", year),
+                ("make__in", makes[0]),
+                ("make__in", makes[1]),
+                ("mileage__lt", mileage),
+            ],
+        )
+        assert r.status_code == status.HTTP_200_OK
+        assert [v["id"] for v in r.json()] == expected(year, mileage)
+    assert _compile.cache_info().misses == 1
+    assert _compile.cache_info().hits == 1
+
+    r = client.get("/api/v1/vehicles/", params={"limit": 5, "order_by": "-year"})
+    years = [v["year"] for v in r.json()]
+    assert years == sorted(years, reverse=True)
+
+
+@pytest.mark.parametrize(
+    "async_database, bind",
+    [(True, async_read_engine.sync_engine), (False, read_engine)],
+    ids=["async", "sync"],
+)
+def test_requests_use_configured_engine(
+    client: TestClient, monkeypatch: pytest.MonkeyPatch, async_database: bool, bind
+) -> None:
+    """
+    GIVEN ASYNC_DATABASE on or off
+    WHEN '/api/v1/vehicles/1' is requested
+    THEN its query is sent through the aiosqlite reader or the sync one
+    """
+    monkeypatch.setattr(config, "ASYNC_DATABASE", async_database)
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    entity_cache.clear()
+    event.listen(bind, "before_cursor_execute", capture)
+    try:
+        r = client.get("/api/v1/vehicles/1")
+    finally:
+        event.remove(bind, "before_cursor_execute", capture)
+    assert r.status_code == status.HTTP_200_OK
+    assert any(statement.startswith("SELECT") for statement in statements)
+
+
+def test_lookup_vehicles_by_vin_suffix(client: TestClient) -> None:
+    """
+    GIVEN vehicles in the database
+    WHEN '/api/v1/vehicles/lookup' is asked for the end of a VIN, in any case
+    THEN exactly the vehicles whose VIN ends with it come back, and a suffix
+        shorter than 6 characters is refused
+    """
+    every_vehicle = client.get("/api/v1/vehicles/", params={"limit": 100000}).json()
+    vin = next(v["vin"] for v in every_vehicle if v["vin"])
+
+    for suffix in (vin[-6:], vin[-8:].lower(), vin):
+        r = client.get("/api/v1/vehicles/lookup", params={"vin_suffix": suffix})
+        assert r.status_code == status.HTTP_200_OK
+        assert [v["id"] for v in r.json()] == [
+            v["id"]
+            for v in every_vehicle
+            if v["vin"] and v["vin"].endswith(suffix.upper())
+        ]
+
+    r = client.get("/api/v1/vehicles/lookup", params={"vin_suffix": vin[-5:]})
+    assert r.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+def test_migration_makes_vins_unique(tmp_path) -> None:
+    """
+    GIVEN a database from before VINs were unique, holding a VIN twice in two cases
+    WHEN it is migrated
+    THEN its VINs are upper cased, and the unique index is refused naming the
+        duplicate until one of them is gone
+    """
+    bind = create_engine(f"sqlite:///{tmp_path / 'before.db'}")
+    Base.metadata.create_all(bind)
+    with bind.begin() as conn:
+        conn.exec_driver_sql("DROP INDEX ix_vehicles_vin")
+        conn.exec_driver_sql("CREATE INDEX ix_vehicles_vin ON vehicles (vin)")
+        conn.execute(
+            insert(Vehicle),
+            [
+                {"vin": "1hgcm82633a004352"},
+                {"vin": " 1HGCM82633A004352"},
+                {"vin": "jh4ka7561pc008269"},
+            ],
+        )
+
+    assert normalize_vins(bind) == 3
+    with pytest.raises(DuplicateValuesError, match="1HGCM82633A004352"):
+        create_missing_indexes(bind)
+    with bind.begin() as conn:
+        conn.execute(delete(Vehicle).where(Vehicle.id == 2))
+    assert create_missing_indexes(bind) == ["ix_vehicles_vin"]
+    assert create_missing_indexes(bind) == []
+    bind.dispose()
+
+
+def test_migration_clears_blank_vins(tmp_path) -> None:
+    """
+    GIVEN a database from before VINs were unique, holding two blank VINs
+    WHEN it is migrated
+    THEN they become NULL, as blank VINs are written now, and the unique
+        index is built
+    """
+    bind = create_engine(f"sqlite:///{tmp_path / 'before.db'}")
+    Base.metadata.create_all(bind)
+    with bind.begin() as conn:
+        conn.exec_driver_sql("DROP INDEX ix_vehicles_vin")
+        conn.exec_driver_sql("CREATE INDEX ix_vehicles_vin ON vehicles (vin)")
+        conn.execute(insert(Vehicle), [{"vin": ""}, {"vin": " "}, {"vin": None}])
+
+    assert normalize_vins(bind) == 2
+    assert create_missing_indexes(bind) == ["ix_vehicles_vin"]
+    with bind.connect() as conn:
+        assert conn.execute(select(Vehicle.vin)).scalars().all() == [None] * 3
+    bind.dispose()
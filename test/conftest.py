@@ -1,12 +1,22 @@
+import os
+
 import pytest
 
 from typing import Generator
 
 from fastapi.testclient import TestClient
 
+from sqlalchemy import event
 from sqlalchemy.orm import Session
 
-from app.database import engine
+# Tests drive expiry themselves, keep the app's scheduler from racing them
+os.environ.setdefault("UNIT_EXPIRY_SCHEDULER", "false")
+# Access tokens are signed with it, the app refuses to start without one
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+# The statement counts assume the admin stays cached for the whole run
+os.environ.setdefault("PRINCIPAL_CACHE_TTL", "3600")
+
+from app.database import async_engine, async_read_engine, engine, read_engine
 
 from app.main import app
 
@@ -15,6 +25,11 @@ from app.main import app
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test/test.db"
 
+# Requests run on the aiosqlite engines when ASYNC_DATABASE is on, the sync ones
+# otherwise. Reads go to the reader engines, writes and COMMITs to the writers
+WRITE_ENGINES = (engine, async_engine.sync_engine)
+ENGINES = WRITE_ENGINES + (read_engine, async_read_engine.sync_engine)
+
 
 @pytest.fixture(scope="session")
 def db() -> Generator:
@@ -31,3 +46,52 @@ def db() -> Generator:
 def client() -> Generator:
     with TestClient(app) as c:
         yield c
+
+
+@pytest.fixture(scope="module")
+def admin_headers(client: TestClient) -> dict:
+    creds = {"username": "admin", "password": "password"}
+    response = client.post("/api/v1/token", data=creds)
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    # Authenticate once so the principal cache holds the admin
+    client.get("/api/v1/users/me/", headers=headers)
+    return headers
+
+
+TRANSACTION_CONTROL = ("BEGIN", "COMMIT", "ROLLBACK", "SAVEPOINT", "RELEASE")
+
+
+@pytest.fixture
+def query_counter() -> Generator:
+    """Collects every SQL statement sent to the engine while the test runs, leaving
+    out transaction control (BEGIN, SAVEPOINT, ...)"""
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        if not statement.startswith(TRANSACTION_CONTROL):
+            statements.append(statement)
+
+    for bind in ENGINES:
+        event.listen(bind, "before_cursor_execute", count)
+    try:
+        yield statements
+    finally:
+        for bind in ENGINES:
+            event.remove(bind, "before_cursor_execute", count)
+
+
+@pytest.fixture
+def commit_counter() -> Generator:
+    """Collects every COMMIT sent to a writer engine while the test runs"""
+    commits = []
+
+    def count(conn):
+        commits.append(conn)
+
+    for bind in WRITE_ENGINES:
+        event.listen(bind, "commit", count)
+    try:
+        yield commits
+    finally:
+        for bind in WRITE_ENGINES:
+            event.remove(bind, "commit", count)
@@ -8,11 +8,13 @@ from typing import Dict
 
 def random_user_create() -> Dict:
     faker = Faker("en_US")
+    # Faker repeats itself across a run, the suffix keeps the unique columns unique
+    suffix = random.randint(0, 10**6)
     return {
         "first_name": faker.first_name(),
         "last_name": faker.last_name(),
-        "email": faker.email(),
-        "username": faker.user_name(),
+        "email": f"{suffix}{faker.email()}",
+        "username": f"{faker.user_name()[:18]}{suffix}",
         "password": "password",
         "phone_number": faker.phone_number(),
         "is_admin": 0,